@@ -1,15 +1,39 @@
 import requests
 import json
-import time
+import threading
 from typing import Optional, List, Dict, Any
 
+from utils.http_pool import HttpPool
+from api.rate_limiter import RateLimiter
+from api.request_scheduler import RequestScheduler, RequestPriority
+from api.search_cache import SearchCache
+from api.url_cache import UrlCache
+from api.single_flight import SingleFlight
+from api.track import Track
+
 class MusicAPI:
     """音乐API封装类"""
     
-    def __init__(self, base_url: str = "https://music-api.gdstudio.xyz/api.php"):
+    def __init__(self, base_url: str = "https://music-api.gdstudio.xyz/api.php",
+                 http_pool: Optional[HttpPool] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 search_cache: Optional[SearchCache] = None,
+                 url_cache: Optional[UrlCache] = None,
+                 single_flight: Optional[SingleFlight] = None):
         self.base_url = base_url
-        self.last_request_time = 0
-        self.request_interval = 1.0  # 请求间隔，避免超过频率限制
+        self.http = http_pool or HttpPool.shared()  # 共享连接池，复用keep-alive连接
+        self.rate_limiter = rate_limiter or RateLimiter.shared()  # 所有实例共用的请求频率限制
+        self.scheduler = RequestScheduler.shared(self.rate_limiter)  # 按优先级分配请求配额
+        self.search_cache = search_cache  # 可选的搜索结果缓存
+        self.url_cache = url_cache        # 可选的播放链接缓存
+        self.single_flight = single_flight or SingleFlight.shared()  # 所有实例共用，合并参数相同的并发请求
+        # 各优先级等待请求配额的最长时间（秒），None表示一直等待
+        self.rate_limit_timeouts = {
+            RequestPriority.PLAY: 60.0,
+            RequestPriority.SEARCH: 60.0,
+            RequestPriority.PREFETCH: 60.0,
+            RequestPriority.DOWNLOAD: None
+        }
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://music.gdstudio.xyz/',
@@ -21,18 +45,46 @@ class MusicAPI:
             'Sec-Fetch-Site': 'same-site'
         }
     
-    def _make_request(self, params: Dict) -> Optional[Any]:
-        """发送API请求"""
-        # 控制请求频率
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.request_interval:
-            time.sleep(self.request_interval - time_since_last)
+    def _make_request(self, params: Dict, wait: bool = True,
+                      priority: RequestPriority = RequestPriority.SEARCH) -> Optional[Any]:
+        """发送API请求
+        
+        wait为False时，请求配额用完立即放弃而不是等待。
+        参数相同的请求正在进行时不再重复发送，直接等待并共享它的结果。
+        """
+        # 共用同一个调度器（即同一个限流器）的实例才合并，加入者提升的是执行者的排队凭据
+        key = (self.base_url, id(self.scheduler)) + tuple(sorted((name, str(value)) for name, value in params.items()))
+        joined = {}
+        
+        def join(context):
+            # 排队中的请求按等待者中最高的优先级参与调度
+            joined['context'] = context
+            self.scheduler.boost(context, priority)
+        
+        result = self.single_flight.do(
+            key, lambda context: self._send_request(params, wait, priority, context), on_join=join
+        )
+        
+        # 加入的是一个不等待配额、已被放弃的请求，而自己愿意等待时重新发送
+        if result is None and wait and joined.get('context', {}).get('rejected'):
+            result = self._send_request(params, wait, priority, {})
+        return result
+    
+    def _send_request(self, params: Dict, wait: bool, priority: RequestPriority,
+                      context: Dict) -> Optional[Any]:
+        """申请请求配额并发送请求"""
+        # 控制请求频率，配额优先分给高优先级的请求
+        if not self.scheduler.acquire(priority, blocking=wait,
+                                      timeout=self.rate_limit_timeouts.get(priority),
+                                      context=context):
+            context['rejected'] = True
+            self.log(f"请求过于频繁，已放弃请求: {params.get('types')} "
+                     f"(约 {self.rate_limiter.time_until_available():.0f} 秒后恢复)")
+            return None
         
         try:
             self.log(f"发送请求: {params}")
-            response = requests.get(self.base_url, params=params, headers=self.headers, timeout=15)
-            self.last_request_time = time.time()
+            response = self.http.get(self.base_url, params=params, headers=self.headers, timeout=15)
             
             self.log(f"响应状态码: {response.status_code}")
             
@@ -52,8 +104,51 @@ class MusicAPI:
             return None
     
     def search(self, keyword: str, source: str = "netease", 
-               page: int = 1, count: int = 20) -> Optional[List[Dict]]:
-        """搜索音乐"""
+               page: int = 1, count: int = 20, wait: bool = True,
+               priority: RequestPriority = RequestPriority.SEARCH,
+               use_cache: bool = True) -> Optional[List[Track]]:
+        """搜索音乐，返回Track列表（缓存中保存的是API返回的原始数据）"""
+        if self.search_cache and use_cache:
+            cached, state = self.search_cache.get(keyword, source, page, count)
+            if state == SearchCache.STALE:
+                # 先返回旧结果，后台刷新缓存
+                self._revalidate_search(keyword, source, page, count)
+            if state is not None:
+                self.log(f"搜索缓存命中: {keyword} ({source}, 第{page}页)")
+                return self._to_tracks(cached, source)
+        
+        results = self._search_remote(keyword, source, page, count, wait=wait, priority=priority)
+        if self.search_cache and results is not None:
+            self.search_cache.put(keyword, source, page, count, results)
+        return self._to_tracks(results, source)
+    
+    def _to_tracks(self, results: Optional[List[Dict]], source: str) -> Optional[List[Track]]:
+        """把搜索结果转换成Track，跳过格式不正确的条目"""
+        if results is None:
+            return None
+        return [Track.from_dict(item, source) for item in results if isinstance(item, dict)]
+    
+    def _revalidate_search(self, keyword: str, source: str, page: int, count: int):
+        """在后台刷新过期的搜索缓存"""
+        if not self.search_cache.begin_revalidate(keyword, source, page, count):
+            return
+        
+        def revalidate():
+            try:
+                # 后台刷新不等待配额，不和用户的操作抢请求次数
+                results = self._search_remote(keyword, source, page, count, wait=False,
+                                              priority=RequestPriority.PREFETCH)
+                if results is not None:
+                    self.search_cache.put(keyword, source, page, count, results)
+            finally:
+                self.search_cache.end_revalidate(keyword, source, page, count)
+        
+        threading.Thread(target=revalidate, daemon=True, name="SearchRevalidate").start()
+    
+    def _search_remote(self, keyword: str, source: str, page: int, count: int,
+                       wait: bool = True, priority: RequestPriority = RequestPriority.SEARCH
+                       ) -> Optional[List[Dict]]:
+        """向API发送搜索请求"""
         params = {
             'types': 'search',
             'source': source,
@@ -61,7 +156,7 @@ class MusicAPI:
             'count': count,
             'pages': page
         }
-        result = self._make_request(params)
+        result = self._make_request(params, wait=wait, priority=priority)
         
         # 处理API返回格式
         if isinstance(result, dict) and 'data' in result:
@@ -72,19 +167,34 @@ class MusicAPI:
             return None
     
     def get_play_url(self, song_id: str, source: str = "netease", 
-                     quality: str = "320") -> Optional[Dict]:
-        """获取播放链接"""
+                     quality: str = "320", wait: bool = True,
+                     priority: RequestPriority = RequestPriority.PLAY,
+                     force_refresh: bool = False) -> Optional[Dict]:
+        """获取播放链接
+        
+        配置了播放链接缓存时优先使用未过期的缓存；force_refresh为True时
+        （例如CDN返回403/410）丢弃缓存重新请求。
+        """
         # 需要确保song_id是字符串
         if isinstance(song_id, (int, float)):
             song_id = str(int(song_id))
         
+        if self.url_cache:
+            if force_refresh:
+                self.url_cache.invalidate(source, song_id, quality)
+            else:
+                cached = self.url_cache.get(source, song_id, quality)
+                if cached:
+                    self.log(f"播放链接缓存命中: {source}/{song_id}/{quality}")
+                    return cached
+        
         params = {
             'types': 'url',
             'source': source,
             'id': song_id,
             'br': quality
         }
-        result = self._make_request(params)
+        result = self._make_request(params, wait=wait, priority=priority)
         
         # 如果API返回的是列表，取第一个
         if isinstance(result, list) and len(result) > 0:
@@ -102,9 +212,21 @@ class MusicAPI:
                 
                 # 更新返回的URL
                 result['url'] = url
+                
+                if self.url_cache:
+                    self.url_cache.put(source, song_id, quality, result)
         
         return result
     
+    def get_cached_play_url(self, song_id: str, source: str = "netease",
+                            quality: str = "320") -> Optional[Dict]:
+        """只从缓存获取播放链接，不发送请求"""
+        if isinstance(song_id, (int, float)):
+            song_id = str(int(song_id))
+        if not self.url_cache:
+            return None
+        return self.url_cache.get(source, song_id, quality)
+    
     def log(self, message: str):
         """日志记录"""
         print(f"[MusicAPI] {message}")
\ No newline at end of file
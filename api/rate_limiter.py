@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, List
+
+from utils.persistence import atomic_write_json
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+class RateLimiter:
+    """API请求限流器（滑动窗口）
+
+    接口限制为5分钟内最多50次请求。所有 MusicAPI 实例共用同一个限流器，
+    搜索、播放、下载和预取线程的请求都计入同一个窗口。指定 state_file 时，
+    窗口内的请求时间记录在文件中并用文件锁保护，多个进程也能共享配额。
+    """
+
+    _shared: Optional["RateLimiter"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_requests: int = 50, period: float = 300.0,
+                 min_interval: float = 1.0, state_file: Optional[str] = None):
+        self.max_requests = max_requests  # 窗口内允许的最大请求数
+        self.period = period              # 窗口长度（秒）
+        self.min_interval = min_interval  # 相邻两次请求的最小间隔（秒）
+        self.state_file = state_file      # 跨进程共享的请求记录文件，为None时只在进程内限流
+
+        self._timestamps: deque = deque()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'acquired': 0,
+            'rejected': 0,
+            'wait_time': 0.0
+        }
+
+    @classmethod
+    def shared(cls) -> "RateLimiter":
+        """获取进程内共享的限流器（未显式注入限流器时使用）"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        """申请一次请求配额
+
+        blocking为False时没有配额立即返回False；否则等待配额，
+        超过timeout（秒）仍未拿到时返回False。
+        """
+        start = time.time()
+        deadline = start + timeout if timeout is not None else None
+
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                with self._lock:
+                    self.stats['wait_time'] += time.time() - start
+                return True
+
+            if not blocking or (deadline is not None and time.time() + wait > deadline):
+                with self._lock:
+                    self.stats['rejected'] += 1
+                return False
+
+            time.sleep(wait)
+
+    def remaining(self) -> int:
+        """当前窗口内剩余的请求配额"""
+        with self._lock, self._state():
+            self._prune(time.time())
+            return max(0, self.max_requests - len(self._timestamps))
+
+    def time_until_available(self) -> float:
+        """距离下一次可以发送请求还需等待的秒数"""
+        with self._lock, self._state():
+            return max(0.0, self._compute_wait(time.time()))
+
+    def get_stats(self) -> Dict:
+        """获取限流统计信息"""
+        remaining = self.remaining()
+        with self._lock:
+            return {
+                **self.stats,
+                'remaining': remaining,
+                'max_requests': self.max_requests,
+                'period': self.period
+            }
+
+    def try_acquire(self) -> float:
+        """尝试占用一个配额，成功返回0，否则返回需要等待的秒数（不计入拒绝次数）"""
+        with self._lock, self._state(write=True) as state:
+            now = time.time()
+            wait = self._compute_wait(now)
+            if wait > 0:
+                return wait
+            self._timestamps.append(now)
+            state['dirty'] = True
+            self.stats['acquired'] += 1
+            return 0
+
+    def _compute_wait(self, now: float) -> float:
+        """计算还需等待的时间（调用方需持有锁）"""
+        self._prune(now)
+        wait = 0.0
+        if len(self._timestamps) >= self.max_requests:
+            wait = self._timestamps[0] + self.period - now
+        if self._timestamps and self.min_interval > 0:
+            wait = max(wait, self._timestamps[-1] + self.min_interval - now)
+        return wait
+
+    def _prune(self, now: float):
+        """移除窗口之外的请求记录"""
+        while self._timestamps and self._timestamps[0] <= now - self.period:
+            self._timestamps.popleft()
+
+    @contextmanager
+    def _state(self, write: bool = False):
+        """跨进程时加文件锁并同步请求记录，进程内限流时什么也不做"""
+        state = {'dirty': False}
+        if not self.state_file:
+            yield state
+            return
+
+        with self._file_lock():
+            self._timestamps = deque(sorted(self._read_state_file()))
+            yield state
+            if write and state['dirty']:
+                self._write_state_file(list(self._timestamps))
+
+    @contextmanager
+    def _file_lock(self):
+        """获取跨进程文件锁"""
+        lock_path = self.state_file + '.lock'
+        os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+        with open(lock_path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _read_state_file(self) -> List[float]:
+        """读取请求记录文件"""
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return [float(t) for t in json.load(f).get('timestamps', [])]
+        except Exception as e:
+            self.log(f"读取限流记录失败: {str(e)}")
+        return []
+
+    def _write_state_file(self, timestamps: List[float]):
+        """保存请求记录文件（先写临时文件再替换）"""
+        try:
+            atomic_write_json(self.state_file, {'timestamps': timestamps})
+        except Exception as e:
+            self.log(f"保存限流记录失败: {str(e)}")
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[RateLimiter] {message}")
@@ -0,0 +1,189 @@
+import time
+import itertools
+import threading
+from enum import IntEnum
+from typing import Optional, Dict, List
+
+from api.rate_limiter import RateLimiter
+
+class RequestPriority(IntEnum):
+    """API请求优先级，数值越小越优先"""
+    PLAY = 0       # 用户点击播放
+    SEARCH = 1     # 用户搜索
+    PREFETCH = 2   # 预取下一首
+    DOWNLOAD = 3   # 批量下载
+
+class RequestScheduler:
+    """按优先级分配API请求配额
+
+    所有等待配额的请求排成一个队列，配额可用时发给优先级最高的请求，
+    同一优先级按先来后到。为避免低优先级请求被饿死，请求每等待
+    aging_interval 秒优先级提升一级。
+    """
+
+    _instances: Dict[int, "RequestScheduler"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, rate_limiter: RateLimiter, aging_interval: float = 30.0):
+        self.rate_limiter = rate_limiter
+        self.aging_interval = aging_interval  # 等待多久提升一级优先级（秒）
+
+        self._waiting: List[Dict] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._trying: Optional[Dict] = None  # 正在向限流器申请配额的请求
+        self._available_at = 0.0             # 限流器报告的下次可用时间
+
+        self.stats = {priority.name: {'requests': 0, 'rejected': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+                      for priority in RequestPriority}
+
+    @classmethod
+    def shared(cls, rate_limiter: RateLimiter) -> "RequestScheduler":
+        """获取某个限流器对应的调度器（共用限流器的MusicAPI实例也共用调度器）"""
+        with cls._instances_lock:
+            scheduler = cls._instances.get(id(rate_limiter))
+            if scheduler is None or scheduler.rate_limiter is not rate_limiter:
+                scheduler = cls(rate_limiter)
+                cls._instances[id(rate_limiter)] = scheduler
+            return scheduler
+
+    def acquire(self, priority: RequestPriority = RequestPriority.SEARCH,
+                blocking: bool = True, timeout: Optional[float] = None,
+                context: Optional[Dict] = None) -> bool:
+        """按优先级申请一次请求配额
+
+        blocking为False时，前面有请求在排队或没有配额就立即返回False；
+        否则排队等待，超过timeout（秒）返回False。
+        传入context时，排队凭据记录在context['ticket']中，供 boost() 提升优先级；
+        排队前已经收到的提升（context['boost']）在创建凭据时生效。
+        只有队首的请求向限流器申请配额，申请（可能读写跨进程的记录文件）时不持有
+        队列的锁，其他请求的排队和 boost() 不会被磁盘读写阻塞。
+        """
+        ticket = {'priority': int(priority), 'seq': next(self._seq), 'enqueued': time.time()}
+        deadline = ticket['enqueued'] + timeout if timeout is not None else None
+
+        with self._cond:
+            if context is not None:
+                ticket['priority'] = min(ticket['priority'], context.get('boost', ticket['priority']))
+                context['ticket'] = ticket
+            self._waiting.append(ticket)
+            # 新请求可能排到队首，唤醒等待者重新判断
+            self._cond.notify_all()
+        try:
+            while True:
+                with self._cond:
+                    if not self._wait_turn(ticket, blocking, deadline):
+                        self._record(priority, time.time() - ticket['enqueued'] if blocking else 0, rejected=True)
+                        return False
+                    self._trying = ticket
+
+                wait = 0.0
+                try:
+                    wait = self.rate_limiter.try_acquire()
+                finally:
+                    with self._cond:
+                        self._trying = None
+                        if wait > 0:
+                            self._available_at = time.time() + wait
+                        # 队首可能已经变化，唤醒新的队首
+                        self._cond.notify_all()
+
+                if wait <= 0:
+                    with self._cond:
+                        self._record(priority, time.time() - ticket['enqueued'])
+                    return True
+                if not blocking:
+                    with self._cond:
+                        self._record(priority, 0, rejected=True)
+                    return False
+        finally:
+            with self._cond:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def _wait_turn(self, ticket: Dict, blocking: bool, deadline: Optional[float]) -> bool:
+        """等到该请求排在队首、没有其他请求正在申请且预计有配额时返回True，
+        不等待或超时返回False（调用方需持有锁）"""
+        while True:
+            now = time.time()
+            is_head = self._head() is ticket
+            if is_head and self._trying is None and now >= self._available_at:
+                return True
+            if not blocking:
+                return False
+
+            if not is_head:
+                # 队列变化和提升优先级时会被唤醒，此外只需在等待时间让优先级发生变化时醒来
+                wait = self._next_aging(now)
+            elif self._trying is None:
+                wait = self._available_at - now
+            else:
+                wait = None  # 等正在申请的请求结束后唤醒
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                wait = remaining if wait is None else min(wait, remaining)
+            self._cond.wait(None if wait is None else max(wait, 0.01))
+
+    def boost(self, context: Dict, priority: RequestPriority):
+        """把仍在排队的请求提升到指定优先级（合并请求时后到者优先级更高的情况）
+
+        执行者还没有开始排队时记录在context['boost']中，排队时生效。
+        """
+        with self._cond:
+            ticket = context.get('ticket')
+            if ticket is None:
+                context['boost'] = min(context.get('boost', int(priority)), int(priority))
+            elif ticket in self._waiting and int(priority) < ticket['priority']:
+                ticket['priority'] = int(priority)
+                self._cond.notify_all()
+
+    def get_queue_length(self) -> int:
+        """当前排队等待的请求数"""
+        with self._cond:
+            return len(self._waiting)
+
+    def get_stats(self) -> Dict:
+        """获取各优先级的排队统计"""
+        with self._cond:
+            result = {}
+            for name, item in self.stats.items():
+                result[name] = {
+                    **item,
+                    'avg_wait': item['total_wait'] / item['requests'] if item['requests'] else 0.0
+                }
+            return result
+
+    def _head(self) -> Optional[Dict]:
+        """当前应获得配额的请求（调用方需持有锁）"""
+        if not self._waiting:
+            return None
+        now = time.time()
+        return min(self._waiting, key=lambda t: (self._effective_priority(t, now), t['seq']))
+
+    def _next_aging(self, now: float) -> Optional[float]:
+        """距离某个排队请求因等待而提升优先级还有多少秒（调用方需持有锁）"""
+        if self.aging_interval <= 0 or not self._waiting:
+            return None
+        return min(self.aging_interval - (now - t['enqueued']) % self.aging_interval for t in self._waiting)
+
+    def _effective_priority(self, ticket: Dict, now: float) -> int:
+        """计入等待时间提升后的优先级"""
+        if self.aging_interval <= 0:
+            return ticket['priority']
+        return ticket['priority'] - int((now - ticket['enqueued']) / self.aging_interval)
+
+    def _record(self, priority: RequestPriority, waited: float, rejected: bool = False):
+        """记录排队统计（调用方需持有锁）"""
+        item = self.stats[RequestPriority(priority).name]
+        if rejected:
+            item['rejected'] += 1
+            return
+        item['requests'] += 1
+        item['total_wait'] += waited
+        item['max_wait'] = max(item['max_wait'], waited)
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[RequestScheduler] {message}")
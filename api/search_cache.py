@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple
+
+from utils.persistence import atomic_write_json
+
+class SearchCache:
+    """搜索结果缓存
+
+    两级缓存：内存中的LRU在前，磁盘上的JSON文件在后，按
+    (关键词, 音乐源, 页码, 数量) 寻址。未找到结果的搜索也会缓存一段较短的时间。
+    结果超过 ttl 后视为过期但仍可在 stale_ttl 内先返回，同时由调用方在后台刷新。
+    """
+
+    FRESH = "fresh"
+    STALE = "stale"
+
+    def __init__(self, cache_dir: Optional[str] = None, memory_size: int = 100,
+                 ttl: float = 3600.0, negative_ttl: float = 300.0, stale_ttl: float = 86400.0):
+        if cache_dir is None:
+            from utils.file_handler import FileHandler
+            cache_dir = os.path.join(FileHandler.get_data_dir(), "search_cache")
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size    # 内存中最多保留多少条结果
+        self.ttl = ttl                    # 有结果时的有效期（秒）
+        self.negative_ttl = negative_ttl  # 无结果时的有效期（秒）
+        self.stale_ttl = stale_ttl        # 过期后仍可先返回旧结果的时长（秒）
+
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._revalidating = set()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'stale_hits': 0,
+            'misses': 0
+        }
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(keyword: str, source: str, page: int, count: int) -> str:
+        """生成缓存键"""
+        raw = f"{keyword.strip().lower()}\n{source}\n{page}\n{count}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, keyword: str, source: str, page: int = 1,
+            count: int = 20) -> Tuple[Optional[List[Dict]], Optional[str]]:
+        """查找缓存
+
+        返回 (结果, 状态)，状态为 FRESH、STALE 或 None（未命中）。
+        """
+        key = self.make_key(keyword, source, page, count)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                self._memory.move_to_end(key)
+                from_memory = True
+            else:
+                entry = self._read_entry(key)
+                from_memory = False
+                if entry:
+                    self._remember(key, entry)
+
+            if not entry or now - entry['stored_at'] > self._max_age(entry) + self.stale_ttl:
+                self.stats['misses'] += 1
+                return None, None
+
+            if now - entry['stored_at'] > self._max_age(entry):
+                self.stats['stale_hits'] += 1
+                return list(entry['results']), self.STALE
+
+            self.stats['memory_hits' if from_memory else 'disk_hits'] += 1
+            return list(entry['results']), self.FRESH
+
+    def put(self, keyword: str, source: str, page: int, count: int, results: List[Dict]):
+        """保存搜索结果（空列表表示没有找到歌曲）"""
+        key = self.make_key(keyword, source, page, count)
+        entry = {
+            'keyword': keyword,
+            'source': source,
+            'page': page,
+            'count': count,
+            'results': results,
+            'stored_at': time.time()
+        }
+        with self._lock:
+            self._remember(key, entry)
+            self._revalidating.discard(key)
+        self._write_entry(key, entry)
+
+    def begin_revalidate(self, keyword: str, source: str, page: int = 1, count: int = 20) -> bool:
+        """标记开始后台刷新，已有刷新在进行时返回False"""
+        key = self.make_key(keyword, source, page, count)
+        with self._lock:
+            if key in self._revalidating:
+                return False
+            self._revalidating.add(key)
+            return True
+
+    def end_revalidate(self, keyword: str, source: str, page: int = 1, count: int = 20):
+        """后台刷新结束（刷新失败时也要调用）"""
+        key = self.make_key(keyword, source, page, count)
+        with self._lock:
+            self._revalidating.discard(key)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._memory.clear()
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.json'):
+                self._remove_file(os.path.join(self.cache_dir, filename))
+
+    def cleanup(self):
+        """删除磁盘上已经彻底过期的缓存文件"""
+        removed = 0
+        now = time.time()
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                if now - os.path.getmtime(path) > self.ttl + self.stale_ttl:
+                    if self._remove_file(path):
+                        removed += 1
+            except OSError:
+                pass
+        if removed:
+            self.log(f"清理过期搜索缓存 {removed} 个")
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            hits = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['stale_hits']
+            lookups = hits + self.stats['misses']
+            return {
+                **self.stats,
+                'memory_entries': len(self._memory),
+                'hit_rate': hits / lookups if lookups else 0.0
+            }
+
+    def _max_age(self, entry: Dict) -> float:
+        """缓存项的有效期"""
+        return self.ttl if entry['results'] else self.negative_ttl
+
+    def _remember(self, key: str, entry: Dict):
+        """放入内存LRU（调用方需持有锁）"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _path_for(self, key: str) -> str:
+        """缓存文件路径"""
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _read_entry(self, key: str) -> Optional[Dict]:
+        """从磁盘读取缓存项"""
+        path = self._path_for(key)
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            self.log(f"读取搜索缓存失败: {str(e)}")
+        return None
+
+    def _write_entry(self, key: str, entry: Dict):
+        """写入磁盘（先写临时文件再替换）"""
+        try:
+            atomic_write_json(self._path_for(key), entry)
+        except Exception as e:
+            self.log(f"保存搜索缓存失败: {str(e)}")
+
+    def _remove_file(self, path: str) -> bool:
+        """删除文件，忽略错误"""
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[SearchCache] {message}")
@@ -0,0 +1,78 @@
+import copy
+import threading
+from typing import Callable, Dict, Hashable, Optional, Any
+
+class SingleFlight:
+    """合并相同的并发请求
+
+    同一个键同时只执行一次：第一个调用者负责执行，期间到达的调用者
+    等待并共享它的结果（各自拿到一份深拷贝）。执行结束后键被移除，
+    之后的调用重新执行。
+    """
+
+    _shared: Optional["SingleFlight"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Dict] = {}
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'calls': 0,
+            'executed': 0,
+            'deduplicated': 0
+        }
+
+    @classmethod
+    def shared(cls) -> "SingleFlight":
+        """获取进程内共享的实例（界面和下载管理器各自的MusicAPI也能合并相同的请求）"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def do(self, key: Hashable, fn: Callable, on_join: Optional[Callable] = None) -> Any:
+        """执行fn(context)，相同键的并发调用共享同一次执行
+
+        context是本次执行共享的字典，执行者可以在里面记录状态；
+        后到的调用者加入时会先调用on_join(context)。
+        """
+        with self._lock:
+            self.stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = {'done': threading.Event(), 'result': None, 'error': None, 'context': {}}
+                self._calls[key] = call
+                self.stats['executed'] += 1
+                leader = True
+            else:
+                self.stats['deduplicated'] += 1
+                leader = False
+
+        if not leader:
+            if on_join:
+                on_join(call['context'])
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return copy.deepcopy(call['result'])
+
+        try:
+            call['result'] = fn(call['context'])
+            return call['result']
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['done'].set()
+
+    def get_stats(self) -> Dict:
+        """获取合并统计"""
+        with self._lock:
+            return {
+                **self.stats,
+                'in_flight': len(self._calls),
+                'dedup_rate': self.stats['deduplicated'] / self.stats['calls'] if self.stats['calls'] else 0.0
+            }
@@ -0,0 +1,163 @@
+import sys
+from collections.abc import Mapping
+from typing import Optional, Dict, Tuple, Any
+
+def artist_names(artist_data) -> Tuple[str, ...]:
+    """把API返回的艺术家信息（字典或字符串的列表，或单个字符串）整理成名字元组"""
+    if isinstance(artist_data, (list, tuple)):
+        names = []
+        for artist in artist_data:
+            if isinstance(artist, dict):
+                name = artist.get('name', '')
+            elif isinstance(artist, str):
+                name = artist
+            else:
+                continue
+            if name:
+                names.append(name)
+        return tuple(names)
+    if artist_data is None or artist_data == '':
+        return ()
+    return (str(artist_data),)
+
+def format_artist(artist_data, separator: str = ' / ') -> str:
+    """艺术家显示文字"""
+    if isinstance(artist_data, str):
+        return artist_data
+    return separator.join(artist_names(artist_data))
+
+def artist_text_of(song) -> str:
+    """歌曲的艺术家显示文字，Track直接使用预先生成的文字"""
+    if isinstance(song, Track):
+        return song.artist_text
+    return format_artist(song.get('artist', []))
+
+class Track(Mapping):
+    """歌曲记录
+
+    搜索结果、收藏、播放列表中的歌曲都用Track表示，代替各处复制的字典。
+    使用 __slots__ 不带实例字典，音乐源字符串经过 sys.intern 共享，
+    艺术家和 "歌名 - 艺术家" 的显示文字在创建时生成一次，界面不再重复拼接。
+    Track创建后不可修改，可以在列表、面板和播放器之间直接共享而不必复制；
+    需要修改时用 replace() 生成新的Track。
+
+    Track实现了只读的Mapping接口（song.get('name')、song['id']、dict(song)），
+    API返回的其他字段保存在 extra 中，to_dict() 可以还原成原来的字典。
+    """
+
+    FIELDS = ('id', 'name', 'artist', 'album', 'source', 'pic_id', 'url_id', 'lyric_id')
+
+    __slots__ = FIELDS + ('extra', 'artist_text', 'display_name')
+
+    def __init__(self, id: Any = '', name: str = '未知歌曲', artist=(), album: Optional[str] = None,
+                 source: str = 'netease', pic_id: Any = None, url_id: Any = None,
+                 lyric_id: Any = None, extra: Optional[Dict] = None):
+        set_field = object.__setattr__
+        artist = artist_names(artist) if not isinstance(artist, str) else artist
+        set_field(self, 'id', id)
+        set_field(self, 'name', name)
+        set_field(self, 'artist', artist)
+        set_field(self, 'album', album)
+        set_field(self, 'source', sys.intern(source or 'netease'))
+        set_field(self, 'pic_id', pic_id)
+        set_field(self, 'url_id', url_id)
+        set_field(self, 'lyric_id', lyric_id)
+        set_field(self, 'extra', extra or None)
+        set_field(self, 'artist_text', format_artist(artist))
+        set_field(self, 'display_name', f"{name} - {self.artist_text}")
+
+    @classmethod
+    def from_dict(cls, data, source: Optional[str] = None) -> 'Track':
+        """从API返回或保存的字典创建Track，缺少来源时使用source"""
+        if isinstance(data, Track):
+            return data
+        extra = {key: value for key, value in data.items() if key not in cls.FIELDS}
+        return cls(id=data.get('id', ''),
+                   name=data.get('name') or '未知歌曲',
+                   artist=data.get('artist', ()),
+                   album=data.get('album'),
+                   source=data.get('source') or source or 'netease',
+                   pic_id=data.get('pic_id'),
+                   url_id=data.get('url_id'),
+                   lyric_id=data.get('lyric_id'),
+                   extra=extra)
+
+    def replace(self, **changes) -> 'Track':
+        """返回修改了指定字段的新Track"""
+        data = self.to_dict()
+        data.update(changes)
+        return Track.from_dict(data)
+
+    def to_dict(self) -> Dict:
+        """转换成可以保存为JSON的字典"""
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['artist'] = self.artist if isinstance(self.artist, str) else list(self.artist)
+        data = {key: value for key, value in data.items() if value is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        """歌曲的唯一键 (音乐源, 歌曲ID)"""
+        return self.source, str(self.id)
+
+    # ========== 只读Mapping接口 ==========
+
+    def __getitem__(self, key: str):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if getattr(self, field) is not None:
+                yield field
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        count = sum(1 for field in self.FIELDS if getattr(self, field) is not None)
+        return count + (len(self.extra) if self.extra else 0)
+
+    def __contains__(self, key) -> bool:
+        if key in self.FIELDS:
+            return getattr(self, key) is not None
+        return bool(self.extra) and key in self.extra
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    # ========== 不可修改 ==========
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Track不可修改，请使用replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError("Track不可修改，请使用replace()")
+
+    def copy(self) -> 'Track':
+        """不可修改，直接返回自身"""
+        return self
+
+    def __copy__(self) -> 'Track':
+        return self
+
+    def __deepcopy__(self, memo) -> 'Track':
+        return self
+
+    def __reduce__(self):
+        return Track.from_dict, (self.to_dict(),)
+
+    def __repr__(self) -> str:
+        return f"Track({self.source}:{self.id} {self.display_name!r})"
@@ -0,0 +1,215 @@
+import os
+import re
+import json
+import time
+import threading
+from datetime import datetime, timezone, timedelta
+from urllib.parse import urlparse, parse_qs
+from typing import Optional, Dict
+
+from utils.persistence import atomic_write_json
+
+class UrlCache:
+    """播放链接缓存
+
+    按 (音乐源, 歌曲ID, 音质) 保存 get_play_url 的结果（含 br 和 size）。
+    有效期优先从签名链接中的过期时间推断，推断不出时使用默认TTL。
+    缓存保存在 url_cache.json 中，重启后仍然有效。传入 persistence 时
+    由后台线程合并保存，不在解析链接的线程中写文件。
+    """
+
+    CACHE_FILE = "url_cache.json"
+
+    # 查询参数中常见的过期时间字段
+    EXPIRY_PARAMS = ('expires', 'expire', 'x-expires', 'deadline', 'e')
+    # 网易云链接路径中的时间戳，例如 /20240101123456/<签名>/...（北京时间）
+    NETEASE_PATH_TIME = re.compile(r'^/(\d{14})/')
+
+    def __init__(self, cache_file: Optional[str] = None, default_ttl: float = 1200.0,
+                 max_ttl: float = 6 * 3600.0, safety_margin: float = 60.0, max_entries: int = 1000,
+                 persistence=None):
+        if cache_file is None:
+            from utils.file_handler import FileHandler
+            cache_file = os.path.join(FileHandler.get_data_dir(), self.CACHE_FILE)
+        self.cache_file = cache_file
+        self.default_ttl = default_ttl      # 推断不出过期时间时的有效期（秒）
+        self.max_ttl = max_ttl              # 有效期上限（秒）
+        self.safety_margin = safety_margin  # 提前多久视为过期（秒），留出下载时间
+        self.max_entries = max_entries
+        self.persistence = persistence  # 可选的PersistenceScheduler
+
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'invalidations': 0
+        }
+
+        self._load()
+        if self.persistence:
+            self.persistence.register('url_cache', self.flush)
+
+    @staticmethod
+    def make_key(source: str, song_id, quality) -> str:
+        """生成缓存键"""
+        return f"{source}:{song_id}:{quality}"
+
+    def get(self, source: str, song_id, quality) -> Optional[Dict]:
+        """获取未过期的播放链接数据"""
+        key = self.make_key(source, song_id, quality)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                self.stats['misses'] += 1
+                return None
+            if time.time() >= entry['expires_at']:
+                del self._entries[key]
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return dict(entry['data'])
+
+    def put(self, source: str, song_id, quality, url_data: Dict):
+        """保存播放链接数据"""
+        url = url_data.get('url') if isinstance(url_data, dict) else None
+        if not url:
+            return
+
+        now = time.time()
+        expires_at = self.infer_expiry(url)
+        if expires_at is None:
+            expires_at = now + self.default_ttl
+        else:
+            expires_at -= self.safety_margin
+        expires_at = min(expires_at, now + self.max_ttl)
+        if expires_at <= now:
+            return
+
+        key = self.make_key(source, song_id, quality)
+        with self._lock:
+            self._entries[key] = {
+                'data': dict(url_data),
+                'br': url_data.get('br'),
+                'size': url_data.get('size'),
+                'resolved_at': now,
+                'expires_at': expires_at
+            }
+            self._prune(now)
+            self._changed()
+
+    def invalidate(self, source: str, song_id, quality) -> bool:
+        """链接失效（例如CDN返回403/410）时移除缓存"""
+        key = self.make_key(source, song_id, quality)
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return False
+            self.stats['invalidations'] += 1
+            self._changed()
+            return True
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._changed()
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'hit_rate': self.stats['hits'] / lookups if lookups else 0.0
+            }
+
+    @classmethod
+    def infer_expiry(cls, url: str) -> Optional[float]:
+        """从签名链接推断过期时间（Unix时间戳），推断不出返回None"""
+        try:
+            parsed = urlparse(url)
+        except ValueError:
+            return None
+
+        query = {name.lower(): values for name, values in parse_qs(parsed.query).items()}
+        for name in cls.EXPIRY_PARAMS:
+            for value in query.get(name, []):
+                timestamp = cls._parse_timestamp(value)
+                if timestamp:
+                    return timestamp
+
+        # 阿里云CDN鉴权：auth_key=<过期时间戳>-<随机数>-<uid>-<签名>
+        for value in query.get('auth_key', []):
+            timestamp = cls._parse_timestamp(value.split('-', 1)[0])
+            if timestamp:
+                return timestamp
+
+        match = cls.NETEASE_PATH_TIME.match(parsed.path)
+        if match:
+            try:
+                beijing = timezone(timedelta(hours=8))
+                return datetime.strptime(match.group(1), '%Y%m%d%H%M%S').replace(tzinfo=beijing).timestamp()
+            except ValueError:
+                pass
+        return None
+
+    @staticmethod
+    def _parse_timestamp(value: str) -> Optional[float]:
+        """解析10位（秒）或13位（毫秒）的Unix时间戳"""
+        if not value.isdigit():
+            return None
+        if len(value) == 10:
+            return float(value)
+        if len(value) == 13:
+            return int(value) / 1000.0
+        return None
+
+    def _prune(self, now: float):
+        """移除过期项，超出数量上限时移除最早解析的（调用方需持有锁）"""
+        for key in [k for k, e in self._entries.items() if e['expires_at'] <= now]:
+            del self._entries[key]
+        if len(self._entries) > self.max_entries:
+            oldest = sorted(self._entries, key=lambda k: self._entries[k]['resolved_at'])
+            for key in oldest[:len(self._entries) - self.max_entries]:
+                del self._entries[key]
+
+    def _load(self):
+        """加载缓存文件，丢弃已过期的链接"""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                now = time.time()
+                self._entries = {key: entry for key, entry in data.get('entries', {}).items()
+                                 if entry.get('expires_at', 0) > now}
+                self.log(f"加载播放链接缓存，共 {len(self._entries)} 条")
+        except Exception as e:
+            self.log(f"加载播放链接缓存失败: {str(e)}")
+            self._entries = {}
+
+    def flush(self):
+        """立即保存缓存文件"""
+        with self._lock:
+            self._save()
+
+    def _changed(self):
+        """缓存有变化：有后台保存时标记待保存，否则立即写入（调用方需持有锁）"""
+        if self.persistence:
+            self.persistence.mark_dirty('url_cache')
+        else:
+            self._save()
+
+    def _save(self):
+        """保存缓存文件（先写临时文件再替换，调用方需持有锁）"""
+        try:
+            atomic_write_json(self.cache_file, {'version': 1, 'entries': self._entries})
+        except Exception as e:
+            self.log(f"保存播放链接缓存失败: {str(e)}")
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[UrlCache] {message}")
@@ -2,9 +2,9 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import json
 from datetime import datetime
 from .base_panel import BasePanel
+from api.track import format_artist
 
 class DownloadsPanel(BasePanel):
     """下载管理面板"""
@@ -14,6 +14,7 @@ class DownloadsPanel(BasePanel):
         self.download_path = "downloads/"  # 先设置这个属性
         self.download_history = []
         self.download_queue_items = {}  # 添加下载队列相关变量
+        self.queue_tree_items = {}  # 下载任务job_id -> 树状视图项目，用于更新进度
         super().__init__(parent, main_app)  # 然后调用父类初始化
 
     def setup_ui(self):
@@ -71,6 +72,14 @@ class DownloadsPanel(BasePanel):
         ttk.Button(queue_action_frame, text="取消选中", command=self.cancel_selected_download).grid(row=0, column=1, padx=2)
         ttk.Button(queue_action_frame, text="全部取消", command=self.cancel_all_downloads).grid(row=0, column=2, padx=2)
 
+        # 下载线程池状态
+        self.pool_stats_label = ttk.Label(queue_frame, text="下载线程: 空闲")
+        self.pool_stats_label.grid(row=2, column=0, columnspan=2, pady=(5, 0), sticky=tk.W)
+
+        # 带宽分配
+        self.bandwidth_label = ttk.Label(queue_frame, text="带宽: 空闲")
+        self.bandwidth_label.grid(row=3, column=0, columnspan=2, sticky=tk.W)
+
         # 下载历史列表
         history_frame = ttk.LabelFrame(self.frame, text="下载历史/本地文件", padding="10")
         history_frame.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
@@ -127,6 +136,8 @@ class DownloadsPanel(BasePanel):
         self._init_download_folder()
         # 初始化下载队列显示
         self.update_download_queue()
+        # 定时刷新下载线程池状态
+        self._refresh_pool_stats()
 
     def _init_download_folder(self):
         """初始化下载文件夹"""
@@ -192,6 +203,7 @@ class DownloadsPanel(BasePanel):
 
         # 清空队列项目映射
         self.download_queue_items.clear()
+        self.queue_tree_items.clear()
 
         # 获取下载队列
         if hasattr(self.main_app, 'get_download_queue'):
@@ -199,7 +211,7 @@ class DownloadsPanel(BasePanel):
 
             for download_item in queue:
                 name = download_item.get('name', '未知歌曲')
-                artist = self._format_artist(download_item.get('artist', ''))
+                artist = format_artist(download_item.get('artist', ''))
                 progress = download_item.get('progress', 0)
                 status = download_item.get('status', '未知')
                 speed = download_item.get('speed', '')
@@ -212,26 +224,69 @@ class DownloadsPanel(BasePanel):
 
                 # 保存下载项ID
                 self.download_queue_items[item_id] = download_item.get('id', '')
+                self.queue_tree_items[download_item.get('job_id')] = item_id
 
         self.log(f"更新下载队列，共 {len(self.download_queue_items)} 个任务")
 
     def update_download_progress(self, download_item):
         """更新单个下载项的进度"""
         # 查找对应的项目
-        for item_id, download_id in self.download_queue_items.items():
-            if download_id == download_item.get('id', ''):
-                name = download_item.get('name', '未知歌曲')
-                artist = self._format_artist(download_item.get('artist', ''))
-                progress = download_item.get('progress', 0)
-                status = download_item.get('status', '未知')
-                speed = download_item.get('speed', '')
+        item_id = self.queue_tree_items.get(download_item.get('job_id'))
+        if item_id is None or not self.queue_tree.exists(item_id):
+            return
 
-                # 进度显示
-                progress_str = f"{progress:.1f}%" if progress > 0 else "等待中"
+        name = download_item.get('name', '未知歌曲')
+        artist = format_artist(download_item.get('artist', ''))
+        progress = download_item.get('progress', 0)
+        status = download_item.get('status', '未知')
+        speed = download_item.get('speed', '')
+
+        # 进度显示
+        progress_str = f"{progress:.1f}%" if progress > 0 else "等待中"
 
-                # 更新树状视图项目
-                self.queue_tree.item(item_id, values=(name, artist, progress_str, status, speed))
-                break
+        # 更新树状视图项目
+        self.queue_tree.item(item_id, values=(name, artist, progress_str, status, speed))
+
+    def update_download_progress_batch(self, download_items):
+        """一次更新多个下载项的进度"""
+        for download_item in download_items:
+            self.update_download_progress(download_item)
+
+    def _refresh_pool_stats(self):
+        """刷新下载线程池的吞吐量和利用率显示"""
+        try:
+            if hasattr(self.main_app, 'get_download_stats'):
+                stats = self.main_app.get_download_stats()
+                if stats['active'] or stats['ready'] or stats['queued'] or stats['resolving']:
+                    busy = ", ".join(f"{w['utilisation'] * 100:.0f}%" for w in stats['workers'])
+                    text = (f"下载线程: {stats['active']}/{stats['max_workers']} 活动 | "
+                            f"待下载 {stats['ready']} | 待解析 {stats['queued'] + stats['resolving']} | "
+                            f"吞吐 {stats['throughput'] / 1024:.1f} KB/s | 利用率 {busy}")
+                else:
+                    text = "下载线程: 空闲"
+                self.pool_stats_label.config(text=text)
+            if hasattr(self.main_app, 'get_bandwidth_allocation'):
+                self.bandwidth_label.config(text=self._format_bandwidth(self.main_app.get_bandwidth_allocation()))
+        except Exception as e:
+            self.log(f"刷新下载统计失败: {str(e)}", "ERROR")
+        self.frame.after(1000, self._refresh_pool_stats)
+
+    def _format_bandwidth(self, allocation):
+        """格式化各使用者的带宽分配"""
+        kind_names = {'playback': '播放', 'prefetch': '预取', 'download': '下载'}
+        parts = [f"{kind_names.get(c['kind'], c['kind'])}[{c['name'][:12]}] {c['rate'] / 1024:.0f} KB/s"
+                 for c in allocation['consumers']]
+        if not parts:
+            return "带宽: 空闲"
+
+        limit = allocation['background_limit']
+        if allocation['paused']:
+            limit_text = "后台已暂停（播放缓冲中）"
+        elif limit:
+            limit_text = f"后台上限 {limit / 1024:.0f} KB/s"
+        else:
+            limit_text = "后台不限速"
+        return f"带宽: {' | '.join(parts)} | {limit_text}"
 
     def cancel_selected_download(self):
         """取消选中的下载"""
@@ -426,49 +481,8 @@ class DownloadsPanel(BasePanel):
         else:
             return f"{size_bytes/(1024*1024*1024):.1f}GB"
 
-    def _save_download_history(self):
-        """保存下载历史到文件"""
-        try:
-            history_file = os.path.join(self.download_path, "download_history.json")
-
-            # 确保目录存在
-            os.makedirs(os.path.dirname(history_file), exist_ok=True)
-
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.download_history, f, ensure_ascii=False, indent=2)
-
-            self.log(f"下载历史已保存到: {history_file}")
-
-        except Exception as e:
-            self.log(f"保存下载历史失败: {str(e)}", "ERROR")
-
     def _load_download_history(self):
-        """加载下载历史"""
-        try:
-            history_file = os.path.join(self.download_path, "download_history.json")
-            if os.path.exists(history_file):
-                with open(history_file, 'r', encoding='utf-8') as f:
-                    self.download_history = json.load(f)
-                self.log(f"加载下载历史，共 {len(self.download_history)} 条记录")
-            else:
-                self.log("下载历史文件不存在，创建新文件")
-                # 创建空的历史文件
-                self._save_download_history()
-        except Exception as e:
-            self.log(f"加载下载历史失败: {str(e)}", "ERROR")
-            self.download_history = []
-
-    def _format_artist(self, artist_data):
-        """格式化艺术家信息"""
-        if isinstance(artist_data, list):
-            artist_names = []
-            for artist in artist_data:
-                if isinstance(artist, dict):
-                    artist_names.append(artist.get('name', ''))
-                elif isinstance(artist, str):
-                    artist_names.append(artist)
-            return ' / '.join([a for a in artist_names if a])
-        elif isinstance(artist_data, str):
-            return artist_data
-        else:
-            return str(artist_data)
\ No newline at end of file
+        """从下载管理器获取下载历史（历史由DownloadManager统一保存）"""
+        if hasattr(self.main_app, 'get_download_history'):
+            self.download_history = self.main_app.get_download_history()
+            self.log(f"加载下载历史，共 {len(self.download_history)} 条记录")
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from player.enhanced_audio_player import EnhancedAudioPlayer, PlayerState
+from player.enhanced_audio_player import EnhancedAudioPlayer, PlayerState, LoadState
+from api.track import artist_text_of
 
 class EnhancedPlayerWindow:
     """增强音乐播放器窗口，支持播放列表"""
@@ -8,7 +9,9 @@ class EnhancedPlayerWindow:
     def __init__(self, parent, main_app):
         self.parent = parent
         self.main_app = main_app
-        self.player = EnhancedAudioPlayer()
+        self.player = EnhancedAudioPlayer(audio_cache=getattr(main_app, 'audio_cache', None),
+                                          http_pool=getattr(main_app, 'http_pool', None),
+                                          bandwidth=getattr(main_app, 'bandwidth', None))
         
         # 设置播放器回调
         self.player.on_state_change = self._on_player_state_change
@@ -16,6 +19,7 @@ class EnhancedPlayerWindow:
         self.player.on_song_change = self._on_song_change
         self.player.on_playlist_end = self._on_playlist_end
         self.player.on_need_next_song = self._on_need_next_song
+        self.player.on_load_state_change = self._on_player_load_state_change
         
         # 进度条控制
         self.is_dragging = False
@@ -53,6 +57,9 @@ class EnhancedPlayerWindow:
         self.song_album = tk.Label(info_frame, text="未知专辑", anchor="w")
         self.song_album.grid(row=2, column=0, sticky=tk.W)
         
+        self.load_status_label = tk.Label(info_frame, text="", anchor="w", fg="gray")
+        self.load_status_label.grid(row=3, column=0, sticky=tk.W)
+        
         # 播放进度条
         self.progress_frame = ttk.Frame(self.frame)
         self.progress_frame.grid(row=1, column=1, columnspan=2, 
@@ -188,23 +195,17 @@ class EnhancedPlayerWindow:
         if self.main_app and hasattr(self.main_app, 'play_song_from_playlist_by_index'):
             self.main_app.play_song_from_playlist_by_index(index)
     
-    def set_playlist(self, playlist):
-        """设置播放列表"""
-        self.player.set_playlist(playlist)
-        self._update_playlist_info()
-    
-    def add_to_playlist(self, song_data):
-        """添加到播放列表"""
-        self.player.add_to_playlist(song_data)
+    def set_playlist_model(self, model):
+        """使用与主窗口共用的播放列表模型，列表变化时更新播放列表信息"""
+        self.player.set_playlist_model(model)
+        model.add_listener(lambda change: self.parent.after(0, self._update_playlist_info))
         self._update_playlist_info()
     
-    def clear_playlist(self):
-        """清空播放列表"""
-        self.player.clear_playlist()
-        self._update_playlist_info()
-    
-    def play_song(self, song_data: dict, play_url_or_path: str):
-        """播放歌曲（支持URL或本地文件路径）"""
+    def play_song(self, song_data: dict, play_url_or_path: str, cache_key: tuple = None):
+        """播放歌曲（支持URL或本地文件路径）
+        
+        cache_key 为 (音乐源, 歌曲ID, 音质)，用于读写本地音频缓存。
+        """
         if self.player.play_specific(song_data):
             self.current_song = song_data
             self.current_url_or_path = play_url_or_path
@@ -216,8 +217,13 @@ class EnhancedPlayerWindow:
             self.time_label.config(text="0:00 / 0:00")
             
             if play_url_or_path.startswith('http'):
-                if self.player.load(play_url_or_path):
-                    self.player.play()
+                # 在后台线程中下载，加载完成后回到主线程开始播放
+                self.player.load_async(
+                    play_url_or_path,
+                    on_ready=lambda: self.parent.after(0, self._on_track_ready, play_url_or_path),
+                    on_error=lambda msg: self.parent.after(0, self._on_track_load_error, msg),
+                    cache_key=cache_key
+                )
             else:
                 try:
                     self.player.load_local_file(play_url_or_path)
@@ -226,8 +232,22 @@ class EnhancedPlayerWindow:
                     self.log(f"加载本地文件失败: {str(e)}")
                     messagebox.showerror("错误", f"加载本地文件失败: {str(e)}")
     
+    def _on_track_ready(self, play_url: str):
+        """异步加载完成，开始播放"""
+        # 加载期间用户可能已切换到其他歌曲
+        if play_url != self.current_url_or_path:
+            return
+        self.player.play()
+    
+    def _on_track_load_error(self, error_msg: str):
+        """异步加载失败"""
+        self.log(f"加载音频失败: {error_msg}")
+        self.load_status_label.config(text="加载失败")
+    
     def toggle_play(self):
         """切换播放/暂停"""
+        if self.player.is_loading():
+            return
         if self.player.get_state() == PlayerState.PLAYING:
             self.player.pause()
         else:
@@ -263,30 +283,19 @@ class EnhancedPlayerWindow:
         song_name = song_data.get('name', '未知歌曲')
         self.song_title.config(text=song_name[:30] + "..." if len(song_name) > 30 else song_name)
         
-        artist_data = song_data.get('artist', [])
-        if isinstance(artist_data, list):
-            artist_names = []
-            for artist in artist_data:
-                if isinstance(artist, dict):
-                    artist_names.append(artist.get('name', ''))
-                elif isinstance(artist, str):
-                    artist_names.append(artist)
-            artist_name = ' / '.join([a for a in artist_names if a])
-        else:
-            artist_name = str(artist_data)
-        
+        artist_name = artist_text_of(song_data)
         self.song_artist.config(text=artist_name[:40] + "..." if len(artist_name) > 40 else artist_name)
         album_name = song_data.get('album', '未知专辑')
         self.song_album.config(text=album_name[:40] + "..." if len(album_name) > 40 else album_name)
         
         current_index = self.player.get_current_index()
-        total_songs = len(self.player.get_playlist())
+        total_songs = len(self.player.playlist)
         if current_index >= 0:
             self.current_index_label.config(text=f"当前: {current_index + 1}/{total_songs}")
     
     def _update_playlist_info(self):
         """更新播放列表信息"""
-        total_songs = len(self.player.get_playlist())
+        total_songs = len(self.player.playlist)
         self.playlist_info.config(text=f"播放列表: {total_songs}首")
     
     def _on_song_change(self, song_data: dict):
@@ -301,6 +310,26 @@ class EnhancedPlayerWindow:
         """处理播放器状态变化"""
         self._update_ui_state()
     
+    def _on_player_load_state_change(self, state: LoadState, progress: float):
+        """处理加载状态变化"""
+        def update_ui():
+            if state == LoadState.LOADING:
+                text = "正在加载..."
+            elif state == LoadState.BUFFERING:
+                text = f"缓冲中 {progress:.0f}%" if progress > 0 else "缓冲中..."
+            elif state == LoadState.UNDERRUN:
+                text = f"缓冲不足，等待数据... ({progress:.0f}%)"
+            elif state == LoadState.READY and 0 < progress < 100:
+                text = f"已缓冲 {progress:.0f}%"
+            elif state == LoadState.FAILED:
+                text = "加载失败"
+            else:
+                text = ""
+            self.load_status_label.config(text=text)
+        
+        if hasattr(self, 'parent') and self.parent:
+            self.parent.after(0, update_ui)
+    
     def _on_player_position_change(self, position: float, duration: float):
         """处理播放位置变化"""
         if not self.is_dragging:
@@ -1,8 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
-import json
 from datetime import datetime
 from .base_panel import BasePanel
+from api.track import Track
 
 class FavoritesPanel(BasePanel):
     """收藏管理面板"""
@@ -28,6 +28,7 @@ class FavoritesPanel(BasePanel):
         # 创建树状视图
         columns = ('name', 'artist', 'album', 'source')
         self.fav_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=10)
+        self.fav_tracks = {}  # 树状视图项 -> Track
         
         # 定义列
         self.fav_tree.heading('name', text='歌曲名')
@@ -87,8 +88,8 @@ class FavoritesPanel(BasePanel):
             return
         
         # 清空当前显示
-        for item in self.fav_tree.get_children():
-            self.fav_tree.delete(item)
+        self.fav_tree.delete(*self.fav_tree.get_children())
+        self.fav_tracks.clear()
         
         # 使用传入的收藏列表或从主程序获取
         if favorites is None:
@@ -99,32 +100,7 @@ class FavoritesPanel(BasePanel):
         
         # 重新加载收藏
         for song in favorites:
-            name = song.get('name', '未知歌曲')
-            
-            # 处理艺术家信息
-            artist_data = song.get('artist', [])
-            if isinstance(artist_data, list):
-                artist_names = []
-                for artist in artist_data:
-                    if isinstance(artist, dict):
-                        artist_names.append(artist.get('name', ''))
-                    elif isinstance(artist, str):
-                        artist_names.append(artist)
-                artist_name = ' / '.join([a for a in artist_names if a])
-            else:
-                artist_name = str(artist_data)
-            
-            album = song.get('album', '未知专辑')
-            source = song.get('source', 'netease')
-            
-            # 来源显示
-            source_map = {'netease': '网易', 'kuwo': '酷我', 'joox': 'JOOX'}
-            source_str = source_map.get(source, source)
-            
-            # 添加到树状视图
-            item_id = self.fav_tree.insert('', 'end', values=(name, artist_name, album, source_str))
-            # 存储歌曲数据到item的tags中
-            self.fav_tree.item(item_id, tags=(json.dumps(song, ensure_ascii=False),))
+            self._insert_song(song)
         
         # 更新统计信息
         if hasattr(self, 'fav_stats_label') and self.fav_stats_label is not None:
@@ -132,6 +108,52 @@ class FavoritesPanel(BasePanel):
         
         self.log(f"刷新收藏显示，共 {len(favorites)} 首歌曲")
     
+    def append_favorites(self, songs):
+        """在收藏列表末尾追加新收藏的歌曲，不重建整个列表"""
+        if not hasattr(self, 'fav_tree') or self.fav_tree is None:
+            return
+        
+        # 正在搜索时只追加符合关键词的歌曲，保持当前的搜索结果
+        keyword = self._get_search_keyword()
+        tracks = [Track.from_dict(song) for song in songs]
+        if keyword:
+            tracks = [track for track in tracks if self._matches(track, keyword)]
+        for track in tracks:
+            self._insert_song(track)
+        
+        # 更新统计信息
+        if hasattr(self, 'fav_stats_label') and self.fav_stats_label is not None:
+            if keyword:
+                self.fav_stats_label.config(text=f"搜索到 {len(self.fav_tracks)} 首歌曲")
+            else:
+                self.fav_stats_label.config(text=f"收藏数量: {len(self.main_app.get_favorites())}")
+        
+        self.log(f"追加收藏显示 {len(tracks)} 首歌曲")
+    
+    def _insert_song(self, song):
+        """在收藏列表末尾插入一首歌曲"""
+        track = Track.from_dict(song)
+        
+        # 来源显示
+        source_map = {'netease': '网易', 'kuwo': '酷我', 'joox': 'JOOX'}
+        source_str = source_map.get(track.source, track.source)
+        
+        # 添加到树状视图，显示文字在Track创建时已经生成
+        item_id = self.fav_tree.insert('', 'end', values=(
+            track.name, track.artist_text, track.get('album', '未知专辑'), source_str))
+        self.fav_tracks[item_id] = track
+    
+    def _get_search_keyword(self):
+        """当前的搜索关键词（小写），没有搜索时返回空字符串"""
+        if not hasattr(self, 'fav_search_entry') or self.fav_search_entry is None:
+            return ''
+        return self.fav_search_entry.get().strip().lower()
+    
+    def _matches(self, track, keyword):
+        """歌曲名、艺术家或专辑是否包含关键词（关键词已转为小写）"""
+        search_text = f"{track.name} {track.artist_text} {track.get('album', '')}".lower()
+        return keyword in search_text
+    
     def search_favorites(self):
         """搜索收藏"""
         if not hasattr(self, 'fav_search_entry') or self.fav_search_entry is None:
@@ -154,60 +176,19 @@ class FavoritesPanel(BasePanel):
             favorites = []
         
         # 清空当前显示
-        for item in self.fav_tree.get_children():
-            self.fav_tree.delete(item)
+        self.fav_tree.delete(*self.fav_tree.get_children())
+        self.fav_tracks.clear()
         
         matched_count = 0
         
         # 搜索收藏
+        keyword = keyword.lower()
         for song in favorites:
-            name = song.get('name', '')
-            artist_data = song.get('artist', [])
-            
-            # 构建搜索文本
-            search_text = name.lower()
-            
-            # 添加艺术家信息到搜索文本
-            if isinstance(artist_data, list):
-                for artist in artist_data:
-                    if isinstance(artist, dict):
-                        search_text += ' ' + artist.get('name', '').lower()
-                    elif isinstance(artist, str):
-                        search_text += ' ' + artist.lower()
-            elif isinstance(artist_data, str):
-                search_text += ' ' + artist_data.lower()
-            
-            # 添加专辑信息
-            album = song.get('album', '')
-            search_text += ' ' + album.lower()
+            track = Track.from_dict(song)
             
             # 检查是否匹配
-            if keyword.lower() in search_text:
-                # 显示匹配的歌曲
-                artist_name = ''
-                if isinstance(artist_data, list):
-                    artist_names = []
-                    for artist in artist_data:
-                        if isinstance(artist, dict):
-                            artist_names.append(artist.get('name', ''))
-                        elif isinstance(artist, str):
-                            artist_names.append(artist)
-                    artist_name = ' / '.join([a for a in artist_names if a])
-                else:
-                    artist_name = str(artist_data)
-                
-                album = song.get('album', '未知专辑')
-                source = song.get('source', 'netease')
-                
-                # 来源显示
-                source_map = {'netease': '网易', 'kuwo': '酷我', 'joox': 'JOOX'}
-                source_str = source_map.get(source, source)
-                
-                # 添加到树状视图
-                item_id = self.fav_tree.insert('', 'end', values=(name, artist_name, album, source_str))
-                # 存储歌曲数据到item的tags中
-                self.fav_tree.item(item_id, tags=(json.dumps(song, ensure_ascii=False),))
-                
+            if self._matches(track, keyword):
+                self._insert_song(track)
                 matched_count += 1
         
         self.log(f"在收藏中搜索 '{keyword}'，找到 {matched_count} 首歌曲")
@@ -230,28 +211,19 @@ class FavoritesPanel(BasePanel):
             self.show_message("警告", "请先选择一首收藏歌曲", "warning")
             return
         
-        item = selection[0]
-        tags = self.fav_tree.item(item, 'tags')
+        track = self.fav_tracks.get(selection[0])
         
-        if tags:
-            try:
-                song_data = json.loads(tags[0])
-                song_id = song_data.get('id', '')
-                source = song_data.get('source', 'netease')
-                
-                # 从搜索面板获取音质设置
-                quality = "320"
-                if hasattr(self.main_app, 'search_panel') and hasattr(self.main_app.search_panel, 'quality_combo'):
-                    quality = self.main_app.search_panel.quality_combo.get()
-                
-                self.log(f"播放收藏歌曲: {song_data.get('name', '未知歌曲')}")
-                
-                # 在主程序中播放 - 这会自动添加到播放列表
-                if hasattr(self.main_app, 'play_song_from_data'):
-                    self.main_app.play_song_from_data(song_id, song_data, source, quality)
-                
-            except json.JSONDecodeError as e:
-                self.log(f"解析歌曲数据失败: {str(e)}", "ERROR")
+        if track:
+            # 从搜索面板获取音质设置
+            quality = "320"
+            if hasattr(self.main_app, 'search_panel') and hasattr(self.main_app.search_panel, 'quality_combo'):
+                quality = self.main_app.search_panel.quality_combo.get()
+            
+            self.log(f"播放收藏歌曲: {track.name}")
+            
+            # 在主程序中播放 - 这会自动添加到播放列表
+            if hasattr(self.main_app, 'play_song_from_data'):
+                self.main_app.play_song_from_data(track.id, track, track.source, quality)
     
     def download_selected_favorite(self):
         """下载选中的收藏歌曲"""
@@ -263,25 +235,16 @@ class FavoritesPanel(BasePanel):
             self.show_message("警告", "请先选择一首收藏歌曲", "warning")
             return
         
+        # 从搜索面板获取音质设置
+        quality = "320"
+        if hasattr(self.main_app, 'search_panel') and hasattr(self.main_app.search_panel, 'quality_combo'):
+            quality = self.main_app.search_panel.quality_combo.get()
+        
         for item in selection:
-            tags = self.fav_tree.item(item, 'tags')
-            if tags:
-                try:
-                    song_data = json.loads(tags[0])
-                    song_id = song_data.get('id', '')
-                    source = song_data.get('source', 'netease')
-                    
-                    # 从搜索面板获取音质设置
-                    quality = "320"
-                    if hasattr(self.main_app, 'search_panel') and hasattr(self.main_app.search_panel, 'quality_combo'):
-                        quality = self.main_app.search_panel.quality_combo.get()
-                    
-                    # 在主程序中下载
-                    if hasattr(self.main_app, 'download_song'):
-                        self.main_app.download_song(song_id, song_data, source, quality)
-                    
-                except json.JSONDecodeError as e:
-                    self.log(f"解析歌曲数据失败: {str(e)}", "ERROR")
+            track = self.fav_tracks.get(item)
+            # 在主程序中下载
+            if track and hasattr(self.main_app, 'download_song'):
+                self.main_app.download_song(track.id, track, track.source, quality)
     
     def remove_selected_favorite(self):
         """移除选中的收藏歌曲"""
@@ -297,17 +260,7 @@ class FavoritesPanel(BasePanel):
         if not self.show_message("确认", f"确定要移除选中的 {len(selection)} 首歌曲吗？", "ask"):
             return
         
-        removed_songs = []
-        
-        for item in selection:
-            tags = self.fav_tree.item(item, 'tags')
-            if tags:
-                try:
-                    song_data = json.loads(tags[0])
-                    removed_songs.append(song_data)
-                    
-                except json.JSONDecodeError as e:
-                    self.log(f"解析歌曲数据失败: {str(e)}", "ERROR")
+        removed_songs = [self.fav_tracks[item] for item in selection if item in self.fav_tracks]
         
         if removed_songs and hasattr(self.main_app, 'remove_songs_from_favorites'):
             self.main_app.remove_songs_from_favorites(removed_songs)
@@ -339,29 +292,12 @@ class FavoritesPanel(BasePanel):
                 f.write("=" * 40 + "\n\n")
                 
                 for i, song in enumerate(favorites, 1):
-                    name = song.get('name', '未知歌曲')
-                    
-                    # 处理艺术家信息
-                    artist_data = song.get('artist', [])
-                    if isinstance(artist_data, list):
-                        artist_names = []
-                        for artist in artist_data:
-                            if isinstance(artist, dict):
-                                artist_names.append(artist.get('name', ''))
-                            elif isinstance(artist, str):
-                                artist_names.append(artist)
-                        artist_name = ' / '.join([a for a in artist_names if a])
-                    else:
-                        artist_name = str(artist_data)
-                    
-                    album = song.get('album', '未知专辑')
-                    source = song.get('source', 'netease')
-                    
-                    f.write(f"{i:3d}. {name}\n")
-                    f.write(f"     艺术家: {artist_name}\n")
-                    f.write(f"     专辑: {album}\n")
-                    f.write(f"     来源: {source}\n")
-                    f.write(f"     歌曲ID: {song.get('id', '未知')}\n\n")
+                    track = Track.from_dict(song)
+                    f.write(f"{i:3d}. {track.name}\n")
+                    f.write(f"     艺术家: {track.artist_text}\n")
+                    f.write(f"     专辑: {track.get('album', '未知专辑')}\n")
+                    f.write(f"     来源: {track.source}\n")
+                    f.write(f"     歌曲ID: {track.get('id', '未知')}\n\n")
             
             self.show_message("成功", f"收藏列表已导出到: {filename}", "info")
             self.log(f"收藏列表导出到: {filename}")
@@ -4,7 +4,6 @@ from tkinter import ttk, messagebox
 import threading
 import json
 import os
-import copy
 import traceback
 
 from .enhanced_player_window import EnhancedPlayerWindow
@@ -14,10 +13,22 @@ from .playlist_panel import PlaylistPanel
 from .downloads_panel import DownloadsPanel
 
 from api.music_api import MusicAPI
+from api.rate_limiter import RateLimiter
+from api.search_cache import SearchCache
+from api.url_cache import UrlCache
+from api.track import Track, artist_text_of
 from utils.file_handler import FileHandler
 from utils.playlist_handler import PlaylistHandler
 from utils.logger import Logger
 from utils.download_manager import DownloadManager
+from utils.audio_cache import AudioCache
+from utils.http_pool import HttpPool
+from utils.bandwidth import BandwidthManager
+from utils.track_index import LocalTrackIndex
+from utils.library_store import LibraryStore
+from utils.persistence import PersistenceScheduler
+from player.prefetcher import TrackPrefetcher
+from player.playlist_model import PlaylistModel
 
 class MainWindow:
     """主窗口控制器"""
@@ -33,15 +44,58 @@ class MainWindow:
         # 标记窗口是否已关闭
         self.window_closed = False
         
+        # 缓存索引变化后由后台线程合并保存，不在界面线程中写文件
+        # （收藏和播放列表由数据库的后台写入线程保存，JSON只在退出时导出一次）
+        self.persistence = PersistenceScheduler(quiet_period=1.0, max_delay=5.0)
+        
+        # 共享HTTP连接池（API、播放缓冲和下载共用keep-alive连接）
+        self.http_pool = HttpPool(host_pool_sizes={'music-api.gdstudio.xyz': 4})
+        
+        # 带宽分配：播放缓冲优先，边下边播时后台下载限速，缓冲不足时暂停后台下载
+        self.bandwidth = BandwidthManager(streaming_download_limit=512 * 1024, pause_on_low_buffer=True)
+        
+        # API请求限流（5分钟50次），请求记录保存在数据目录中，多开时共享配额
+        self.rate_limiter = RateLimiter(
+            max_requests=50, period=300,
+            state_file=os.path.join(FileHandler.get_data_dir(), "api_rate_limit.json")
+        )
+        
+        # 搜索结果缓存，重复搜索不再消耗请求次数
+        self.search_cache = SearchCache()
+        threading.Thread(target=self.search_cache.cleanup, daemon=True).start()
+        
+        # 播放链接缓存，按链接签名推断过期时间，重启后仍然有效
+        self.url_cache = UrlCache(persistence=self.persistence)
+        
         # 初始化核心组件
-        self.api = MusicAPI()
+        self.api = MusicAPI(http_pool=self.http_pool, rate_limiter=self.rate_limiter,
+                            search_cache=self.search_cache, url_cache=self.url_cache)
+        self.http_pool.preconnect([self.api.base_url])
         self.file_handler = FileHandler()
         self.playlist_handler = PlaylistHandler()
         self.logger = Logger()
         
+        # 收藏、播放列表、播放历史和下载记录保存在数据库中，首次启动时导入旧版JSON文件
+        self.library = LibraryStore(os.path.join(FileHandler.get_data_dir(), "library.db"))
+        self.library.migrate_json(FileHandler.get_favorites_path(), FileHandler.get_playlist_path())
+        
+        # 音频缓存（播放器和下载管理器共用），启动时在后台清理孤立的临时文件
+        self.audio_cache = AudioCache(persistence=self.persistence)
+        threading.Thread(target=self.audio_cache.cleanup_orphans, daemon=True).start()
+        
+        # 本地歌曲索引（下载目录和音频缓存），播放时优先使用本地文件
+        self.track_index = LocalTrackIndex(self.audio_cache)
+        
+        # 预取播放列表中的下一首歌曲
+        self.prefetcher = TrackPrefetcher(self.api, self.audio_cache, http_pool=self.http_pool,
+                                          bandwidth=self.bandwidth)
+        self.prefetcher.should_wait = self._is_player_buffering
+        
         # 数据存储
         self.favorites = []
-        self.playlist = []  # 当前播放列表
+        # 当前播放列表，主窗口、播放器和播放列表面板共用
+        self.playlist = PlaylistModel(self.library.get_playlist())
+        self.playlist.add_listener(self._on_playlist_changed)
         
         # 初始化UI控件引用
         self.tab_control = None
@@ -53,7 +107,9 @@ class MainWindow:
         
         # 下载相关变量
         self.download_path = "downloads/"
-        self.download_manager = DownloadManager(self.download_path)
+        self.download_manager = DownloadManager(self.download_path, audio_cache=self.audio_cache,
+                                                http_pool=self.http_pool, api=self.api,
+                                                bandwidth=self.bandwidth, track_index=self.track_index)
         
         # 设置下载回调
         self.download_manager.on_download_start = self._on_download_start
@@ -61,13 +117,17 @@ class MainWindow:
         self.download_manager.on_download_complete = self._on_download_complete
         self.download_manager.on_download_error = self._on_download_error
         
+        # 合并后待刷新到界面的下载进度（job_id -> 下载项）
+        self._pending_progress = {}
+        self._progress_lock = threading.Lock()
+        
         try:
             # 创建界面
             self.setup_ui()
             
             # 加载数据
             self._load_favorites()
-            self._load_playlist()
+            self.log(f"加载播放列表，共 {len(self.playlist)} 首歌曲")
             
             # 刷新UI显示
             if hasattr(self, 'favorites_panel'):
@@ -75,6 +135,10 @@ class MainWindow:
             if hasattr(self, 'playlist_panel'):
                 self.playlist_panel.refresh_playlist_display(self.playlist)
             
+            # 继续上次未完成的下载
+            if self.download_manager.resume_pending() and self.downloads_panel:
+                self.downloads_panel.update_download_queue()
+            
             self.log("GD音乐播放器启动成功")
         except Exception as e:
             self.log(f"启动失败: {str(e)}", "ERROR")
@@ -126,10 +190,11 @@ class MainWindow:
         player_tab = ttk.Frame(self.tab_control)
         self.tab_control.add(player_tab, text="播放器")
         self.player_window = EnhancedPlayerWindow(player_tab, self)
+        self.player_window.player.url_refresher = self._refresh_play_url
         self.player_window.frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
-        # 设置播放列表
-        self.player_window.set_playlist(self.playlist)
+        # 播放器使用同一个播放列表
+        self.player_window.set_playlist_model(self.playlist)
         
         # 创建收藏选项卡
         favorites_tab = ttk.Frame(self.tab_control)
@@ -189,26 +254,30 @@ class MainWindow:
     
     # ========== 数据管理方法 ==========
     
+    def _get_quality(self):
+        """获取当前音质设置"""
+        if hasattr(self, 'search_panel') and hasattr(self.search_panel, 'quality_combo'):
+            return self.search_panel.quality_combo.get()
+        return "320"
+    
     def get_favorites(self):
         """获取收藏列表"""
         return self.favorites
     
     def get_playlist(self):
-        """获取播放列表"""
-        return self.playlist
+        """获取播放列表的副本"""
+        return self.playlist.to_list()
     
     def get_playlist_song_at_index(self, index):
         """获取播放列表中指定索引的歌曲"""
-        if 0 <= index < len(self.playlist):
-            return self.playlist[index]
-        return None
+        return self.playlist.get(index)
     
     # ========== 收藏管理 ==========
     
     def _load_favorites(self):
         """加载收藏列表"""
         try:
-            self.favorites = self.file_handler.load_favorites()
+            self.favorites = self.library.get_favorites()
             self.log(f"加载收藏列表，共 {len(self.favorites)} 首歌曲")
             
         except Exception as e:
@@ -216,53 +285,60 @@ class MainWindow:
             self.favorites = []
     
     def save_favorites(self):
-        """保存收藏列表"""
-        if self.window_closed:
-            return
-            
+        """导出收藏列表到 favorites.json（兼容旧版本，收藏本身实时保存在数据库中，退出时调用）"""
         try:
-            self.file_handler.save_favorites(self.favorites)
+            self.file_handler.save_favorites(list(self.favorites))
             self.log("收藏列表已保存")
         except Exception as e:
             self.log(f"保存收藏失败: {str(e)}", "ERROR")
     
     def add_song_to_favorites(self, song_data):
         """添加歌曲到收藏"""
-        # 避免重复添加
-        song_id = song_data.get('id', '')
-        if not any(fav.get('id') == song_id for fav in self.favorites):
-            # 深拷贝歌曲数据
-            song_copy = copy.deepcopy(song_data)
-            
-            # 确保有source字段
-            if 'source' not in song_copy:
-                if hasattr(self, 'search_panel') and hasattr(self.search_panel, 'search_type'):
-                    song_copy['source'] = self.search_panel.search_type.get()
-                else:
-                    song_copy['source'] = "netease"
-            
-            self.favorites.append(song_copy)
-            self.save_favorites()
-            
-            # 刷新收藏面板显示
-            if hasattr(self, 'favorites_panel') and self.root and not self.window_closed:
-                if self.root.winfo_exists():
-                    self.root.after(0, lambda: self.favorites_panel.refresh_favorites_display(self.favorites))
-            
-            return True
-        return False
+        return self.add_songs_to_favorites([song_data]) > 0
+    
+    def add_songs_to_favorites(self, songs):
+        """批量添加歌曲到收藏，只保存一次、刷新一次界面，返回实际添加的数量"""
+        # 按 (音乐源, 歌曲ID) 去重，已收藏的歌曲不添加
+        keys = {fav.key for fav in self.favorites}
+        added = [track for track in self._prepare_songs(songs) if track.key not in keys]
+        if not added:
+            return 0
+        
+        self.favorites.extend(added)
+        self.library.submit(self.library.add_favorites, added)
+        
+        # 只在收藏面板末尾追加新歌曲
+        if hasattr(self, 'favorites_panel') and self.root and not self.window_closed:
+            if self.root.winfo_exists():
+                self.root.after(0, lambda: self.favorites_panel.append_favorites(added))
+        
+        return len(added)
+    
+    def _prepare_songs(self, songs):
+        """把歌曲数据转换成Track（缺少source时使用搜索面板的音乐源），同一批中重复的歌曲只保留一首"""
+        default_source = "netease"
+        if hasattr(self, 'search_panel') and hasattr(self.search_panel, 'search_type'):
+            default_source = self.search_panel.search_type.get()
+        
+        prepared = []
+        seen = set()
+        for song in songs:
+            track = Track.from_dict(song, default_source)
+            if track.key not in seen:
+                seen.add(track.key)
+                prepared.append(track)
+        return prepared
     
     def remove_songs_from_favorites(self, songs_to_remove):
         """从收藏中移除歌曲"""
-        removed_count = 0
-        songs_to_remove_ids = [song.get('id', '') for song in songs_to_remove]
-        
-        # 过滤掉要移除的歌曲
-        self.favorites = [fav for fav in self.favorites if fav.get('id') not in songs_to_remove_ids]
-        removed_count = len(songs_to_remove_ids) - len(self.favorites)
+        keys = {Track.from_dict(song).key for song in songs_to_remove}
+        remaining = [fav for fav in self.favorites if fav.key not in keys]
+        removed_count = len(self.favorites) - len(remaining)
         
         if removed_count > 0:
-            self.save_favorites()
+            # 过滤掉要移除的歌曲
+            self.favorites = remaining
+            self.library.submit(self.library.remove_favorites, list(songs_to_remove))
             
             # 刷新收藏面板显示
             if hasattr(self, 'favorites_panel') and self.root and not self.window_closed:
@@ -274,7 +350,7 @@ class MainWindow:
     def clear_all_favorites(self):
         """清空所有收藏"""
         self.favorites.clear()
-        self.save_favorites()
+        self.library.submit(self.library.clear_favorites)
         self.log("已清空所有收藏")
         
         # 刷新收藏面板显示
@@ -284,78 +360,26 @@ class MainWindow:
     
     # ========== 播放列表管理 ==========
     
-    def _load_playlist(self):
-        """加载播放列表"""
-        try:
-            self.playlist = self.playlist_handler.load_playlist()
-            self.log(f"加载播放列表，共 {len(self.playlist)} 首歌曲")
-            
-        except Exception as e:
-            self.log(f"加载播放列表失败: {str(e)}", "ERROR")
-            self.playlist = []
-    
     def save_playlist(self):
-        """保存播放列表"""
-        if self.window_closed:
-            return
-            
+        """导出播放列表到 playlist.json（兼容旧版本，播放列表本身实时保存在数据库中，退出时调用）"""
         try:
-            self.playlist_handler.save_playlist(self.playlist)
+            self.playlist_handler.save_playlist(self.playlist.to_list())
             self.log("播放列表已保存")
         except Exception as e:
             self.log(f"保存播放列表失败: {str(e)}", "ERROR")
     
     def add_song_to_playlist(self, song_data):
         """添加歌曲到播放列表"""
-        # 避免重复添加
-        song_id = song_data.get('id', '')
-        if not any(song.get('id') == song_id for song in self.playlist):
-            # 深拷贝歌曲数据
-            song_copy = copy.deepcopy(song_data)
-            
-            # 确保有source字段
-            if 'source' not in song_copy:
-                if hasattr(self, 'search_panel') and hasattr(self.search_panel, 'search_type'):
-                    song_copy['source'] = self.search_panel.search_type.get()
-                else:
-                    song_copy['source'] = "netease"
-            
-            self.playlist.append(song_copy)
-            self.save_playlist()
-            
-            # 更新播放器窗口的播放列表
-            if hasattr(self, 'player_window'):
-                self.player_window.add_to_playlist(song_copy)
-            
-            # 刷新播放列表面板显示
-            if hasattr(self, 'playlist_panel') and self.root and not self.window_closed:
-                if self.root.winfo_exists():
-                    self.root.after(0, lambda: self.playlist_panel.refresh_playlist_display(self.playlist))
-            
-            return True
-        return False
+        return self.add_songs_to_playlist([song_data]) > 0
+    
+    def add_songs_to_playlist(self, songs):
+        """批量添加歌曲到播放列表，返回实际添加的数量（已在播放列表中的歌曲跳过）"""
+        return len(self.playlist.extend(self._prepare_songs(songs)))
     
     def remove_songs_from_playlist(self, indices):
         """从播放列表中移除歌曲"""
         try:
-            # 从后往前移除，避免索引变化
-            removed_songs = []
-            for idx in sorted(indices, reverse=True):
-                if 0 <= idx < len(self.playlist):
-                    removed_songs.append(self.playlist.pop(idx))
-            
-            if removed_songs:
-                self.save_playlist()
-                
-                # 重新设置播放器窗口的播放列表
-                if hasattr(self, 'player_window'):
-                    self.player_window.set_playlist(self.playlist)
-                
-                # 刷新播放列表面板显示
-                if hasattr(self, 'playlist_panel') and self.root and not self.window_closed:
-                    if self.root.winfo_exists():
-                        self.root.after(0, lambda: self.playlist_panel.refresh_playlist_display(self.playlist))
-            
+            self.playlist.remove_indices(indices)
             return True
         except Exception as e:
             self.log(f"移除播放列表歌曲失败: {str(e)}", "ERROR")
@@ -364,17 +388,7 @@ class MainWindow:
     def clear_playlist(self):
         """清空播放列表"""
         self.playlist.clear()
-        self.save_playlist()
         self.log("已清空播放列表")
-        
-        # 重新设置播放器窗口的播放列表
-        if hasattr(self, 'player_window'):
-            self.player_window.clear_playlist()
-        
-        # 刷新播放列表面板显示
-        if hasattr(self, 'playlist_panel') and self.root and not self.window_closed:
-            if self.root.winfo_exists():
-                self.root.after(0, lambda: self.playlist_panel.refresh_playlist_display(self.playlist))
     
     def load_playlist_from_file(self, filename):
         """从文件加载播放列表"""
@@ -382,19 +396,8 @@ class MainWindow:
             with open(filename, 'r', encoding='utf-8') as f:
                 loaded_playlist = json.load(f)
             
-            # 清空当前播放列表
-            self.playlist.clear()
-            self.playlist.extend(loaded_playlist)
-            self.save_playlist()
-            
-            # 重新设置播放器窗口的播放列表
-            if hasattr(self, 'player_window'):
-                self.player_window.set_playlist(self.playlist)
-            
-            # 刷新播放列表面板显示
-            if hasattr(self, 'playlist_panel') and self.root and not self.window_closed:
-                if self.root.winfo_exists():
-                    self.root.after(0, lambda: self.playlist_panel.refresh_playlist_display(self.playlist))
+            # 替换当前播放列表（重复的歌曲只保留一首）
+            self.playlist.reset(loaded_playlist)
             
             self.log(f"播放列表已加载: {filename}，共 {len(self.playlist)} 首歌曲")
             return True
@@ -403,6 +406,27 @@ class MainWindow:
             self.log(f"加载播放列表失败: {str(e)}", "ERROR")
             return False
     
+    def _on_playlist_changed(self, change):
+        """播放列表变化后同步数据库、预取和播放列表面板（数据库由后台写入线程更新）"""
+        change_type = change['type']
+        if change_type == PlaylistModel.INSERT and change['index'] + len(change['songs']) == len(self.playlist):
+            self.library.submit(self.library.add_playlist_songs, list(change['songs']))
+        elif change_type == PlaylistModel.REMOVE:
+            self.library.submit(self.library.remove_playlist_songs, list(change['songs']))
+        else:
+            # 插入到中间、移动或整体替换时重写数据库中的顺序
+            self.library.submit(self.library.replace_playlist, self.playlist.to_list())
+        
+        if len(self.playlist):
+            self._schedule_prefetch()
+        else:
+            self.prefetcher.cancel()
+        
+        # 播放列表面板只应用这次变化，不重建整个列表
+        if hasattr(self, 'playlist_panel') and self.playlist_panel and self.root and not self.window_closed:
+            if self.root.winfo_exists():
+                self.root.after(0, lambda: self.playlist_panel.apply_change(change))
+    
     # ========== 搜索功能 ==========
     
     def search_music(self, keyword, source, search_panel):
@@ -445,7 +469,13 @@ class MainWindow:
         """播放歌曲 - 修复：确保歌曲添加到播放列表"""
         def play_thread():
             try:
-                # 获取播放链接
+                self.library.add_play_history({**song_data, 'source': source})
+                
+                # 已下载或已缓存相同或更高音质时直接播放本地文件
+                if self._play_local_track(song_data, source, song_id, quality, add_to_playlist=True):
+                    return
+                
+                # 获取播放链接（预取过的歌曲直接命中播放链接缓存）
                 url_data = self.api.get_play_url(song_id, source, quality)
                 
                 if url_data and isinstance(url_data, dict):
@@ -458,8 +488,10 @@ class MainWindow:
                                 self.add_song_to_playlist(song_data)
                                 
                                 # 然后播放
-                                self.player_window.play_song(song_data, play_url)
+                                cache_key = (song_data.get('source', source), str(song_id), quality)
+                                self.player_window.play_song(song_data, play_url, cache_key)
                                 self.log(f"开始播放: {song_data.get('name', '未知歌曲')}")
+                                self._schedule_prefetch()
                                 
                                 # 显示歌曲信息
                                 self._show_song_info(song_data, url_data)
@@ -510,11 +542,14 @@ class MainWindow:
                 source = song_data.get('source', 'netease')
                 
                 # 获取音质设置
-                quality = "320"
-                if hasattr(self, 'search_panel') and hasattr(self.search_panel, 'quality_combo'):
-                    quality = self.search_panel.quality_combo.get()
+                quality = self._get_quality()
+                self.library.add_play_history(song_data)
+                
+                # 已下载或已缓存相同或更高音质时直接播放本地文件
+                if self._play_local_track(song_data, source, song_id, quality):
+                    return
                 
-                # 获取播放链接
+                # 获取播放链接（预取过的歌曲直接命中播放链接缓存）
                 url_data = self.api.get_play_url(song_id, source, quality)
                 
                 if url_data and isinstance(url_data, dict):
@@ -524,8 +559,10 @@ class MainWindow:
                         def play_song():
                             try:
                                 # 使用播放器窗口的play_song方法
-                                self.player_window.play_song(song_data, play_url)
+                                cache_key = (source, str(song_id), quality)
+                                self.player_window.play_song(song_data, play_url, cache_key)
                                 self.log(f"播放播放列表歌曲: {song_data.get('name', '未知歌曲')}")
+                                self._schedule_prefetch()
                                 
                                 # 显示歌曲信息
                                 self._show_song_info(song_data, url_data)
@@ -578,6 +615,54 @@ class MainWindow:
             if self.root and not self.window_closed and self.root.winfo_exists():
                 messagebox.showerror("错误", f"播放列表索引错误: {index}")
     
+    def _play_local_track(self, song_data, source, song_id, quality, add_to_playlist=False):
+        """查找本地文件，找到时在主线程中播放并返回True（在播放线程中调用）"""
+        filepath = self.track_index.lookup(source, song_id, quality)
+        if not filepath:
+            return False
+        
+        def play_song():
+            try:
+                if add_to_playlist:
+                    self.add_song_to_playlist(song_data)
+                self.player_window.play_song(song_data, filepath)
+                self.log(f"播放本地文件: {song_data.get('name', '未知歌曲')} ({filepath})")
+                self._schedule_prefetch()
+                
+                # 显示歌曲信息
+                self._show_local_file_info(song_data, filepath)
+                
+                # 切换到播放器选项卡
+                if hasattr(self, 'tab_control'):
+                    self.tab_control.select(0)
+            except Exception as e:
+                self.log(f"播放失败: {str(e)}", "ERROR")
+                if self.root and not self.window_closed and self.root.winfo_exists():
+                    messagebox.showerror("错误", f"播放失败: {str(e)}")
+        
+        if self.root and not self.window_closed and self.root.winfo_exists():
+            self.root.after(0, play_song)
+        return True
+    
+    def _schedule_prefetch(self):
+        """根据当前播放位置安排预取接下来的歌曲"""
+        if not self.player_window:
+            return
+        current_index = self.player_window.player.get_current_index()
+        self.prefetcher.schedule(self.playlist, current_index, self._get_quality())
+    
+    def _refresh_play_url(self, source, song_id, quality):
+        """播放链接失效（403/410）时重新获取，在加载线程中调用"""
+        url_data = self.api.get_play_url(song_id, source, quality, force_refresh=True)
+        return url_data.get('url') if url_data else None
+    
+    def _is_player_buffering(self):
+        """当前歌曲是否仍在加载或边下边播"""
+        if not self.player_window:
+            return False
+        player = self.player_window.player
+        return player.is_loading() or player.is_streaming()
+    
     def play_local_file(self, song_data, filepath):
         """播放本地文件"""
         def play_in_thread():
@@ -614,26 +699,13 @@ class MainWindow:
         """显示歌曲信息"""
         if hasattr(self, 'search_panel') and hasattr(self.search_panel, 'info_text'):
             info = f"歌曲: {song_data.get('name', '未知歌曲')}\n"
-            
-            # 处理艺术家信息
-            artist_data = song_data.get('artist', [])
-            if isinstance(artist_data, list):
-                artist_names = []
-                for artist in artist_data:
-                    if isinstance(artist, dict):
-                        artist_names.append(artist.get('name', ''))
-                    elif isinstance(artist, str):
-                        artist_names.append(artist)
-                artist_name = ' / '.join([a for a in artist_names if a])
-            else:
-                artist_name = str(artist_data)
-            
-            info += f"艺术家: {artist_name}\n"
+            info += f"艺术家: {artist_text_of(song_data)}\n"
             info += f"专辑: {song_data.get('album', '未知专辑')}\n"
             
             if url_data:
                 info += f"音质: {url_data.get('br', '未知')}kbps\n"
                 info += f"文件大小: {url_data.get('size', '未知')}KB\n"
+            info += self._library_info(song_data)
             
             if self.root and not self.window_closed and self.root.winfo_exists():
                 self.search_panel.info_text.delete(1.0, tk.END)
@@ -643,7 +715,7 @@ class MainWindow:
         """显示本地文件信息"""
         if hasattr(self, 'search_panel') and hasattr(self.search_panel, 'info_text'):
             info = f"歌曲: {song_data.get('name', '未知歌曲')}\n"
-            info += f"艺术家: {song_data.get('artist', '未知艺术家')}\n"
+            info += f"艺术家: {artist_text_of(song_data) or '未知艺术家'}\n"
             info += f"来源: 本地文件\n"
             info += f"路径: {filepath}\n"
             
@@ -654,11 +726,41 @@ class MainWindow:
                 info += f"文件大小: {size_str}\n"
             except:
                 pass
+            info += self._library_info(song_data)
             
             if self.root and not self.window_closed and self.root.winfo_exists():
                 self.search_panel.info_text.delete(1.0, tk.END)
                 self.search_panel.info_text.insert(1.0, info)
     
+    def _library_info(self, song_data):
+        """音乐库中记录的播放次数、收藏状态和已下载的文件"""
+        source = song_data.get('source') or 'netease'
+        song_id = song_data.get('id', '')
+        try:
+            info = f"播放次数: {self.library.get_play_count(source, song_id)}"
+            if self.library.is_favorite(source, song_id):
+                info += "（已收藏）"
+            info += "\n"
+            # 被更高音质替换或手动删除的文件不再显示
+            for record in self.library.get_downloads(source, song_id):
+                if os.path.exists(record['file_path']):
+                    info += f"已下载: {record['quality']} - {record['file_path']}\n"
+            return info
+        except Exception as e:
+            self.log(f"读取音乐库记录失败: {str(e)}", "ERROR")
+            return ""
+    
+    def get_recent_plays(self, limit=50):
+        """最近播放过的歌曲（去重，最近的在前）"""
+        songs = {}
+        for record in self.library.get_play_history(limit * 4):
+            record.pop('played_at', None)
+            track = Track.from_dict(record)
+            songs.setdefault(track.key, track)
+            if len(songs) >= limit:
+                break
+        return list(songs.values())
+    
     def _format_file_size(self, size_bytes):
         """格式化文件大小"""
         if size_bytes < 1024:
@@ -685,10 +787,22 @@ class MainWindow:
         """获取下载队列"""
         return self.download_manager.get_download_queue()
     
+    def get_download_stats(self):
+        """获取下载线程池统计"""
+        return self.download_manager.get_stats()
+    
+    def get_bandwidth_allocation(self):
+        """获取当前带宽分配"""
+        return self.bandwidth.get_allocation()
+    
     def get_download_history(self):
         """获取下载历史"""
         return self.download_manager.get_download_history()
     
+    def query_download_history(self, date=None, source=None, status=None, limit=None):
+        """按日期、音乐源和状态查询下载历史"""
+        return self.download_manager.query_download_history(date=date, source=source, status=status, limit=limit)
+    
     def cancel_download(self, download_id):
         """取消下载"""
         return self.download_manager.remove_from_queue(download_id)
@@ -708,16 +822,31 @@ class MainWindow:
             self.root.after(0, update_ui)
     
     def _on_download_progress(self, download_item):
-        """下载进度回调"""
+        """下载进度回调
+        
+        各下载线程的进度先合并起来，界面每次只安排一次刷新，一次更新所有任务。
+        """
         def update_ui():
+            with self._progress_lock:
+                items = list(self._pending_progress.values())
+                self._pending_progress.clear()
             if hasattr(self, 'downloads_panel') and self.downloads_panel:
-                self.downloads_panel.update_download_progress(download_item)
+                self.downloads_panel.update_download_progress_batch(items)
         
-        if self.root and not self.window_closed and self.root.winfo_exists():
+        with self._progress_lock:
+            scheduled = bool(self._pending_progress)
+            self._pending_progress[download_item.get('job_id')] = download_item
+        
+        if not scheduled and self.root and not self.window_closed and self.root.winfo_exists():
             self.root.after(0, update_ui)
     
     def _on_download_complete(self, download_item):
         """下载完成回调"""
+        try:
+            self.library.add_download(download_item)
+        except Exception as e:
+            self.log(f"记录下载失败: {str(e)}", "ERROR")
+        
         def update_ui():
             self.log(f"下载完成: {download_item['name']}")
             if hasattr(self, 'downloads_panel') and self.downloads_panel:
@@ -757,12 +886,6 @@ class MainWindow:
         self.log("正在关闭应用程序...")
         
         try:
-            # 保存收藏
-            self.save_favorites()
-            
-            # 保存播放列表
-            self.save_playlist()
-            
             # 停止播放
             if hasattr(self, 'player_window') and self.player_window:
                 try:
@@ -770,6 +893,56 @@ class MainWindow:
                 except:
                     pass
             
+            # 停止预取
+            self.prefetcher.shutdown()
+            
+            # 等待下载停在安全位置，未完成的任务下次启动时继续
+            self.download_manager.shutdown(timeout=5.0)
+            
+            # 导出收藏和播放列表（兼容旧版本），立即保存音频缓存索引和播放链接缓存
+            self.save_favorites()
+            self.save_playlist()
+            self.persistence.shutdown()
+            stats = self.persistence.get_stats()
+            self.log(f"后台保存: 标记 {stats['marks']} 次, 写入 {stats['saves']} 次, 失败 {stats['errors']} 次")
+            
+            stats = self.audio_cache.get_stats()
+            self.log(f"音频缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+                     f"共 {stats['entries']} 项")
+            
+            stats = self.rate_limiter.get_stats()
+            self.log(f"API请求: 已发送 {stats['acquired']} 次, 因限流放弃 {stats['rejected']} 次, "
+                     f"剩余配额 {stats['remaining']}")
+            for name, item in self.api.scheduler.get_stats().items():
+                if item['requests'] or item['rejected']:
+                    self.log(f"API排队 [{name}]: {item['requests']} 次, 平均等待 {item['avg_wait']:.1f}秒, "
+                             f"最长 {item['max_wait']:.1f}秒, 放弃 {item['rejected']} 次")
+            
+            stats = self.search_cache.get_stats()
+            self.log(f"搜索缓存: 命中率 {stats['hit_rate'] * 100:.0f}%, 未命中 {stats['misses']} 次")
+            
+            stats = self.api.single_flight.get_stats()
+            self.log(f"API请求合并: 共 {stats['calls']} 次调用, 合并重复请求 {stats['deduplicated']} 次")
+            
+            stats = self.track_index.get_stats()
+            self.log(f"本地歌曲: 下载目录命中 {stats['download_hits']} 次, 缓存命中 {stats['cache_hits']} 次, "
+                     f"未命中 {stats['misses']} 次")
+            
+            stats = self.url_cache.get_stats()
+            self.log(f"播放链接缓存: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+                     f"失效 {stats['invalidations']} 次")
+            
+            # 记录连接复用情况并关闭连接池
+            stats = self.http_pool.get_stats()
+            self.log(f"HTTP连接: 请求 {stats['requests']} 次, 新建连接 {stats['connections']} 个, "
+                     f"复用率 {stats['reuse_rate'] * 100:.0f}%")
+            self.http_pool.close()
+            
+            # 等待后台写入线程写完收藏和播放列表的修改再关闭数据库
+            if not self.library.flush(timeout=5.0):
+                self.log("音乐库仍有未写入的修改", "WARNING")
+            self.library.close()
+            
             self.log("应用程序关闭")
             
             # 标记窗口为关闭状态
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, filedialog
 import json
 from .base_panel import BasePanel
+from api.track import Track
 
 class PlaylistPanel(BasePanel):
     """播放列表面板"""
@@ -60,25 +61,32 @@ class PlaylistPanel(BasePanel):
                 playlist = []
         
         # 添加歌曲到列表
-        for song in playlist:
-            name = song.get('name', '未知歌曲')
-            artist_data = song.get('artist', [])
-            if isinstance(artist_data, list):
-                artist_names = []
-                for artist in artist_data:
-                    if isinstance(artist, dict):
-                        artist_names.append(artist.get('name', ''))
-                    elif isinstance(artist, str):
-                        artist_names.append(artist)
-                artist_name = ' / '.join([a for a in artist_names if a])
-            else:
-                artist_name = str(artist_data)
-            
-            display_text = f"{name} - {artist_name}"
-            self.playlist_listbox.insert(tk.END, display_text)
+        self.playlist_listbox.insert(tk.END, *[self._format_song(song) for song in playlist])
         
         self.log(f"刷新播放列表显示，共 {len(playlist)} 首歌曲")
     
+    def apply_change(self, change):
+        """按播放列表模型的变化更新显示"""
+        if not hasattr(self, 'playlist_listbox') or self.playlist_listbox is None:
+            return
+        
+        change_type = change['type']
+        if change_type == 'insert':
+            self.playlist_listbox.insert(change['index'], *[self._format_song(song) for song in change['songs']])
+        elif change_type == 'remove':
+            # 从后往前移除，避免索引变化
+            for idx in reversed(change['indices']):
+                self.playlist_listbox.delete(idx)
+        elif change_type == 'move':
+            self.playlist_listbox.delete(change['from'])
+            self.playlist_listbox.insert(change['to'], self._format_song(change['song']))
+        else:
+            self.refresh_playlist_display(change['songs'])
+    
+    def _format_song(self, song):
+        """播放列表中显示的文字"""
+        return Track.from_dict(song).display_name
+    
     def play_selected_playlist(self):
         """播放选中的播放列表歌曲"""
         if not hasattr(self, 'playlist_listbox') or self.playlist_listbox is None:
@@ -132,11 +140,8 @@ class PlaylistPanel(BasePanel):
         
         # 从主程序移除歌曲
         if hasattr(self.main_app, 'remove_songs_from_playlist'):
+            # 列表显示在播放列表变化通知中更新
             if self.main_app.remove_songs_from_playlist(indices):
-                # 从后往前移除，避免索引变化
-                for idx in sorted(indices, reverse=True):
-                    self.playlist_listbox.delete(idx)
-                
                 removed_count = len(indices)
                 self.log(f"已从播放列表移除 {removed_count} 首歌曲")
                 self.show_message("成功", f"已移除 {removed_count} 首歌曲", "info")
@@ -154,7 +159,6 @@ class PlaylistPanel(BasePanel):
             # 在主程序中清空播放列表
             if hasattr(self.main_app, 'clear_playlist'):
                 self.main_app.clear_playlist()
-                self.playlist_listbox.delete(0, tk.END)
                 self.log("已清空播放列表")
                 self.show_message("成功", "已清空播放列表", "info")
     
@@ -182,7 +186,7 @@ class PlaylistPanel(BasePanel):
             
             if filename:
                 with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(playlist, f, ensure_ascii=False, indent=2)
+                    json.dump([Track.from_dict(song).to_dict() for song in playlist], f, ensure_ascii=False, indent=2)
                 
                 self.show_message("成功", f"播放列表已保存到: {filename}", "info")
                 self.log(f"播放列表保存到: {filename}")
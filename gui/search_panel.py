@@ -1,7 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import json
 from .base_panel import BasePanel
+from api.track import Track
 
 class SearchPanel(BasePanel):
     """搜索音乐面板"""
@@ -25,6 +25,7 @@ class SearchPanel(BasePanel):
         
         ttk.Button(search_frame, text="搜索", command=self.search_music).grid(row=0, column=4, padx=5)
         ttk.Button(search_frame, text="清空", command=self.clear_results).grid(row=0, column=5, padx=5)
+        ttk.Button(search_frame, text="最近播放", command=self.show_recent_plays).grid(row=0, column=6, padx=5)
         
         # 搜索结果列表
         results_frame = ttk.LabelFrame(self.frame, text="搜索结果", padding="10")
@@ -33,6 +34,7 @@ class SearchPanel(BasePanel):
         # 创建树状视图
         columns = ('name', 'artist', 'album', 'source')
         self.results_tree = ttk.Treeview(results_frame, columns=columns, show='headings', height=12)
+        self.result_tracks = {}  # 树状视图项 -> Track
         
         # 定义列
         self.results_tree.heading('name', text='歌曲名')
@@ -107,8 +109,8 @@ class SearchPanel(BasePanel):
         source = self.search_type.get()
         
         # 清空当前结果
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
+        self.results_tree.delete(*self.results_tree.get_children())
+        self.result_tracks.clear()
         
         self.log(f"开始搜索: {keyword}")
         
@@ -116,10 +118,23 @@ class SearchPanel(BasePanel):
         if hasattr(self.main_app, 'search_music'):
             self.main_app.search_music(keyword, source, self)
     
+    def show_recent_plays(self):
+        """在结果列表中显示最近播放过的歌曲"""
+        if not hasattr(self.main_app, 'get_recent_plays'):
+            return
+        songs = self.main_app.get_recent_plays()
+        self.results_tree.delete(*self.results_tree.get_children())
+        self.result_tracks.clear()
+        if not songs:
+            self.show_message("提示", "还没有播放记录")
+            return
+        self.display_search_results(songs, self.search_type.get())
+        self.log(f"最近播放 {len(songs)} 首歌曲")
+    
     def clear_results(self):
         """清空搜索结果"""
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
+        self.results_tree.delete(*self.results_tree.get_children())
+        self.result_tracks.clear()
         self.search_entry.delete(0, tk.END)
         self.info_text.delete(1.0, tk.END)
     
@@ -136,24 +151,15 @@ class SearchPanel(BasePanel):
             self.show_message("警告", "请先选择一首歌曲", "warning")
             return
         
-        item = selection[0]
-        tags = self.results_tree.item(item, 'tags')
+        track = self.result_tracks.get(selection[0])
         
-        if tags:
-            try:
-                song_data = json.loads(tags[0])
-                song_id = song_data.get('id', '')
-                source = self.search_type.get()
-                quality = self.quality_combo.get()
-                
-                self.log(f"播放歌曲: {song_data.get('name', '未知歌曲')}")
-                
-                # 在主程序中播放 - 这会自动添加到播放列表
-                if hasattr(self.main_app, 'play_song_from_data'):
-                    self.main_app.play_song_from_data(song_id, song_data, source, quality)
-                
-            except json.JSONDecodeError as e:
-                self.log(f"解析歌曲数据失败: {str(e)}", "ERROR")
+        if track:
+            quality = self.quality_combo.get()
+            self.log(f"播放歌曲: {track.name}")
+            
+            # 在主程序中播放 - 这会自动添加到播放列表
+            if hasattr(self.main_app, 'play_song_from_data'):
+                self.main_app.play_song_from_data(track.id, track, track.source, quality)
         else:
             self.log("未找到歌曲数据")
     
@@ -164,22 +170,11 @@ class SearchPanel(BasePanel):
             self.show_message("警告", "请先选择一首歌曲", "warning")
             return
         
+        # 在主程序中一次添加所有选中的歌曲
         added_count = 0
-        
-        for item in selection:
-            tags = self.results_tree.item(item, 'tags')
-            if tags:
-                try:
-                    song_data = json.loads(tags[0])
-                    
-                    # 在主程序中添加到收藏
-                    if hasattr(self.main_app, 'add_song_to_favorites'):
-                        if self.main_app.add_song_to_favorites(song_data):
-                            added_count += 1
-                            self.log(f"已添加到收藏: {song_data.get('name', '未知歌曲')}")
-                            
-                except json.JSONDecodeError as e:
-                    self.log(f"解析歌曲数据失败: {str(e)}", "ERROR")
+        if hasattr(self.main_app, 'add_songs_to_favorites'):
+            added_count = self.main_app.add_songs_to_favorites(self._get_selected_songs(selection))
+            self.log(f"已添加 {added_count} 首歌曲到收藏")
         
         if added_count > 0:
             self.show_message("成功", f"已添加 {added_count} 首歌曲到收藏", "info")
@@ -193,28 +188,21 @@ class SearchPanel(BasePanel):
             self.show_message("警告", "请先选择一首歌曲", "warning")
             return
         
+        # 在主程序中一次添加所有选中的歌曲
         added_count = 0
-        
-        for item in selection:
-            tags = self.results_tree.item(item, 'tags')
-            if tags:
-                try:
-                    song_data = json.loads(tags[0])
-                    
-                    # 在主程序中添加到播放列表
-                    if hasattr(self.main_app, 'add_song_to_playlist'):
-                        if self.main_app.add_song_to_playlist(song_data):
-                            added_count += 1
-                            self.log(f"已添加到播放列表: {song_data.get('name', '未知歌曲')}")
-                            
-                except json.JSONDecodeError as e:
-                    self.log(f"解析歌曲数据失败: {str(e)}", "ERROR")
+        if hasattr(self.main_app, 'add_songs_to_playlist'):
+            added_count = self.main_app.add_songs_to_playlist(self._get_selected_songs(selection))
+            self.log(f"已添加 {added_count} 首歌曲到播放列表")
         
         if added_count > 0:
             self.show_message("成功", f"已添加 {added_count} 首歌曲到播放列表", "info")
         else:
             self.show_message("提示", "没有新歌曲被添加到播放列表", "info")
     
+    def _get_selected_songs(self, selection):
+        """选中项对应的歌曲"""
+        return [self.result_tracks[item] for item in selection if item in self.result_tracks]
+    
     def download_selected(self):
         """下载选中歌曲"""
         selection = self.results_tree.selection()
@@ -222,52 +210,24 @@ class SearchPanel(BasePanel):
             self.show_message("警告", "请先选择一首歌曲", "warning")
             return
         
-        for item in selection:
-            tags = self.results_tree.item(item, 'tags')
-            if tags:
-                try:
-                    song_data = json.loads(tags[0])
-                    song_id = song_data.get('id', '')
-                    source = self.search_type.get()
-                    quality = self.quality_combo.get()
-                    
-                    # 在主程序中下载
-                    if hasattr(self.main_app, 'download_song'):
-                        self.main_app.download_song(song_id, song_data, source, quality)
-                    
-                except json.JSONDecodeError as e:
-                    self.log(f"解析歌曲数据失败: {str(e)}", "ERROR")
+        quality = self.quality_combo.get()
+        for track in self._get_selected_songs(selection):
+            # 在主程序中下载
+            if hasattr(self.main_app, 'download_song'):
+                self.main_app.download_song(track.id, track, track.source, quality)
     
     def display_search_results(self, results, source):
         """显示搜索结果"""
+        # 来源显示
+        source_map = {'netease': '网易', 'kuwo': '酷我', 'joox': 'JOOX'}
+        
         for song in results:
-            if not isinstance(song, dict):
+            if not isinstance(song, (dict, Track)):
                 continue
+            track = Track.from_dict(song, source)
             
-            # 提取歌曲信息
-            name = song.get('name', '未知歌曲')
-            
-            # 处理艺术家信息
-            artist_data = song.get('artist', [])
-            if isinstance(artist_data, list):
-                artist_names = []
-                for artist in artist_data:
-                    if isinstance(artist, dict):
-                        artist_names.append(artist.get('name', ''))
-                    elif isinstance(artist, str):
-                        artist_names.append(artist)
-                artist_name = ' / '.join([a for a in artist_names if a])
-            else:
-                artist_name = str(artist_data)
-            
-            album = song.get('album', '未知专辑')
-            
-            # 来源显示
-            source_map = {'netease': '网易', 'kuwo': '酷我', 'joox': 'JOOX'}
-            source_str = source_map.get(source, source)
-            
-            # 添加到树状视图
-            item_id = self.results_tree.insert('', 'end', values=(name, artist_name, album, source_str))
-            
-            # 将完整数据存储到item的tags中
-            self.results_tree.item(item_id, tags=(json.dumps(song, ensure_ascii=False),))
\ No newline at end of file
+            # 添加到树状视图，显示文字在Track创建时已经生成
+            item_id = self.results_tree.insert('', 'end', values=(
+                track.name, track.artist_text, track.get('album', '未知专辑'),
+                source_map.get(track.source, track.source)))
+            self.result_tracks[item_id] = track
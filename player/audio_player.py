@@ -3,10 +3,12 @@ import threading
 import time
 import os
 import tempfile
-import requests
+import hashlib
 from typing import Optional, Callable
 from enum import Enum
 
+from .stream_buffer import StreamBuffer
+
 class PlayerState(Enum):
     STOPPED = "stopped"
     PLAYING = "playing"
@@ -15,8 +17,9 @@ class PlayerState(Enum):
 class AudioPlayer:
     """音频播放器"""
     
-    def __init__(self):
+    def __init__(self, http_pool=None):
         pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+        self.http_pool = http_pool  # 可选的共享连接池
         self.current_url: Optional[str] = None
         self.temp_file: Optional[str] = None
         self.state = PlayerState.STOPPED
@@ -28,6 +31,14 @@ class AudioPlayer:
         self._position_thread: Optional[threading.Thread] = None
         self._stop_flag = threading.Event()
         
+        # 流式播放：缓冲达到阈值即开始播放，剩余部分后台继续下载
+        self.streaming_enabled = True
+        self.stream_start_threshold = 256 * 1024   # 开始播放前需要缓冲的字节数
+        self.stream_resume_threshold = 128 * 1024  # 缓冲不足后恢复播放前需要新增的字节数
+        self.is_buffering = False  # 是否处于缓冲不足状态，供界面显示
+        self._position_offset = 0  # 从指定位置开始播放时，get_pos()不包含起始位置
+        self._stream_buffer: Optional[StreamBuffer] = None
+        
     def load(self, url: str) -> bool:
         """加载音频"""
         try:
@@ -38,45 +49,56 @@ class AudioPlayer:
             
             # 创建临时文件
             temp_dir = tempfile.gettempdir()
-            temp_filename = os.path.join(temp_dir, f"music_temp_{hash(url)}.mp3")
+            temp_filename = os.path.join(temp_dir, f"music_temp_{hashlib.sha1(url.encode('utf-8')).hexdigest()}.mp3")
             self.temp_file = temp_filename
             
-            # 下载音频到临时文件
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Referer': 'https://music.gdstudio.xyz/'
-            }
+            # 在后台下载音频到临时文件
+            buffer = StreamBuffer(url, temp_filename, http_pool=self.http_pool)
+            self._stream_buffer = buffer
+            buffer.start()
             
-            response = requests.get(url, headers=headers, stream=True, timeout=30)
+            if self.streaming_enabled:
+                reached = buffer.wait_for(self.stream_start_threshold)
+            else:
+                reached = buffer.wait_complete()
             
-            if response.status_code == 200:
-                with open(temp_filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                
-                # 加载到pygame
-                pygame.mixer.music.load(temp_filename)
-                self.current_url = url
-                self.state = PlayerState.STOPPED
-                self.position = 0
-                
-                # 获取实际音频时长
+            if not reached:
+                self.log(f"下载音频失败: {buffer.error}")
+                buffer.cancel()
+                self._stream_buffer = None
+                self.temp_file = None
+                return False
+            
+            # 加载到pygame
+            pygame.mixer.music.load(temp_filename)
+            self.current_url = url
+            self.state = PlayerState.STOPPED
+            self.position = 0
+            self._position_offset = 0
+            
+            # 获取实际音频时长，未下载完时按总大小估算
+            if buffer.complete:
                 self.duration = self._get_audio_duration(temp_filename)
-                
-                # 设置音量
-                pygame.mixer.music.set_volume(self.volume)
-                
-                self.log(f"音频加载成功，时长: {self.duration:.2f}秒")
-                return True
             else:
-                self.log(f"下载音频失败: HTTP {response.status_code}")
-                return False
+                self.duration = self._estimate_duration_from_size(buffer.total_size)
+                threading.Thread(target=self._wait_buffer_complete, args=(buffer,),
+                                 daemon=True).start()
+            
+            # 设置音量
+            pygame.mixer.music.set_volume(self.volume)
+            
+            self.log(f"音频加载成功，时长: {self.duration:.2f}秒")
+            return True
             
         except Exception as e:
             self.log(f"加载音频失败: {str(e)}")
             return False
     
+    def _wait_buffer_complete(self, buffer: StreamBuffer):
+        """等待后台下载完成后修正时长"""
+        if buffer.wait_complete() and buffer is self._stream_buffer:
+            self.duration = self._get_audio_duration(buffer.filepath)
+    
     def _get_audio_duration(self, filepath: str) -> float:
         """获取音频文件的准确时长"""
         try:
@@ -98,13 +120,18 @@ class AudioPlayer:
     def _estimate_duration_from_file(self, filepath: str) -> float:
         """根据文件大小估算音频时长"""
         try:
-            file_size = os.path.getsize(filepath)
-            bitrate = 320000  # MP3 320kbps
-            duration = (file_size * 8) / bitrate
-            return max(60, min(duration, 600))  # 限制在1-10分钟之间
+            return self._estimate_duration_from_size(os.path.getsize(filepath))
         except:
             return 180  # 默认返回3分钟
     
+    def _estimate_duration_from_size(self, file_size: int) -> float:
+        """根据文件总字节数估算音频时长"""
+        if file_size <= 0:
+            return 180  # 默认返回3分钟
+        bitrate = 320000  # MP3 320kbps
+        duration = (file_size * 8) / bitrate
+        return max(60, min(duration, 600))  # 限制在1-10分钟之间
+    
     def play(self, url: Optional[str] = None) -> bool:
         """播放音频"""
         try:
@@ -116,6 +143,7 @@ class AudioPlayer:
                 pygame.mixer.music.unpause()
             else:
                 pygame.mixer.music.play()
+                self._position_offset = 0
             
             self.state = PlayerState.PLAYING
             self.position = 0
@@ -157,6 +185,14 @@ class AudioPlayer:
         self.position = 0
         self._notify_state_change()
         
+        # 取消后台下载，缓冲文件由StreamBuffer自行清理
+        if self._stream_buffer:
+            self._stream_buffer.cancel()
+            if self._stream_buffer.filepath == self.temp_file:
+                self.temp_file = None
+            self._stream_buffer = None
+        self.is_buffering = False
+        
         # 清理临时文件
         if self.temp_file and os.path.exists(self.temp_file):
             try:
@@ -187,6 +223,7 @@ class AudioPlayer:
             
             # 跳转到指定位置
             pygame.mixer.music.play(start=position)
+            self._position_offset = position
             
             # 立即更新位置
             self.position = position
@@ -266,7 +303,7 @@ class AudioPlayer:
                 
                 if pygame_pos > 0:
                     # 如果pygame提供了有效位置，使用它
-                    self.position = pygame_pos
+                    self.position = self._position_offset + pygame_pos
                 else:
                     # 否则使用时间估算
                     current_time = time.time()
@@ -286,6 +323,11 @@ class AudioPlayer:
                 
                 # 检查播放是否自然结束
                 if not pygame.mixer.music.get_busy():
+                    buffer = self._stream_buffer
+                    if buffer is not None and not buffer.complete:
+                        # 播放追上了下载进度，等待缓冲
+                        self._wait_for_buffer(buffer)
+                        continue
                     if self.position >= self.duration - 0.5:
                         self._handle_playback_finished()
                         break
@@ -298,6 +340,33 @@ class AudioPlayer:
         
         self.log("位置跟踪结束")
     
+    def _wait_for_buffer(self, buffer: StreamBuffer):
+        """缓冲不足时等待更多数据，然后从当前位置继续播放"""
+        position = self.position
+        self.is_buffering = True
+        self._notify_state_change()
+        self.log(f"缓冲不足，暂停于 {position:.1f}秒 等待数据")
+        
+        target = buffer.bytes_written + self.stream_resume_threshold
+        while not self._stop_flag.is_set() and self.state == PlayerState.PLAYING:
+            if buffer.wait_for(target, timeout=0.2) or buffer.is_finished():
+                break
+        
+        self.is_buffering = False
+        if self._stop_flag.is_set() or self.state != PlayerState.PLAYING:
+            return
+        if buffer.error or buffer.is_cancelled():
+            self.log(f"缓冲中断，停止播放: {buffer.error or '已取消'}")
+            self.stop()
+            return
+        
+        pygame.mixer.music.load(buffer.filepath)
+        pygame.mixer.music.play(start=position)
+        self._position_offset = position
+        self._track_start_time = time.time() - position
+        self._notify_state_change()
+        self.log(f"缓冲恢复，从 {position:.1f}秒 继续播放")
+    
     def _handle_playback_finished(self):
         """处理播放完成"""
         self.log("播放完成")
@@ -3,30 +3,49 @@ import threading
 import time
 import os
 import tempfile
-import requests
+import hashlib
+from urllib.parse import urlparse
 from typing import Optional, Callable, List, Dict
 from enum import Enum
 
+from .stream_buffer import StreamBuffer
+from .playlist_model import PlaylistModel
+
 class PlayerState(Enum):
     STOPPED = "stopped"
     PLAYING = "playing"
     PAUSED = "paused"
 
+class LoadState(Enum):
+    IDLE = "idle"
+    LOADING = "loading"      # 正在连接音频服务器
+    BUFFERING = "buffering"  # 正在接收音频数据
+    READY = "ready"
+    UNDERRUN = "underrun"    # 播放追上了下载进度，等待缓冲
+    FAILED = "failed"
+
 class EnhancedAudioPlayer:
     """增强音频播放器，支持播放列表"""
     
-    def __init__(self):
+    def __init__(self, audio_cache=None, http_pool=None, bandwidth=None):
         pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
         self.current_url: Optional[str] = None
         self.current_song: Optional[Dict] = None
+        self.current_file: Optional[str] = None  # 当前加载到pygame的文件
         self.temp_file: Optional[str] = None
+        self.audio_cache = audio_cache  # 可选的AudioCache，命中时直接播放本地文件
+        self.http_pool = http_pool      # 可选的共享连接池
+        self.bandwidth = bandwidth      # 可选的BandwidthManager，播放缓冲优先于后台下载
+        # 播放链接失效时重新获取链接 (音乐源, 歌曲ID, 音质) -> url
+        self.url_refresher: Optional[Callable] = None
         self.state = PlayerState.STOPPED
         self.volume = 0.5
         self.position = 0
         self.duration = 0
         
-        # 播放列表相关
-        self.playlist: List[Dict] = []  # 完整的播放列表
+        # 播放列表相关（可以用 set_playlist_model() 换成与主窗口共用的模型）
+        self.playlist = PlaylistModel()
+        self.playlist.add_listener(self._on_playlist_changed)
         self.current_playlist_index = -1  # 当前播放的歌曲在播放列表中的索引
         
         # 回调函数
@@ -35,6 +54,20 @@ class EnhancedAudioPlayer:
         self.on_song_change: Optional[Callable] = None
         self.on_playlist_end: Optional[Callable] = None
         self.on_need_next_song: Optional[Callable] = None
+        self.on_load_state_change: Optional[Callable] = None
+        
+        # 异步加载相关
+        self.load_state = LoadState.IDLE
+        self._load_generation = 0  # 每次加载/停止递增，用于丢弃过期的加载结果
+        self._load_lock = threading.Lock()
+        self._load_thread: Optional[threading.Thread] = None
+        self._last_buffer_notify = 0.0
+        
+        # 流式播放：缓冲达到阈值即开始播放，剩余部分后台继续下载
+        self.streaming_enabled = True
+        self.stream_start_threshold = 256 * 1024   # 开始播放前需要缓冲的字节数
+        self.stream_resume_threshold = 128 * 1024  # 缓冲不足后恢复播放前需要新增的字节数
+        self._stream_buffer: Optional[StreamBuffer] = None
         
         # 线程控制
         self._position_thread: Optional[threading.Thread] = None
@@ -42,27 +75,36 @@ class EnhancedAudioPlayer:
         self._track_start_time = 0
         self._seek_position = 0  # 专门记录跳转位置
         
+    def set_playlist_model(self, model: PlaylistModel):
+        """使用共享的播放列表模型"""
+        self.playlist.remove_listener(self._on_playlist_changed)
+        self.playlist = model
+        self.playlist.add_listener(self._on_playlist_changed)
+        self.current_playlist_index = self.playlist.index_of(self.current_song)
+        
     def set_playlist(self, playlist: List[Dict]):
         """设置播放列表"""
-        self.playlist = playlist.copy()
-        self.current_playlist_index = -1
+        self.playlist.reset(playlist)
         
     def add_to_playlist(self, song: Dict):
         """添加到播放列表"""
-        self.playlist.append(song.copy())
+        self.playlist.append(song)
         
     def clear_playlist(self):
         """清空播放列表"""
         self.playlist.clear()
-        self.current_playlist_index = -1
+        
+    def _on_playlist_changed(self, change: Dict):
+        """播放列表变化后按索引重新定位当前歌曲"""
+        self.current_playlist_index = self.playlist.index_of(self.current_song)
         
     def get_current_song(self) -> Optional[Dict]:
         """获取当前播放的歌曲"""
         return self.current_song
         
     def get_playlist(self) -> List[Dict]:
-        """获取播放列表"""
-        return self.playlist.copy()
+        """获取播放列表的副本"""
+        return self.playlist.to_list()
         
     def get_current_index(self) -> int:
         """获取当前播放的索引"""
@@ -110,15 +152,10 @@ class EnhancedAudioPlayer:
             
     def play_specific(self, song_data: Dict) -> bool:
         """播放指定的歌曲"""
-        for i, song in enumerate(self.playlist):
-            if song.get('id') == song_data.get('id'):
-                self.current_playlist_index = i
-                break
-        else:
-            self.add_to_playlist(song_data)
-            self.current_playlist_index = len(self.playlist) - 1
-            
         self.current_song = song_data.copy()
+        if song_data not in self.playlist:
+            self.add_to_playlist(song_data)
+        self.current_playlist_index = self.playlist.index_of(song_data)
         
         if self.on_song_change:
             try:
@@ -128,49 +165,272 @@ class EnhancedAudioPlayer:
                     
         return True
         
-    def load(self, url: str) -> bool:
-        """加载音频"""
+    def load(self, url: str, cache_key: Optional[tuple] = None) -> bool:
+        """加载音频（同步，下载完成后返回）
+        
+        cache_key 为 (音乐源, 歌曲ID, 音质)，提供时优先使用本地缓存，
+        下载完成后写入缓存。
+        """
         try:
             self.stop()
             
-            self.log(f"开始加载音频: {url[:50]}...")
+            cached_path = self._lookup_cache(cache_key)
+            if cached_path:
+                self.log(f"使用缓存音频: {cached_path}")
+                self._finish_load(url, cached_path)
+                return True
             
-            temp_dir = tempfile.gettempdir()
-            temp_filename = os.path.join(temp_dir, f"music_temp_{hash(url)}.mp3")
-            self.temp_file = temp_filename
+            self.log(f"开始加载音频: {url[:50]}...")
             
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Referer': 'https://music.gdstudio.xyz/'
-            }
+            buffer = StreamBuffer(url, self._make_temp_filename(url, self._load_generation, cache_key),
+                                  http_pool=self.http_pool,
+                                  url_refresher=self._make_url_refresher(cache_key),
+                                  bandwidth=self.bandwidth)
+            buffer.start()
+            if not buffer.wait_complete():
+                self.log(f"下载音频失败: {buffer.error}")
+                buffer.cancel()
+                return False
             
-            response = requests.get(url, headers=headers, stream=True, timeout=30)
+            self.temp_file = buffer.filepath
+            self._finish_load(url, buffer.filepath)
+            self._store_in_cache(cache_key, buffer.filepath)
+            return True
             
-            if response.status_code == 200:
-                with open(temp_filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                
-                pygame.mixer.music.load(temp_filename)
-                self.current_url = url
-                self.state = PlayerState.STOPPED
-                self.position = 0
-                self._seek_position = 0
-                
-                self.duration = self._get_audio_duration(temp_filename)
-                
-                pygame.mixer.music.set_volume(self.volume)
-                
-                self.log(f"音频加载成功，时长: {self.duration:.2f}秒")
-                return True
+        except Exception as e:
+            self.log(f"加载音频失败: {str(e)}")
+            return False
+    
+    def load_async(self, url: str, on_ready: Optional[Callable] = None,
+                   on_error: Optional[Callable] = None, cache_key: Optional[tuple] = None):
+        """异步加载音频，立即返回
+        
+        加载进度通过 on_load_state_change(state, progress) 回调报告，
+        加载完成后调用 on_ready()，失败时调用 on_error(message)。
+        开启流式播放时，缓冲达到 stream_start_threshold 字节即视为加载完成，
+        剩余部分继续在后台下载。
+        cache_key 为 (音乐源, 歌曲ID, 音质)，命中缓存时不访问网络，
+        未命中时下载完成后写入缓存。
+        所有回调都在加载线程中触发，界面层需要自行切回主线程。
+        """
+        self.stop()
+        
+        cached_path = self._lookup_cache(cache_key)
+        
+        with self._load_lock:
+            generation = self._load_generation
+            if cached_path:
+                buffer = None
             else:
-                self.log(f"下载音频失败: HTTP {response.status_code}")
-                return False
+                buffer = StreamBuffer(url, self._make_temp_filename(url, generation, cache_key),
+                                      http_pool=self.http_pool,
+                                      url_refresher=self._make_url_refresher(cache_key),
+                                      bandwidth=self.bandwidth)
+            self._stream_buffer = buffer
+        
+        if cached_path:
+            self.log(f"使用缓存音频: {cached_path}")
+        else:
+            self.log(f"开始异步加载音频: {url[:50]}...")
+        self._set_load_state(LoadState.LOADING, 0)
+        
+        self._load_thread = threading.Thread(
+            target=self._load_worker,
+            args=(url, buffer, cached_path, cache_key, generation, on_ready, on_error),
+            daemon=True,
+            name="AudioLoader"
+        )
+        self._load_thread.start()
+    
+    def _make_url_refresher(self, cache_key: Optional[tuple]) -> Optional[Callable]:
+        """为缓冲下载生成重新获取链接的回调"""
+        if not cache_key or not self.url_refresher:
+            return None
+        return lambda: self.url_refresher(*cache_key)
+    
+    def cancel_load(self):
+        """取消正在进行的异步加载"""
+        with self._load_lock:
+            self._load_generation += 1
+            buffer = self._stream_buffer
+            self._stream_buffer = None
+        if buffer:
+            buffer.cancel()
+        if self.load_state != LoadState.IDLE:
+            self._set_load_state(LoadState.IDLE, 0)
+    
+    def is_loading(self) -> bool:
+        """是否有异步加载正在进行"""
+        return self.load_state in (LoadState.LOADING, LoadState.BUFFERING)
+    
+    def is_streaming(self) -> bool:
+        """当前音频是否仍在边下边播"""
+        buffer = self._stream_buffer
+        return buffer is not None and not buffer.complete
+    
+    def _is_current_load(self, generation: int) -> bool:
+        """检查加载任务是否仍然有效"""
+        return generation == self._load_generation
+    
+    def _load_worker(self, url: str, buffer: Optional[StreamBuffer], cached_path: Optional[str],
+                     cache_key: Optional[tuple], generation: int,
+                     on_ready: Optional[Callable], on_error: Optional[Callable]):
+        """异步加载工作线程"""
+        try:
+            if cached_path:
+                with self._load_lock:
+                    if not self._is_current_load(generation):
+                        return
+                    self._finish_load(url, cached_path)
+                self._set_load_state(LoadState.READY, 100)
+                if on_ready:
+                    try:
+                        on_ready()
+                    except Exception as e:
+                        self.log(f"加载完成回调失败: {str(e)}")
+                return
+            
+            buffer.on_progress = lambda written, total: self._on_buffer_progress(buffer, generation)
+            buffer.start()
+            
+            if self.streaming_enabled:
+                reached = buffer.wait_for(self.stream_start_threshold)
+            else:
+                reached = buffer.wait_complete()
+            
+            if not self._is_current_load(generation):
+                return
+            if not reached:
+                raise Exception(f"下载音频失败: {buffer.error or '已取消'}")
+            
+            with self._load_lock:
+                if not self._is_current_load(generation):
+                    return
+                self.temp_file = buffer.filepath
+                self._finish_load(url, buffer.filepath, buffer)
             
+            self._set_load_state(LoadState.READY, buffer.get_progress())
+            if on_ready:
+                try:
+                    on_ready()
+                except Exception as e:
+                    self.log(f"加载完成回调失败: {str(e)}")
+            
+            # 流式播放：等待剩余数据下载完成后修正时长
+            if not buffer.complete:
+                if buffer.wait_complete() and self._is_current_load(generation):
+                    self.duration = self._get_audio_duration(buffer.filepath)
+                    self.log(f"音频缓冲完成，时长: {self.duration:.2f}秒")
+                elif buffer.error and self._is_current_load(generation):
+                    self.log(f"音频缓冲中断: {buffer.error}")
+            
+            if buffer.complete:
+                self._store_in_cache(cache_key, buffer.filepath)
+                    
         except Exception as e:
+            if not self._is_current_load(generation):
+                return
             self.log(f"加载音频失败: {str(e)}")
-            return False
+            self._set_load_state(LoadState.FAILED, 0)
+            if on_error:
+                try:
+                    on_error(str(e))
+                except Exception:
+                    pass
+    
+    def _on_buffer_progress(self, buffer: StreamBuffer, generation: int):
+        """缓冲进度回调，限制通知频率，避免淹没界面事件队列"""
+        if not self._is_current_load(generation):
+            return
+        now = time.time()
+        if now - self._last_buffer_notify < 0.2 and not buffer.complete:
+            return
+        self._last_buffer_notify = now
+        
+        if self.load_state in (LoadState.LOADING, LoadState.BUFFERING):
+            self._set_load_state(LoadState.BUFFERING, buffer.get_progress())
+        elif self.load_state == LoadState.READY:
+            self._set_load_state(LoadState.READY, buffer.get_progress())
+    
+    def _make_temp_filename(self, url: str, generation: int, cache_key: Optional[tuple] = None) -> str:
+        """生成临时文件名（带加载序号，避免新旧加载任务写同一个文件）
+
+        名称取自音频缓存键（没有时取链接）的SHA-1，同一首歌曲在每次运行中得到相同的名称；
+        内置的 hash() 对字符串每个进程随机，不能用于文件名。
+        """
+        temp_dir = tempfile.gettempdir()
+        ext = self._guess_extension(url)
+        key = '/'.join(str(part) for part in cache_key) if cache_key else url
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(temp_dir, f"music_temp_{digest}_{generation}{ext}")
+    
+    @staticmethod
+    def _guess_extension(url: str) -> str:
+        """根据链接推断音频文件扩展名"""
+        path = urlparse(url).path
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ['.mp3', '.flac', '.m4a', '.aac', '.ogg', '.wav']:
+            return ext
+        return '.mp3'
+    
+    def _lookup_cache(self, cache_key: Optional[tuple]) -> Optional[str]:
+        """查找音频缓存"""
+        if not cache_key or not self.audio_cache:
+            return None
+        try:
+            return self.audio_cache.get(*cache_key)
+        except Exception as e:
+            self.log(f"查找缓存失败: {str(e)}")
+            return None
+    
+    def _store_in_cache(self, cache_key: Optional[tuple], filepath: str):
+        """把下载完成的音频写入缓存"""
+        if not cache_key or not self.audio_cache:
+            return
+        try:
+            self.audio_cache.put_file(*cache_key, filepath)
+        except Exception as e:
+            self.log(f"写入缓存失败: {str(e)}")
+    
+    def _finish_load(self, url: str, filepath: str, buffer: Optional[StreamBuffer] = None):
+        """缓冲就绪后加载到pygame"""
+        pygame.mixer.music.load(filepath)
+        self.current_url = url
+        self.current_file = filepath
+        self.state = PlayerState.STOPPED
+        self.position = 0
+        self._seek_position = 0
+        
+        if buffer is not None and not buffer.complete:
+            # 文件尚未下载完，先按总大小估算时长，下载完成后再修正
+            self.duration = self._estimate_duration_from_size(buffer.total_size, filepath)
+        else:
+            self.duration = self._get_audio_duration(filepath)
+        
+        pygame.mixer.music.set_volume(self.volume)
+        
+        self.log(f"音频加载成功，时长: {self.duration:.2f}秒")
+    
+    def _remove_file(self, filepath: str):
+        """删除文件，忽略错误"""
+        try:
+            if filepath and os.path.exists(filepath):
+                os.remove(filepath)
+        except Exception as e:
+            self.log(f"清理临时文件失败: {str(e)}")
+    
+    def _set_load_state(self, state: LoadState, progress: float):
+        """更新加载状态并通知"""
+        self.load_state = state
+        if self.bandwidth:
+            # 缓冲不足时让后台下载让出带宽
+            self.bandwidth.set_playback_low(
+                state in (LoadState.LOADING, LoadState.BUFFERING, LoadState.UNDERRUN))
+        if self.on_load_state_change:
+            try:
+                self.on_load_state_change(state, progress)
+            except Exception as e:
+                self.log(f"加载状态通知失败: {str(e)}")
     
     def _get_audio_duration(self, filepath: str) -> float:
         """获取音频文件的准确时长"""
@@ -215,23 +475,29 @@ class EnhancedAudioPlayer:
     def _estimate_duration_from_file(self, filepath: str) -> float:
         """根据文件大小估算音频时长"""
         try:
-            file_size = os.path.getsize(filepath)
-            file_ext = os.path.splitext(filepath)[1].lower()
-            
-            if file_ext == '.flac':
-                bitrate = 900000
-            elif file_ext in ['.m4a', '.aac']:
-                bitrate = 256000
-            elif file_ext == '.wav':
-                bitrate = 1411200
-            else:
-                bitrate = 320000
-            
-            duration = (file_size * 8) / bitrate
-            return max(60, min(duration, 600))
+            return self._estimate_duration_from_size(os.path.getsize(filepath), filepath)
         except:
             return 180
     
+    def _estimate_duration_from_size(self, file_size: int, filepath: str) -> float:
+        """根据文件总字节数估算音频时长"""
+        if file_size <= 0:
+            return 180
+        
+        file_ext = os.path.splitext(filepath)[1].lower()
+        
+        if file_ext == '.flac':
+            bitrate = 900000
+        elif file_ext in ['.m4a', '.aac']:
+            bitrate = 256000
+        elif file_ext == '.wav':
+            bitrate = 1411200
+        else:
+            bitrate = 320000
+        
+        duration = (file_size * 8) / bitrate
+        return max(60, min(duration, 600))
+    
     def play(self, url: Optional[str] = None) -> bool:
         """播放音频"""
         try:
@@ -284,6 +550,9 @@ class EnhancedAudioPlayer:
     
     def stop(self):
         """停止播放"""
+        # 流式缓冲文件由StreamBuffer在取消时自行清理
+        stream_file = self._stream_buffer.filepath if self._stream_buffer else None
+        self.cancel_load()
         self._stop_position_tracking()
         if pygame.mixer.music.get_busy():
             pygame.mixer.music.stop()
@@ -293,7 +562,9 @@ class EnhancedAudioPlayer:
         self._seek_position = 0
         self._notify_state_change()
         
-        if self.temp_file and os.path.exists(self.temp_file):
+        if self.temp_file and self.temp_file == stream_file:
+            self.temp_file = None
+        elif self.temp_file and os.path.exists(self.temp_file):
             try:
                 os.remove(self.temp_file)
                 self.temp_file = None
@@ -326,8 +597,8 @@ class EnhancedAudioPlayer:
             self.position = position
             
             # 重新加载音乐并设置位置
-            if self.temp_file and os.path.exists(self.temp_file):
-                pygame.mixer.music.load(self.temp_file)
+            if self.current_file and os.path.exists(self.current_file):
+                pygame.mixer.music.load(self.current_file)
             
             # 从指定位置开始播放
             pygame.mixer.music.play(start=position)
@@ -391,6 +662,7 @@ class EnhancedAudioPlayer:
             
             pygame.mixer.music.load(filepath)
             self.current_url = f"file://{filepath}"
+            self.current_file = filepath
             self.state = PlayerState.STOPPED
             self.position = 0
             self._seek_position = 0
@@ -442,17 +714,24 @@ class EnhancedAudioPlayer:
                 time_elapsed = current_time - self._track_start_time
                 self.position = time_elapsed
                 
-                # 防止超出总时长
+                streaming = self.is_streaming()
+                
+                # 防止超出总时长（流式播放时时长只是估算值，不据此判断结束）
                 if self.position > self.duration:
                     self.position = self.duration
-                    self._handle_playback_finished()
-                    break
+                    if not streaming:
+                        self._handle_playback_finished()
+                        break
                 
                 # 通知位置变化
                 self._notify_position_change()
                 
                 # 检查播放是否结束
                 if not pygame.mixer.music.get_busy():
+                    if streaming:
+                        # 播放追上了下载进度
+                        self._handle_buffer_underrun()
+                        continue
                     if self.position >= self.duration - 1.0:
                         self._handle_playback_finished()
                         break
@@ -469,6 +748,35 @@ class EnhancedAudioPlayer:
         
         self.log("位置跟踪线程结束运行")
     
+    def _handle_buffer_underrun(self):
+        """处理缓冲不足：等待更多数据后从当前位置继续播放"""
+        buffer = self._stream_buffer
+        if buffer is None:
+            return
+        
+        position = self.position
+        self.log(f"缓冲不足，暂停于 {position:.1f}秒 等待数据")
+        self._set_load_state(LoadState.UNDERRUN, buffer.get_progress())
+        
+        target = buffer.bytes_written + self.stream_resume_threshold
+        while not self._stop_flag.is_set() and self.state == PlayerState.PLAYING:
+            if buffer.wait_for(target, timeout=0.2) or buffer.is_finished():
+                break
+        
+        if self._stop_flag.is_set() or self.state != PlayerState.PLAYING:
+            return
+        if buffer is not self._stream_buffer or buffer.error or buffer.is_cancelled():
+            self.log(f"缓冲中断，停止播放: {buffer.error or '已取消'}")
+            self.stop()
+            return
+        
+        # 重新打开文件，让解码器看到新写入的数据
+        pygame.mixer.music.load(buffer.filepath)
+        pygame.mixer.music.play(start=position)
+        self._track_start_time = time.time() - position
+        self._set_load_state(LoadState.READY, buffer.get_progress())
+        self.log(f"缓冲恢复，从 {position:.1f}秒 继续播放")
+    
     def _handle_playback_finished(self):
         """处理播放完成"""
         self.log("播放完成")
@@ -0,0 +1,192 @@
+import threading
+from typing import Optional, Callable, Dict, List, Iterable, Tuple
+
+from api.track import Track
+
+class PlaylistModel:
+    """播放列表模型
+
+    主窗口、播放器、面板和保存共用同一个播放列表，不再各自保存副本再手动同步。
+    加入的歌曲统一保存为不可修改的Track，各处共享同一个对象。
+    歌曲按 (音乐源, 歌曲ID) 去重，另外维护 键 -> 位置 的索引，判断歌曲是否在列表中
+    和查找位置都是O(1)；在末尾追加是O(1)，在中间插入、删除和移动只需更新之后的位置。
+    每次修改后把变化（diff）通知给 add_listener() 登记的回调：
+        {'type': 'insert', 'index': 起始位置, 'songs': [...]}
+        {'type': 'remove', 'indices': [...], 'songs': [...]}   # 原来的位置，从小到大
+        {'type': 'move', 'from': 原位置, 'to': 新位置, 'song': {...}}
+        {'type': 'reset', 'songs': [...]}
+    回调在修改的线程中调用，更新界面时需要自行切换到主线程。
+    """
+
+    INSERT = 'insert'
+    REMOVE = 'remove'
+    MOVE = 'move'
+    RESET = 'reset'
+
+    def __init__(self, songs: Optional[Iterable[Dict]] = None):
+        self._songs: List[Dict] = []
+        self._positions: Dict[Tuple[str, str], int] = {}
+        self._listeners: List[Callable] = []
+        self._lock = threading.RLock()
+
+        if songs:
+            self._add_unique(songs, 0)
+
+    @staticmethod
+    def key_of(song: Dict) -> Tuple[str, str]:
+        """歌曲的唯一键 (音乐源, 歌曲ID)"""
+        return song.get('source') or 'netease', str(song.get('id', ''))
+
+    def add_listener(self, callback: Callable):
+        """登记变化回调 callback(change)"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable):
+        """取消登记变化回调"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    # ========== 查询 ==========
+
+    def __len__(self) -> int:
+        return len(self._songs)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, index):
+        with self._lock:
+            return self._songs[index]
+
+    def __contains__(self, song: Dict) -> bool:
+        return self.key_of(song) in self._positions
+
+    def index_of(self, song: Optional[Dict]) -> int:
+        """歌曲的位置，不在列表中时返回-1"""
+        if not song:
+            return -1
+        return self._positions.get(self.key_of(song), -1)
+
+    def get(self, index: int) -> Optional[Dict]:
+        """指定位置的歌曲，越界时返回None"""
+        with self._lock:
+            if 0 <= index < len(self._songs):
+                return self._songs[index]
+            return None
+
+    def to_list(self) -> List[Dict]:
+        """播放列表的副本"""
+        with self._lock:
+            return list(self._songs)
+
+    # ========== 修改 ==========
+
+    def append(self, song: Dict) -> bool:
+        """追加到末尾，已在列表中时返回False"""
+        return bool(self.extend([song]))
+
+    def extend(self, songs: Iterable[Dict]) -> List[Dict]:
+        """追加到末尾，返回实际加入的歌曲（已在列表中的跳过）"""
+        with self._lock:
+            index = len(self._songs)
+            added = self._add_unique(songs, index)
+        if added:
+            self._notify({'type': self.INSERT, 'index': index, 'songs': added})
+        return added
+
+    def insert(self, index: int, songs: Iterable[Dict]) -> List[Dict]:
+        """插入到指定位置，返回实际插入的歌曲"""
+        with self._lock:
+            index = max(0, min(index, len(self._songs)))
+            added = self._add_unique(songs, index)
+        if added:
+            self._notify({'type': self.INSERT, 'index': index, 'songs': added})
+        return added
+
+    def remove_indices(self, indices: Iterable[int]) -> List[Dict]:
+        """删除指定位置的歌曲，返回删除的歌曲"""
+        with self._lock:
+            indices = sorted({i for i in indices if 0 <= i < len(self._songs)})
+            if not indices:
+                return []
+            removed = [self._songs[i] for i in indices]
+            for i in reversed(indices):
+                del self._positions[self.key_of(self._songs[i])]
+                del self._songs[i]
+            self._reindex(indices[0])
+        self._notify({'type': self.REMOVE, 'indices': indices, 'songs': removed})
+        return removed
+
+    def remove(self, songs: Iterable[Dict]) -> List[Dict]:
+        """删除指定的歌曲，返回删除的歌曲"""
+        with self._lock:
+            indices = [self.index_of(song) for song in songs]
+        return self.remove_indices(i for i in indices if i >= 0)
+
+    def move(self, from_index: int, to_index: int) -> bool:
+        """把歌曲从from_index移动到to_index"""
+        with self._lock:
+            if not (0 <= from_index < len(self._songs)) or from_index == to_index:
+                return False
+            to_index = max(0, min(to_index, len(self._songs) - 1))
+            song = self._songs.pop(from_index)
+            self._songs.insert(to_index, song)
+            self._reindex(min(from_index, to_index), max(from_index, to_index) + 1)
+        self._notify({'type': self.MOVE, 'from': from_index, 'to': to_index, 'song': song})
+        return True
+
+    def reset(self, songs: Iterable[Dict]):
+        """替换整个播放列表（重复的歌曲只保留第一首）"""
+        with self._lock:
+            self._songs = []
+            self._positions = {}
+            self._add_unique(songs, 0)
+            songs = list(self._songs)
+        self._notify({'type': self.RESET, 'songs': songs})
+
+    def clear(self):
+        """清空播放列表"""
+        self.reset([])
+
+    # ========== 内部方法 ==========
+
+    def _add_unique(self, songs: Iterable[Dict], index: int) -> List[Track]:
+        """在index处插入不在列表中的歌曲（调用方需持有锁）"""
+        added = []
+        seen = set()
+        for song in songs:
+            song = Track.from_dict(song)
+            if song.key in self._positions or song.key in seen:
+                continue
+            seen.add(song.key)
+            added.append(song)
+        if not added:
+            return added
+
+        if index == len(self._songs):
+            for song in added:
+                self._positions[self.key_of(song)] = len(self._songs)
+                self._songs.append(song)
+        else:
+            self._songs[index:index] = added
+            self._reindex(index)
+        return added
+
+    def _reindex(self, start: int, end: Optional[int] = None):
+        """更新 [start, end) 范围内歌曲的位置（调用方需持有锁）"""
+        if end is None:
+            end = len(self._songs)
+        for position in range(start, end):
+            self._positions[self.key_of(self._songs[position])] = position
+
+    def _notify(self, change: Dict):
+        """通知所有回调"""
+        for callback in list(self._listeners):
+            try:
+                callback(change)
+            except Exception as e:
+                self.log(f"播放列表变化回调失败: {str(e)}")
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[PlaylistModel] {message}")
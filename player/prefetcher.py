@@ -0,0 +1,182 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Optional, Callable, List, Dict, Tuple
+
+from api.request_scheduler import RequestPriority
+from utils.bandwidth import BandwidthManager
+from .stream_buffer import StreamBuffer
+
+class TrackPrefetcher:
+    """播放列表预取器
+
+    在当前歌曲播放时，提前解析接下来几首歌的播放链接并把音频下载到
+    AudioCache，切歌时无需再等待API和下载。播放列表变化时取消过期的预取。
+    """
+
+    def __init__(self, api, audio_cache, depth: int = 1,
+                 min_resolve_interval: float = 5.0, http_pool=None,
+                 reserve_requests: int = 10, bandwidth=None):
+        self.api = api
+        self.audio_cache = audio_cache
+        self.http_pool = http_pool
+        self.bandwidth = bandwidth  # 可选的BandwidthManager，预取按后台流量限速
+        self.depth = depth                                # 预取接下来几首
+        self.min_resolve_interval = min_resolve_interval  # 两次预取解析之间的最小间隔，节省API配额
+        self.reserve_requests = reserve_requests          # 剩余API配额不超过该值时不再预取
+
+        # 返回True时暂缓预取（例如当前歌曲仍在缓冲），避免和正在播放的歌曲抢带宽
+        self.should_wait: Optional[Callable] = None
+
+        self._jobs: List[Dict] = []
+        self._current_job: Optional[Dict] = None
+        self._current_buffer: Optional[StreamBuffer] = None
+        self._last_resolve_time = 0.0
+
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="TrackPrefetcher")
+        self._thread.start()
+
+    @staticmethod
+    def _make_key(song: Dict, quality: str) -> Tuple:
+        """生成预取键 (音乐源, 歌曲ID, 音质)"""
+        return (song.get('source', 'netease'), str(song.get('id', '')), str(quality))
+
+    def schedule(self, playlist: List[Dict], current_index: int, quality: str):
+        """根据当前播放位置安排预取"""
+        upcoming = playlist[current_index + 1:current_index + 1 + self.depth] if current_index >= 0 else []
+        jobs = [{'key': self._make_key(song, quality), 'name': song.get('name', '未知歌曲')}
+                for song in upcoming if song.get('id')]
+
+        with self._cond:
+            keys = {job['key'] for job in jobs}
+            # 正在预取的歌曲仍在列表中时不打断它
+            if self._current_job and self._current_job['key'] in keys:
+                jobs = [job for job in jobs if job['key'] != self._current_job['key']]
+            else:
+                self._cancel_current()
+            self._jobs = jobs
+            self._cond.notify_all()
+
+    def cancel(self):
+        """取消所有预取任务（播放列表变化时调用）"""
+        with self._cond:
+            self._jobs = []
+            self._cancel_current()
+            self._cond.notify_all()
+
+    def shutdown(self):
+        """停止预取线程"""
+        with self._cond:
+            self._shutdown = True
+            self._jobs = []
+            self._cancel_current()
+            self._cond.notify_all()
+
+    def _cancel_current(self):
+        """取消正在进行的预取下载（调用方需持有锁）"""
+        if self._current_buffer:
+            self._current_buffer.cancel()
+        self._current_job = None
+
+    def _worker(self):
+        """预取工作线程"""
+        while True:
+            with self._cond:
+                while not self._shutdown and not self._jobs:
+                    self._cond.wait()
+                if self._shutdown:
+                    return
+                job = self._jobs.pop(0)
+                self._current_job = job
+
+            try:
+                self._prefetch(job)
+            except Exception as e:
+                self.log(f"预取失败: {job['name']} - {str(e)}")
+            finally:
+                with self._cond:
+                    if self._current_job is job:
+                        self._current_job = None
+                    self._current_buffer = None
+
+    def _is_cancelled(self, job: Dict) -> bool:
+        """预取任务是否已被取消"""
+        return self._shutdown or self._current_job is not job
+
+    def _prefetch(self, job: Dict):
+        """预取一首歌曲：解析链接并下载到缓存"""
+        source, song_id, quality = job['key']
+        if self.audio_cache.contains(source, song_id, quality):
+            return
+
+        # 等当前歌曲缓冲完成，不和它抢带宽
+        while self.should_wait and self.should_wait():
+            if self._is_cancelled(job):
+                return
+            time.sleep(0.5)
+
+        # 解析到的链接保存在MusicAPI的播放链接缓存中，切歌时直接命中
+        url_data = self.api.get_cached_play_url(song_id, source, quality)
+        if not url_data:
+            # 限制预取解析频率，把API配额留给用户的操作
+            wait = self.min_resolve_interval - (time.time() - self._last_resolve_time)
+            if wait > 0:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._is_cancelled(job), timeout=wait)
+            if self._is_cancelled(job):
+                return
+
+            if self.api.rate_limiter.remaining() <= self.reserve_requests:
+                self.log(f"API配额不足，跳过预取: {job['name']}")
+                return
+
+            self._last_resolve_time = time.time()
+            url_data = self.api.get_play_url(song_id, source, quality, wait=False,
+                                             priority=RequestPriority.PREFETCH)
+            if not url_data or not url_data.get('url'):
+                self.log(f"未获取到播放链接: {job['name']}")
+                return
+
+        if self._is_cancelled(job):
+            return
+
+        temp_name = hashlib.sha1(repr(job['key']).encode('utf-8')).hexdigest()
+        temp_path = os.path.join(tempfile.gettempdir(), f"music_prefetch_{temp_name}.part")
+        buffer = StreamBuffer(url_data['url'], temp_path, http_pool=self.http_pool,
+                              url_refresher=lambda: self._refresh_url(source, song_id, quality),
+                              bandwidth=self.bandwidth, bandwidth_kind=BandwidthManager.PREFETCH)
+        with self._cond:
+            if self._is_cancelled(job):
+                return
+            self._current_buffer = buffer
+
+        self.log(f"开始预取: {job['name']}")
+        buffer.start()
+        if buffer.wait_complete():
+            ext = os.path.splitext(url_data['url'].split('?')[0])[1].lower()
+            if ext not in ['.mp3', '.flac', '.m4a', '.aac', '.ogg', '.wav']:
+                ext = '.mp3'
+            self.audio_cache.put_file(source, song_id, quality, temp_path, ext)
+            self.log(f"预取完成: {job['name']}")
+        elif buffer.error:
+            self.log(f"预取下载失败: {job['name']} - {buffer.error}")
+
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        except Exception:
+            pass
+
+    def _refresh_url(self, source: str, song_id: str, quality: str) -> Optional[str]:
+        """预取链接失效时重新获取"""
+        url_data = self.api.get_play_url(song_id, source, quality, wait=False,
+                                         priority=RequestPriority.PREFETCH, force_refresh=True)
+        return url_data.get('url') if url_data else None
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[TrackPrefetcher] {message}")
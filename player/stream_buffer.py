@@ -0,0 +1,178 @@
+import os
+import threading
+from typing import Optional, Callable
+
+from utils.http_pool import HttpPool
+from utils.stream_writer import StreamWriter
+from utils.bandwidth import BandwidthManager
+
+class StreamBuffer:
+    """边下载边播放的音频缓冲文件
+
+    在后台线程中把音频写入本地文件，每写入一块数据就刷新到磁盘，
+    播放器可以在下载完成之前打开这个文件开始播放。
+    """
+
+    def __init__(self, url: str, filepath: str, headers: Optional[dict] = None,
+                 chunk_size: int = 16 * 1024, http_pool: Optional[HttpPool] = None,
+                 url_refresher: Optional[Callable] = None,
+                 bandwidth: Optional[BandwidthManager] = None,
+                 bandwidth_kind: str = BandwidthManager.PLAYBACK):
+        self.url = url
+        self.filepath = filepath
+        self.http = http_pool or HttpPool.shared()
+        self.headers = headers or {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Referer': 'https://music.gdstudio.xyz/'
+        }
+        self.chunk_size = chunk_size
+        # 链接失效（403/410）时调用一次，返回新的链接
+        self.url_refresher = url_refresher
+        # 可选的全局带宽分配，bandwidth_kind 为播放缓冲或预取
+        self.bandwidth = bandwidth
+        self.bandwidth_kind = bandwidth_kind
+
+        self.total_size = 0
+        self.bytes_written = 0
+        self.complete = False
+        self.error: Optional[str] = None
+        self.status_code: Optional[int] = None
+
+        # 进度回调 (bytes_written, total_size)，在下载线程中触发
+        self.on_progress: Optional[Callable] = None
+
+        self._cond = threading.Condition()
+        self._cancelled = threading.Event()
+        self._delete_on_cancel = True
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台下载"""
+        self._thread = threading.Thread(target=self._run, daemon=True, name="StreamBuffer")
+        self._thread.start()
+
+    def cancel(self, delete_file: bool = True):
+        """取消下载，默认同时删除缓冲文件"""
+        with self._cond:
+            self._delete_on_cancel = delete_file
+            self._cancelled.set()
+            self._cond.notify_all()
+            finished = self._thread is None or not self._thread.is_alive()
+
+        # 下载线程已经结束时由这里清理，否则交给下载线程退出时清理
+        if finished and delete_file:
+            self._remove_file()
+
+    def is_cancelled(self) -> bool:
+        """是否已取消"""
+        return self._cancelled.is_set()
+
+    def is_finished(self) -> bool:
+        """下载是否已结束（完成、失败或取消）"""
+        return self.complete or self.error is not None or self._cancelled.is_set()
+
+    def wait_for(self, min_bytes: int, timeout: Optional[float] = None) -> bool:
+        """等待至少缓冲min_bytes字节
+
+        达到阈值或下载完成返回True；失败、取消或超时返回False。
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.bytes_written >= min_bytes or self.is_finished(),
+                timeout=timeout
+            )
+            if self.error is not None or self._cancelled.is_set():
+                return False
+            return self.complete or self.bytes_written >= min_bytes
+
+    def wait_complete(self, timeout: Optional[float] = None) -> bool:
+        """等待下载完成"""
+        with self._cond:
+            self._cond.wait_for(self.is_finished, timeout=timeout)
+            return self.complete
+
+    def get_progress(self) -> float:
+        """获取下载进度（百分比）"""
+        if self.complete:
+            return 100
+        if self.total_size > 0:
+            return min(100, (self.bytes_written / self.total_size) * 100)
+        return 0
+
+    def _run(self):
+        """下载线程"""
+        consumer = None
+        if self.bandwidth:
+            consumer = self.bandwidth.register(os.path.basename(self.filepath), self.bandwidth_kind)
+        try:
+            response = self._open()
+            try:
+                self.status_code = response.status_code
+                if response.status_code != 200:
+                    raise Exception(f"HTTP {response.status_code}")
+
+                self.total_size = int(response.headers.get('content-length', 0))
+
+                # 播放器会读取正在写入的文件，不预分配文件大小
+                writer = StreamWriter(min_chunk=self.chunk_size, max_chunk=256 * 1024)
+                with open(self.filepath, 'wb') as f:
+                    for nbytes in writer.iter_write(response, f, self.total_size, preallocate=False):
+                        # 立即刷新，保证播放器读到的是已写入的数据
+                        f.flush()
+                        with self._cond:
+                            self.bytes_written += nbytes
+                            self._cond.notify_all()
+                        self._notify_progress()
+                        if consumer:
+                            self.bandwidth.consume(consumer, nbytes, should_stop=self._cancelled.is_set)
+                        if self._cancelled.is_set():
+                            break
+            finally:
+                response.close()
+
+            with self._cond:
+                if not self._cancelled.is_set():
+                    self.complete = True
+                self._cond.notify_all()
+            self._notify_progress()
+
+        except Exception as e:
+            with self._cond:
+                self.error = str(e)
+                self._cond.notify_all()
+        finally:
+            if consumer:
+                self.bandwidth.unregister(consumer)
+
+        if self._cancelled.is_set() and self._delete_on_cancel:
+            self._remove_file()
+
+    def _open(self):
+        """发起请求，链接失效时换用新链接重试一次"""
+        response = self.http.get(self.url, headers=self.headers, stream=True, timeout=30)
+        if response.status_code not in (403, 410) or not self.url_refresher:
+            return response
+        
+        response.close()
+        print(f"[StreamBuffer] 链接已失效 (HTTP {response.status_code})，重新获取链接")
+        new_url = self.url_refresher()
+        if not new_url or self._cancelled.is_set():
+            raise Exception(f"HTTP {response.status_code}")
+        self.url = new_url
+        return self.http.get(self.url, headers=self.headers, stream=True, timeout=30)
+    
+    def _notify_progress(self):
+        """通知进度变化"""
+        if self.on_progress:
+            try:
+                self.on_progress(self.bytes_written, self.total_size)
+            except Exception:
+                pass
+
+    def _remove_file(self):
+        """删除缓冲文件"""
+        try:
+            if os.path.exists(self.filepath):
+                os.remove(self.filepath)
+        except Exception as e:
+            print(f"[StreamBuffer] 清理缓冲文件失败: {str(e)}")
@@ -3,10 +3,31 @@ from .file_handler import FileHandler
 from .logger import Logger
 from .playlist_handler import PlaylistHandler
 from .download_manager import DownloadManager
+from .download_journal import DownloadJournal
+from .download_history import DownloadHistory
+from .audio_cache import AudioCache
+from .http_pool import HttpPool
+from .bandwidth import BandwidthManager
+from .segmented_download import SegmentedDownloader
+from .stream_writer import StreamWriter
+from .track_index import LocalTrackIndex
+from .library_store import LibraryStore
+from .persistence import PersistenceScheduler, atomic_write_json
 
 __all__ = [
     'FileHandler',
     'Logger',
     'PlaylistHandler',
-    'DownloadManager'
+    'DownloadManager',
+    'DownloadJournal',
+    'DownloadHistory',
+    'AudioCache',
+    'HttpPool',
+    'BandwidthManager',
+    'SegmentedDownloader',
+    'StreamWriter',
+    'LocalTrackIndex',
+    'LibraryStore',
+    'PersistenceScheduler',
+    'atomic_write_json'
 ]
\ No newline at end of file
@@ -0,0 +1,305 @@
+# utils/audio_cache.py
+import os
+import json
+import time
+import glob
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+
+from .persistence import atomic_write_json
+
+class AudioCache:
+    """本地音频缓存
+
+    按 (音乐源, 歌曲ID, 音质) 寻址，文件存放在两级分片目录中，
+    超过容量上限时按最近最少使用（LRU）淘汰。索引保存在 index.json，
+    程序重启后缓存依然有效。传入 persistence 时索引由后台线程合并保存。
+    """
+
+    INDEX_FILE = "index.json"
+    INDEX_SAVE_INTERVAL = 30  # 仅访问时间变化时，索引最多每30秒写一次
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 2 * 1024 * 1024 * 1024,
+                 persistence=None):
+        if cache_dir is None:
+            from .file_handler import FileHandler
+            cache_dir = os.path.join(FileHandler.get_data_dir(), "audio_cache")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.persistence = persistence  # 可选的PersistenceScheduler
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()  # 按访问时间从旧到新排列
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self._index_dirty = False
+        self._last_index_save = 0.0
+        self._started_at = time.time()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'bytes_added': 0
+        }
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+        if self.persistence:
+            self.persistence.register('audio_cache', self.flush)
+
+    @staticmethod
+    def make_key(source: str, song_id, quality) -> str:
+        """生成缓存键"""
+        raw = f"{source}:{song_id}:{quality}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path_for(self, key: str, ext: str) -> str:
+        """获取缓存文件路径（两级分片目录）"""
+        return os.path.join(self.cache_dir, key[:2], key[2:4], key + ext)
+
+    def get(self, source: str, song_id, quality) -> Optional[str]:
+        """查找缓存文件，命中返回文件路径"""
+        key = self.make_key(source, song_id, quality)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                path = self._path_for(key, entry['ext'])
+                if os.path.exists(path):
+                    entry['last_access'] = time.time()
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    self._index_dirty = True
+                    self._maybe_save_index()
+                    return path
+                # 文件已被外部删除
+                self._drop_entry(key)
+            self.stats['misses'] += 1
+            return None
+
+    def contains(self, source: str, song_id, quality) -> bool:
+        """检查是否已缓存（不影响统计和淘汰顺序）"""
+        key = self.make_key(source, song_id, quality)
+        with self._lock:
+            entry = self._entries.get(key)
+            return bool(entry) and os.path.exists(self._path_for(key, entry['ext']))
+
+    def put_file(self, source: str, song_id, quality, src_path: str,
+                 ext: Optional[str] = None) -> Optional[str]:
+        """把已下载完成的文件加入缓存
+
+        优先创建硬链接，失败时复制，源文件保持不变（播放器可能仍在使用它）。
+        """
+        if ext is None:
+            ext = os.path.splitext(src_path)[1].lower() or '.mp3'
+        key = self.make_key(source, song_id, quality)
+        final_path = self._path_for(key, ext)
+        part_path = final_path + '.part'
+
+        try:
+            size = os.path.getsize(src_path)
+            if size <= 0:
+                return None
+            if self.max_bytes and size > self.max_bytes:
+                return None
+
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            try:
+                os.link(src_path, part_path)
+            except (OSError, AttributeError):
+                shutil.copyfile(src_path, part_path)
+            os.replace(part_path, final_path)
+        except Exception as e:
+            self.log(f"写入缓存失败: {str(e)}")
+            try:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+            except Exception:
+                pass
+            return None
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._total_bytes -= old['size']
+                old_path = self._path_for(key, old['ext'])
+                if old['ext'] != ext and os.path.exists(old_path):
+                    self._remove_file(old_path)
+
+            self._entries[key] = {
+                'source': source,
+                'id': str(song_id),
+                'quality': str(quality),
+                'ext': ext,
+                'size': size,
+                'last_access': time.time()
+            }
+            self._total_bytes += size
+            self.stats['bytes_added'] += size
+            self._evict(protect=key)
+            self._index_changed()
+
+        self.log(f"已缓存: {source}/{song_id}/{quality} ({size / 1024 / 1024:.1f}MB)")
+        return final_path
+
+    def remove(self, source: str, song_id, quality) -> bool:
+        """删除缓存项"""
+        key = self.make_key(source, song_id, quality)
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._drop_entry(key, delete_file=True)
+            self._index_changed()
+            return True
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._entries.keys()):
+                self._drop_entry(key, delete_file=True)
+            self._index_changed()
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': self.stats['hits'] / lookups if lookups else 0.0
+            }
+
+    def cleanup_orphans(self):
+        """清理孤立文件
+
+        删除以前留在临时目录中的 music_temp_*/music_prefetch_* 文件、缓存目录中未完成的
+        .part 文件，以及索引中文件已不存在的条目。只清理本次启动之前的文件，
+        避免误删当前正在写入的缓冲文件。
+        """
+        removed = 0
+
+        for pattern in ("music_temp_*", "music_prefetch_*"):
+            for path in glob.glob(os.path.join(tempfile.gettempdir(), pattern)):
+                if self._is_stale(path) and self._remove_file(path):
+                    removed += 1
+
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for filename in files:
+                if filename.endswith('.part'):
+                    path = os.path.join(root, filename)
+                    if self._is_stale(path) and self._remove_file(path):
+                        removed += 1
+
+        with self._lock:
+            missing = [key for key, entry in self._entries.items()
+                       if not os.path.exists(self._path_for(key, entry['ext']))]
+            for key in missing:
+                self._drop_entry(key)
+            if missing:
+                self._save_index()
+
+        if removed or missing:
+            self.log(f"清理孤立文件 {removed} 个，失效索引 {len(missing)} 条")
+
+    def flush(self):
+        """保存索引"""
+        with self._lock:
+            if self._index_dirty:
+                self._save_index()
+
+    def _is_stale(self, path: str) -> bool:
+        """文件是否在本次启动之前写入"""
+        try:
+            return os.path.getmtime(path) < self._started_at
+        except OSError:
+            return False
+
+    def _evict(self, protect: Optional[str] = None):
+        """超出容量上限时淘汰最久未使用的缓存"""
+        if not self.max_bytes:
+            return
+        while self._total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            if key == protect:
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(key)
+                continue
+            self._drop_entry(key, delete_file=True)
+            self.stats['evictions'] += 1
+
+    def _drop_entry(self, key: str, delete_file: bool = False):
+        """移除索引项"""
+        entry = self._entries.pop(key, None)
+        if not entry:
+            return
+        self._total_bytes -= entry['size']
+        self._index_dirty = True
+        if delete_file:
+            self._remove_file(self._path_for(key, entry['ext']))
+
+    def _remove_file(self, path: str) -> bool:
+        """删除文件，忽略错误"""
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+                return True
+        except Exception as e:
+            self.log(f"删除缓存文件失败: {str(e)}")
+        return False
+
+    def _load_index(self):
+        """加载缓存索引"""
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        try:
+            if os.path.exists(index_path):
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                entries = sorted(data.get('entries', []), key=lambda e: e.get('last_access', 0))
+                for entry in entries:
+                    key = entry.pop('key')
+                    self._entries[key] = entry
+                    self._total_bytes += entry.get('size', 0)
+                self.log(f"加载缓存索引，共 {len(self._entries)} 项，"
+                         f"{self._total_bytes / 1024 / 1024:.1f}MB")
+        except Exception as e:
+            self.log(f"加载缓存索引失败: {str(e)}")
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _maybe_save_index(self):
+        """距离上次保存足够久时才写索引"""
+        if self.persistence:
+            self.persistence.mark_dirty('audio_cache')
+        elif time.time() - self._last_index_save >= self.INDEX_SAVE_INTERVAL:
+            self._save_index()
+
+    def _index_changed(self):
+        """索引有变化：有后台保存时标记待保存，否则立即写入（调用方需持有锁）"""
+        self._index_dirty = True
+        if self.persistence:
+            self.persistence.mark_dirty('audio_cache')
+        else:
+            self._save_index()
+
+    def _save_index(self):
+        """保存缓存索引（先写临时文件再替换，避免索引损坏）"""
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        try:
+            entries = [{'key': key, **entry} for key, entry in self._entries.items()]
+            atomic_write_json(index_path, {'version': 1, 'entries': entries})
+            self._index_dirty = False
+            self._last_index_save = time.time()
+        except Exception as e:
+            self.log(f"保存缓存索引失败: {str(e)}")
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[AudioCache] {message}")
@@ -0,0 +1,136 @@
+# utils/bandwidth.py
+import time
+import threading
+from collections import deque
+from typing import Optional, Callable, Dict, List
+
+class BandwidthManager:
+    """全局带宽分配
+
+    播放缓冲、预取和下载在每读取一块数据后调用 consume() 登记用量。
+    播放缓冲从不限速；预取和下载属于后台流量，共用一个令牌桶，
+    速率上限为 download_limit，正在边下边播时降到 streaming_download_limit。
+    开启 pause_on_low_buffer 时，播放缓冲不足期间后台流量暂停。
+    """
+
+    PLAYBACK = 'playback'
+    PREFETCH = 'prefetch'
+    DOWNLOAD = 'download'
+
+    BACKGROUND = (PREFETCH, DOWNLOAD)
+
+    RATE_WINDOW = 3     # 各使用者速率统计窗口（秒）
+    BURST_TIME = 0.5    # 令牌桶最多积累多少秒的流量
+
+    def __init__(self, download_limit: int = 0, streaming_download_limit: int = 0,
+                 pause_on_low_buffer: bool = False):
+        self.download_limit = download_limit                    # 后台流量上限（字节/秒），0为不限
+        self.streaming_download_limit = streaming_download_limit  # 边下边播时的后台流量上限，0为不另外限制
+        self.pause_on_low_buffer = pause_on_low_buffer
+
+        self._cond = threading.Condition()
+        self._consumers: List[Dict] = []
+        self._tokens = 0.0
+        self._last_refill = time.time()
+        self._playback_low = False
+
+    def register(self, name: str, kind: str) -> Dict:
+        """登记一个使用者，返回传给 consume() 的句柄"""
+        consumer = {'name': name, 'kind': kind, 'samples': deque(), 'total': 0}
+        with self._cond:
+            self._consumers.append(consumer)
+            self._cond.notify_all()
+        return consumer
+
+    def unregister(self, consumer: Dict):
+        """使用者结束传输"""
+        with self._cond:
+            if consumer in self._consumers:
+                self._consumers.remove(consumer)
+            self._cond.notify_all()
+
+    def set_playback_low(self, low: bool):
+        """播放器报告缓冲是否不足"""
+        with self._cond:
+            if self._playback_low != low:
+                self._playback_low = low
+                self._cond.notify_all()
+
+    def consume(self, consumer: Dict, nbytes: int, should_stop: Optional[Callable] = None):
+        """登记读取的字节数，后台流量超出配额时阻塞到配额恢复
+
+        should_stop() 返回True时立即返回（取消或关闭时不再等待）。
+        """
+        with self._cond:
+            self._record(consumer, nbytes)
+            if consumer['kind'] not in self.BACKGROUND:
+                return
+
+            self._refill()
+            self._tokens -= nbytes
+            while not (should_stop and should_stop()):
+                if self._is_paused():
+                    self._cond.wait(0.1)
+                    continue
+                rate = self._background_limit()
+                if rate <= 0:
+                    self._tokens = 0.0
+                    return
+                self._refill()
+                if self._tokens >= 0:
+                    return
+                self._cond.wait(min(-self._tokens / rate, 0.1))
+
+    def get_allocation(self) -> Dict:
+        """当前各使用者的速率和后台流量上限"""
+        now = int(time.time())
+        with self._cond:
+            consumers = []
+            for consumer in self._consumers:
+                recent = sum(nbytes for second, nbytes in consumer['samples']
+                             if second >= now - self.RATE_WINDOW)
+                consumers.append({
+                    'name': consumer['name'],
+                    'kind': consumer['kind'],
+                    'rate': recent / self.RATE_WINDOW,  # 字节/秒
+                    'total': consumer['total']
+                })
+            return {
+                'consumers': consumers,
+                'background_limit': self._background_limit(),
+                'paused': self._is_paused(),
+                'playback_low': self._playback_low
+            }
+
+    def _background_limit(self) -> float:
+        """当前后台流量的速率上限，0为不限（调用方需持有锁）"""
+        limits = [self.download_limit]
+        if any(consumer['kind'] == self.PLAYBACK for consumer in self._consumers):
+            limits.append(self.streaming_download_limit)
+        limits = [limit for limit in limits if limit > 0]
+        return min(limits) if limits else 0
+
+    def _is_paused(self) -> bool:
+        """后台流量是否因播放缓冲不足而暂停（调用方需持有锁）"""
+        return (self.pause_on_low_buffer and self._playback_low
+                and any(consumer['kind'] == self.PLAYBACK for consumer in self._consumers))
+
+    def _refill(self):
+        """按当前速率补充令牌（调用方需持有锁）"""
+        now = time.time()
+        rate = self._background_limit()
+        if rate > 0:
+            self._tokens = min(self._tokens + (now - self._last_refill) * rate, rate * self.BURST_TIME)
+        self._last_refill = now
+
+    def _record(self, consumer: Dict, nbytes: int):
+        """按秒累计使用者的字节数（调用方需持有锁）"""
+        second = int(time.time())
+        consumer['total'] += nbytes
+        samples = consumer['samples']
+        if samples and samples[-1][0] == second:
+            samples[-1][1] += nbytes
+        else:
+            samples.append([second, nbytes])
+            while samples and samples[0][0] < second - self.RATE_WINDOW:
+                samples.popleft()
@@ -0,0 +1,216 @@
+# utils/download_history.py
+import os
+import json
+import threading
+from typing import Optional, Dict, List
+
+from .persistence import atomic_write_lines
+
+class DownloadHistory:
+    """下载历史
+
+    只追加的JSON Lines文件，每完成一次下载追加一行，不再重写整个文件，
+    也不截断历史。删除记录同样以追加一行的方式写入，失效的行超过
+    有效记录数时重写文件压缩。内存中按日期、音乐源和状态建立索引，
+    按条件查询不需要遍历全部记录。
+    """
+
+    FIELDS = ('source', 'id', 'quality', 'name', 'artist', 'album', 'status',
+              'file_path', 'end_time', 'file_size')
+
+    COMPACT_MIN_LINES = 1000  # 失效的行少于这个数时不压缩
+
+    def __init__(self, history_file: str, legacy_file: Optional[str] = None):
+        self.history_file = history_file
+        self._lock = threading.Lock()
+
+        self._records: List[Optional[Dict]] = []   # 已删除的记录置为None，压缩时移除
+        self._by_date: Dict[str, List[int]] = {}   # 'YYYY-MM-DD' -> 记录下标
+        self._by_source: Dict[str, List[int]] = {}
+        self._by_status: Dict[str, List[int]] = {}
+        self._count = 0
+        self._dead_lines = 0
+
+        history_dir = os.path.dirname(history_file)
+        if history_dir and not os.path.exists(history_dir):
+            os.makedirs(history_dir, exist_ok=True)
+
+        self._load()
+        if legacy_file and os.path.exists(legacy_file):
+            self._migrate(legacy_file)
+
+    def append(self, item: Dict) -> Dict:
+        """追加一条下载记录"""
+        record = {field: item.get(field, 0 if field == 'file_size' else '') for field in self.FIELDS}
+        with self._lock:
+            self._add(record)
+            self._write({'op': 'add', 'item': record})
+        return record
+
+    def remove_path(self, file_path: str) -> int:
+        """删除指定文件的记录，返回删除的条数"""
+        with self._lock:
+            removed = 0
+            for index, record in enumerate(self._records):
+                if record is not None and record['file_path'] == file_path:
+                    self._discard(index)
+                    removed += 1
+            if removed:
+                self._dead_lines += removed + 1
+                self._write({'op': 'remove', 'file_path': file_path})
+                self._maybe_compact()
+            return removed
+
+    def clear(self):
+        """清空下载历史"""
+        with self._lock:
+            self._reset()
+            self._compact()
+
+    def query(self, date: Optional[str] = None, source: Optional[str] = None,
+              status: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """按日期（'YYYY-MM-DD'）、音乐源和状态查询，按完成时间先后排列
+
+        limit指定时只返回最近的limit条。
+        """
+        with self._lock:
+            candidates = None
+            for index, key in ((self._by_date, date), (self._by_source, source), (self._by_status, status)):
+                if key is None:
+                    continue
+                indexes = index.get(key, [])
+                candidates = indexes if candidates is None or len(indexes) < len(candidates) else candidates
+
+            if candidates is None:
+                candidates = range(len(self._records))
+
+            results = []
+            for position in reversed(candidates):
+                record = self._records[position]
+                if record is None or not self._matches(record, date, source, status):
+                    continue
+                results.append(dict(record))
+                if limit and len(results) >= limit:
+                    break
+            results.reverse()
+            return results
+
+    def get_all(self) -> List[Dict]:
+        """获取全部下载历史"""
+        return self.query()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _matches(self, record: Dict, date: Optional[str], source: Optional[str], status: Optional[str]) -> bool:
+        """记录是否满足查询条件"""
+        return ((date is None or record['end_time'][:10] == date)
+                and (source is None or record['source'] == source)
+                and (status is None or record['status'] == status))
+
+    def _add(self, record: Dict):
+        """把记录加入内存和索引（调用方需持有锁）"""
+        index = len(self._records)
+        self._records.append(record)
+        self._by_date.setdefault(str(record.get('end_time', ''))[:10], []).append(index)
+        self._by_source.setdefault(record.get('source', ''), []).append(index)
+        self._by_status.setdefault(record.get('status', ''), []).append(index)
+        self._count += 1
+
+    def _discard(self, index: int):
+        """删除内存中的一条记录，索引中的下标在查询时跳过（调用方需持有锁）"""
+        self._records[index] = None
+        self._count -= 1
+
+    def _reset(self):
+        """清空内存中的记录和索引（调用方需持有锁）"""
+        self._records = []
+        self._by_date = {}
+        self._by_source = {}
+        self._by_status = {}
+        self._count = 0
+        self._dead_lines = 0
+
+    def _load(self):
+        """回放历史文件，失效的行过多时压缩"""
+        if not os.path.exists(self.history_file):
+            return
+        lines = 0
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 崩溃时写了一半的行
+                        continue
+                    self._apply(record)
+        except Exception as e:
+            self.log(f"加载下载历史失败: {str(e)}")
+            return
+
+        self._dead_lines = lines - self._count
+        self.log(f"加载下载历史，共 {self._count} 条记录")
+        with self._lock:
+            self._maybe_compact()
+
+    def _apply(self, record: Dict):
+        """把一行记录应用到内存"""
+        op = record.get('op')
+        if op == 'add':
+            self._add(record['item'])
+        elif op == 'remove':
+            for index, item in enumerate(self._records):
+                if item is not None and item['file_path'] == record.get('file_path'):
+                    self._discard(index)
+
+    def _migrate(self, legacy_file: str):
+        """导入旧版整体保存的 download_history.json，导入后改名保留"""
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+            with self._lock:
+                # 旧版记录排在已有记录之前
+                existing = [record for record in self._records if record is not None]
+                self._reset()
+                for item in legacy:
+                    self._add({field: item.get(field, 0 if field == 'file_size' else '') for field in self.FIELDS})
+                for record in existing:
+                    self._add(record)
+                self._compact()
+            os.replace(legacy_file, legacy_file + '.bak')
+            self.log(f"已导入旧版下载历史 {len(legacy)} 条")
+        except Exception as e:
+            self.log(f"导入旧版下载历史失败: {str(e)}")
+
+    def _maybe_compact(self):
+        """失效的行超过有效记录数时压缩（调用方需持有锁）"""
+        if self._dead_lines >= self.COMPACT_MIN_LINES and self._dead_lines > self._count:
+            self._compact()
+
+    def _compact(self):
+        """重写历史文件，只保留有效记录，并重建索引（调用方需持有锁）"""
+        records = [record for record in self._records if record is not None]
+        try:
+            atomic_write_lines(self.history_file, (json.dumps({'op': 'add', 'item': record}, ensure_ascii=False)
+                                                   for record in records))
+        except Exception as e:
+            self.log(f"压缩下载历史失败: {str(e)}")
+            return
+
+        self._reset()
+        for record in records:
+            self._add(record)
+
+    def _write(self, record: Dict):
+        """追加一行（调用方需持有锁）"""
+        try:
+            with open(self.history_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except Exception as e:
+            self.log(f"写入下载历史失败: {str(e)}")
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[DownloadHistory] {message}")
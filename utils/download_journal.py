@@ -0,0 +1,101 @@
+# utils/download_journal.py
+import os
+import json
+import time
+import threading
+from typing import Dict, List
+
+from .persistence import atomic_write_lines
+
+class DownloadJournal:
+    """下载队列日志
+
+    只追加的JSON Lines文件，每行记录一个任务的加入或状态变化。
+    每条记录写入后立即刷到磁盘，程序崩溃或被关闭时最多丢失正在写的一行。
+    启动时回放日志得到未结束的任务，然后重写日志只保留这些任务。
+    """
+
+    QUEUED = 'queued'
+    DOWNLOADING = 'downloading'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    FINISHED = (COMPLETED, FAILED, CANCELLED)  # 回放时不再恢复的状态
+
+    def __init__(self, journal_file: str):
+        self.journal_file = journal_file
+        self._lock = threading.Lock()
+
+        journal_dir = os.path.dirname(journal_file)
+        if journal_dir and not os.path.exists(journal_dir):
+            os.makedirs(journal_dir, exist_ok=True)
+
+    def add(self, job: Dict):
+        """记录新加入队列的任务（job中必须有job_id）"""
+        self._append({'op': 'add', 'job': job, 'status': self.QUEUED, 'time': time.time()})
+
+    def update(self, job_id: str, status: str, **fields):
+        """记录任务的状态变化"""
+        self._append({'op': 'status', 'job_id': job_id, 'status': status, 'time': time.time(), **fields})
+
+    def replay(self) -> List[Dict]:
+        """回放日志，返回未结束的任务（按加入顺序），并压缩日志
+
+        返回的每个任务是加入时记录的job，附加最后的状态 'status'
+        和状态记录中的其他字段（如 file_path）。
+        """
+        jobs: Dict[str, Dict] = {}
+        with self._lock:
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # 崩溃时写了一半的行
+                            continue
+                        self._apply(jobs, record)
+
+            pending = [job for job in jobs.values() if job['status'] not in self.FINISHED]
+            self._compact(pending)
+        return [dict(job) for job in pending]
+
+    def _apply(self, jobs: Dict[str, Dict], record: Dict):
+        """把一条记录应用到任务表"""
+        if record.get('op') == 'add':
+            job = dict(record['job'])
+            job['status'] = record.get('status', self.QUEUED)
+            jobs[job['job_id']] = job
+        elif record.get('op') == 'status':
+            job = jobs.get(record.get('job_id'))
+            if job is not None:
+                job.update({key: value for key, value in record.items()
+                            if key not in ('op', 'job_id', 'time')})
+
+    def _compact(self, pending: List[Dict]):
+        """重写日志，只保留未结束的任务（调用方需持有锁）"""
+        now = time.time()
+        lines = [json.dumps({'op': 'add', 'job': {key: value for key, value in job.items() if key != 'status'},
+                             'status': job['status'], 'time': now}, ensure_ascii=False)
+                 for job in pending]
+        try:
+            atomic_write_lines(self.journal_file, lines)
+        except Exception as e:
+            self.log(f"压缩下载队列日志失败: {str(e)}")
+
+    def _append(self, record: Dict):
+        """追加一条记录并刷到磁盘"""
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            try:
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                self.log(f"写入下载队列日志失败: {str(e)}")
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[DownloadJournal] {message}")
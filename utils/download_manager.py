@@ -4,20 +4,93 @@ import requests
 import threading
 import time
 import json
+import shutil
+import uuid
+from collections import deque
 from datetime import datetime
 from typing import Dict, List, Callable, Optional
-from urllib.parse import quote
+from urllib.parse import quote, urlparse
+
+from .http_pool import HttpPool
+from .segmented_download import SegmentedDownloader, SegmentHTTPError
+from .download_journal import DownloadJournal
+from .download_history import DownloadHistory
+from .stream_writer import StreamWriter
+from .bandwidth import BandwidthManager
+from .persistence import atomic_write_json
+from api.track import format_artist
+
+class DownloadCancelled(Exception):
+    """下载被取消或因程序关闭而停止"""
+    pass
 
 class DownloadManager:
-    """下载管理器"""
+    """下载管理器
+    
+    下载分两个阶段：解析线程按顺序获取下载链接（受API频率限制），
+    下载线程池并发下载已解析的任务，同时限制每个主机的并发数。
+    队列的变化记录在日志中，启动时恢复上次未完成的任务。
+    """
+    
+    THROUGHPUT_WINDOW = 5       # 吞吐量统计窗口（秒）
+    PART_STATE_INTERVAL = 1.0   # 记录断点位置的间隔（秒）
+    SPEED_WINDOW = 3.0          # 下载速度统计窗口（秒）
+    
+    # 记录到队列日志中、恢复任务所需的字段
+    JOURNAL_FIELDS = ('job_id', 'id', 'name', 'artist', 'album', 'source', 'quality',
+                      'song_data', 'added_time')
+    
+    DOWNLOAD_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Referer': 'https://music.gdstudio.xyz/',
+        # 不接受压缩：content-length 和 Range 都按原始文件的字节计算
+        'Accept-Encoding': 'identity'
+    }
     
-    def __init__(self, download_path: str = "downloads/"):
+    def __init__(self, download_path: str = "downloads/", audio_cache=None,
+                 http_pool: Optional[HttpPool] = None, api=None,
+                 max_workers: int = 3, max_per_host: int = 2, max_retries: int = 3,
+                 segmented: bool = False, segment_threshold: int = 20 * 1024 * 1024,
+                 segment_count: int = 4, journal_file: Optional[str] = None,
+                 progress_interval: float = 0.1, bandwidth: Optional[BandwidthManager] = None,
+                 track_index=None):
         self.download_path = download_path
+        self.audio_cache = audio_cache  # 可选的AudioCache，命中时直接从缓存复制
+        self.http_pool = http_pool or HttpPool.shared()
+        self.api = api  # 复用同一个MusicAPI实例，未传入时首次下载时创建
         self.download_queue: List[Dict] = []
-        self.download_history: List[Dict] = []
         self.current_downloads: Dict[str, Dict] = {}
         self.is_downloading = False
         self.download_thread: Optional[threading.Thread] = None
+        self.max_workers = max_workers    # 同时下载的任务数
+        self.max_per_host = max_per_host  # 同一主机同时下载的任务数
+        self.max_retries = max_retries    # 网络中断后断点续传的最多次数
+        self.progress_interval = progress_interval  # 同一任务两次进度通知的最短间隔（秒）
+        self.bandwidth = bandwidth  # 可选的全局带宽分配，下载按后台流量限速
+        self.track_index = track_index  # 可选的LocalTrackIndex，记录已下载的文件供播放时优先使用
+        self._bandwidth_consumers: Dict[str, Dict] = {}
+        
+        # 分段下载：CDN对单个连接限速时，大的无损文件分成多段并发下载
+        self.segmented = segmented
+        self.segment_threshold = segment_threshold  # 文件大于此大小（字节）才分段
+        self.segment_count = segment_count
+        self.segment_qualities = ('740', '999')
+        
+        self._cond = threading.Condition()
+        self._ready: List[Dict] = []      # 已解析链接、等待下载的任务
+        self._active: List[Dict] = []     # 正在下载的任务
+        self._resolving: Optional[Dict] = None
+        self._host_active: Dict[str, int] = {}
+        self._reserved_paths = set()
+        self._workers: List[Dict] = []
+        self._threads_started = False
+        self._stopping = False
+        self._stop_event = threading.Event()
+        
+        self._stats_lock = threading.Lock()
+        self._throughput_samples: deque = deque()
+        self._total_bytes = 0
+        self._progress_trackers: Dict[str, Dict] = {}
         self.on_download_start: Optional[Callable] = None
         self.on_download_progress: Optional[Callable] = None
         self.on_download_complete: Optional[Callable] = None
@@ -26,17 +99,53 @@ class DownloadManager:
         # 确保下载目录存在
         if not os.path.exists(download_path):
             os.makedirs(download_path, exist_ok=True)
+        
+        # 加载下载历史（导入旧版的 download_history.json），已下载的文件加入本地索引
+        self.history = DownloadHistory(os.path.join(download_path, "download_history.jsonl"),
+                                       legacy_file=os.path.join(download_path, "download_history.json"))
+        if self.track_index:
+            self.track_index.load_history(self.history.query(status='已完成'))
+        
+        # 恢复上次未完成的任务（调用 resume_pending() 后开始下载）
+        self.journal = DownloadJournal(journal_file or os.path.join(download_path, "download_queue.jsonl"))
+        self._restore_queue()
     
     def add_to_queue(self, song_data: Dict, source: str = "netease", quality: str = "320"):
-        """添加到下载队列"""
-        download_item = {
+        """添加到下载队列
+        
+        同一首歌曲已在队列中时合并为一个任务（队列中的较低音质升级为新的音质）；
+        已下载过相同或更高音质时不再下载，状态为'已存在'。
+        """
+        download_item = self._create_item(song_data, source, quality)
+        
+        if self._use_existing_download(download_item):
+            return download_item
+        
+        with self._cond:
+            queued = self._find_queued(download_item)
+            if queued is not None:
+                return queued
+            self.journal.add({field: download_item[field] for field in self.JOURNAL_FIELDS})
+            self.download_queue.append(download_item)
+            self._cond.notify_all()
+        self.log(f"添加到下载队列: {download_item['name']}")
+        
+        # 如果下载线程还没有启动，开始下载
+        self.start_download()
+        
+        return download_item
+    
+    def _create_item(self, song_data: Dict, source: str, quality: str) -> Dict:
+        """创建下载任务"""
+        return {
+            'job_id': uuid.uuid4().hex,
             'id': str(song_data.get('id', '')),
             'name': song_data.get('name', '未知歌曲'),
             'artist': song_data.get('artist', []),
             'album': song_data.get('album', '未知专辑'),
             'source': source,
             'quality': quality,
-            'song_data': song_data,
+            'song_data': dict(song_data),  # 日志中以JSON保存
             'status': '等待中',
             'progress': 0,
             'added_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -45,208 +154,917 @@ class DownloadManager:
             'file_path': None,
             'file_size': 0
         }
+    
+    def _find_queued(self, download_item: Dict) -> Optional[Dict]:
+        """查找队列中同一首歌曲的任务，可以合并时返回该任务（调用方需持有锁）"""
+        resolving = [self._resolving] if self._resolving else []
+        for item in self._active + self._ready + resolving + self.download_queue:
+            if item.get('cancelled') or (item['source'], item['id']) != (download_item['source'], download_item['id']):
+                continue
+            
+            if self._quality_rank(item['quality']) >= self._quality_rank(download_item['quality']):
+                self.log(f"已在下载队列中: {item['name']}")
+                return item
+            if item in self.download_queue:
+                # 尚未开始解析，直接升级为更高音质
+                self.log(f"下载队列中的任务升级音质: {item['name']} ({item['quality']} -> {download_item['quality']})")
+                item['quality'] = download_item['quality']
+                self.journal.update(item['job_id'], DownloadJournal.QUEUED, quality=item['quality'])
+                return item
+        return None
+    
+    def _use_existing_download(self, download_item: Dict) -> bool:
+        """已下载过相同或更高音质时不再下载，文件不在当前下载目录时创建硬链接"""
+        if not self.track_index:
+            return False
+        found = self.track_index.find_download(download_item['source'], download_item['id'],
+                                               download_item['quality'])
+        if not found:
+            return False
         
-        self.download_queue.append(download_item)
-        self.log(f"添加到下载队列: {download_item['name']}")
+        quality, existing_path = found
+        download_item.update({'status': '已存在', 'progress': 100, 'quality': quality,
+                              'file_path': existing_path, 'file_size': os.path.getsize(existing_path)})
         
-        # 如果没有正在下载，开始下载
-        if not self.is_downloading:
-            self.start_download()
+        if os.path.abspath(os.path.dirname(existing_path)) != os.path.abspath(self.download_path):
+            with self._cond:
+                filepath = self._reserve_filepath(download_item)
+            try:
+                os.link(existing_path, filepath)
+                download_item['file_path'] = filepath
+                self.track_index.add(download_item['source'], download_item['id'], quality, filepath)
+                self.log(f"已下载过，创建硬链接: {download_item['name']} -> {filepath}")
+                return True
+            except OSError as e:
+                self.log(f"创建硬链接失败，沿用已下载的文件: {str(e)}", "WARNING")
+            finally:
+                with self._cond:
+                    self._reserved_paths.discard(filepath)
         
-        return download_item
+        self.log(f"已下载过，跳过: {download_item['name']} ({existing_path})")
+        return True
+    
+    @staticmethod
+    def _quality_rank(quality) -> int:
+        """音质的比较值，数值越大音质越高"""
+        return int(quality) if str(quality).isdigit() else 0
+    
+    def _restore_queue(self):
+        """回放队列日志，把上次未完成的任务放回队列"""
+        jobs = self.journal.replay()
+        for job in jobs:
+            download_item = self._create_item(job.get('song_data') or {}, job['source'], job['quality'])
+            download_item.update({field: job[field] for field in self.JOURNAL_FIELDS if field in job})
+            self.download_queue.append(download_item)
+        if jobs:
+            self.log(f"恢复未完成的下载任务 {len(jobs)} 个")
+    
+    def resume_pending(self) -> int:
+        """开始下载恢复的任务，返回任务数"""
+        with self._cond:
+            count = len(self.download_queue)
+        if count:
+            self.start_download()
+        return count
     
     def start_download(self):
-        """开始下载"""
-        if self.is_downloading or not self.download_queue:
-            return
+        """开始下载（启动解析线程和下载线程池）"""
+        with self._cond:
+            if self._stopping:
+                return
+            self.is_downloading = True
+            if self._threads_started:
+                self._cond.notify_all()
+                return
+            self._threads_started = True
         
-        self.is_downloading = True
-        self.download_thread = threading.Thread(target=self._download_worker, daemon=True)
+        self.download_thread = threading.Thread(target=self._resolve_worker, daemon=True,
+                                                name="DownloadResolver")
         self.download_thread.start()
+        for index in range(self.max_workers):
+            worker = {
+                'name': f"DownloadWorker-{index + 1}",
+                'started': time.time(),
+                'busy_since': None,
+                'busy_time': 0.0,
+                'completed': 0,
+                'item': None
+            }
+            self._workers.append(worker)
+            threading.Thread(target=self._download_worker, args=(worker,), daemon=True,
+                             name=worker['name']).start()
     
-    def _download_worker(self):
-        """下载工作线程"""
-        while self.download_queue and self.is_downloading:
-            download_item = self.download_queue.pop(0)
-            
-            # 更新状态为下载中
-            download_item['status'] = '下载中'
-            download_item['start_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    def _resolve_worker(self):
+        """解析线程：按顺序获取下载链接，受API频率限制"""
+        while True:
+            with self._cond:
+                # 已解析未下载的任务足够多时暂停解析，避免链接在排队时过期
+                while not (self.is_downloading and self.download_queue
+                           and len(self._ready) < self.max_workers * 2):
+                    self._cond.wait()
+                download_item = self.download_queue.pop(0)
+                self._resolving = download_item
+                download_item['status'] = '解析中'
             
-            # 生成文件名
-            safe_name = self._get_safe_filename(download_item['name'])
-            artist_name = self._format_artist(download_item['artist'])
-            if artist_name:
-                safe_name = f"{artist_name} - {safe_name}"
+            try:
+                # 优先使用本地音频缓存，不消耗API请求配额
+                if self.audio_cache and self.audio_cache.contains(
+                        download_item['source'], download_item['id'], download_item['quality']):
+                    download_item['url'] = None
+                else:
+                    download_item['url'] = self._resolve_url(download_item)
+                
+                with self._cond:
+                    self._resolving = None
+                    if download_item.get('cancelled'):
+                        continue
+                    download_item['status'] = '等待下载'
+                    self._ready.append(download_item)
+                    self._cond.notify_all()
             
-            # 添加音质后缀
-            quality_map = {
-                '128': '128kbps',
-                '192': '192kbps',
-                '320': '320kbps',
-                '740': '无损',
-                '999': 'Hi-Res'
-            }
-            quality_suffix = quality_map.get(download_item['quality'], '')
-            if quality_suffix:
-                safe_name = f"{safe_name} ({quality_suffix})"
+            except Exception as e:
+                with self._cond:
+                    self._resolving = None
+                    if self._stopping:
+                        # 关闭时的失败不记录，任务留在日志中下次继续
+                        continue
+                self._fail_download(download_item, e)
+    
+    def _download_worker(self, worker: Dict):
+        """下载线程：从已解析的任务中取出一个下载，遵守单主机并发上限"""
+        while True:
+            with self._cond:
+                download_item = None
+                while download_item is None:
+                    download_item = self._take_ready_item()
+                    if download_item is None:
+                        self._cond.wait()
+                
+                host = self._get_host(download_item.get('url'))
+                self._host_active[host] = self._host_active.get(host, 0) + 1
+                self._active.append(download_item)
+                filepath = self._reserve_filepath(download_item)
+                worker['item'] = download_item
+                worker['busy_since'] = time.time()
             
-            # 根据来源确定文件扩展名
-            source = download_item['source']
-            if source in ['kuwo', 'joox']:
-                file_ext = '.mp3'
-            elif source == 'netease':
-                # 网易云通常是m4a或mp3
-                if download_item['quality'] in ['740', '999']:
-                    file_ext = '.flac'
+            try:
+                self._process_item(download_item, filepath)
+            except DownloadCancelled:
+                self._stop_item(download_item, filepath)
+            except Exception as e:
+                if self._stopping:
+                    self._stop_item(download_item, filepath)
                 else:
-                    file_ext = '.mp3'
+                    self._fail_download(download_item, e)
+            finally:
+                with self._cond:
+                    self._host_active[host] -= 1
+                    if self._host_active[host] <= 0:
+                        del self._host_active[host]
+                    self._active.remove(download_item)
+                    self._reserved_paths.discard(filepath)
+                    worker['busy_time'] += time.time() - worker['busy_since']
+                    worker['busy_since'] = None
+                    worker['item'] = None
+                    worker['completed'] += 1
+                    self._cond.notify_all()
+                with self._stats_lock:
+                    self._progress_trackers.pop(download_item['job_id'], None)
+    
+    def _take_ready_item(self) -> Optional[Dict]:
+        """取出第一个所在主机未达到并发上限的任务（调用方需持有锁）"""
+        if not self.is_downloading:
+            return None
+        for index, item in enumerate(self._ready):
+            host = self._get_host(item.get('url'))
+            if self._host_active.get(host, 0) < self.max_per_host:
+                return self._ready.pop(index)
+        return None
+    
+    def _get_host(self, url: Optional[str]) -> str:
+        """下载链接所在主机，缓存命中的任务没有链接"""
+        return urlparse(url).netloc if url else 'cache'
+    
+    def _reserve_filepath(self, download_item: Dict) -> str:
+        """生成不重复的保存路径（调用方需持有锁）"""
+        # 生成文件名
+        safe_name = self._get_safe_filename(download_item['name'])
+        artist_name = format_artist(download_item['artist'], ' ')
+        if artist_name:
+            safe_name = f"{artist_name} - {safe_name}"
+        
+        # 添加音质后缀
+        quality_map = {
+            '128': '128kbps',
+            '192': '192kbps',
+            '320': '320kbps',
+            '740': '无损',
+            '999': 'Hi-Res'
+        }
+        quality_suffix = quality_map.get(download_item['quality'], '')
+        if quality_suffix:
+            safe_name = f"{safe_name} ({quality_suffix})"
+        
+        # 根据来源确定文件扩展名
+        source = download_item['source']
+        if source in ['kuwo', 'joox']:
+            file_ext = '.mp3'
+        elif source == 'netease':
+            # 网易云通常是m4a或mp3
+            if download_item['quality'] in ['740', '999']:
+                file_ext = '.flac'
             else:
                 file_ext = '.mp3'
-            
-            # 如果文件已存在，添加序号
-            filepath = os.path.join(self.download_path, safe_name + file_ext)
-            counter = 1
-            while os.path.exists(filepath):
-                filepath = os.path.join(self.download_path, f"{safe_name} ({counter}){file_ext}")
-                counter += 1
-            
-            download_item['file_path'] = filepath
-            
-            # 通知开始下载
-            if self.on_download_start:
-                try:
-                    self.on_download_start(download_item)
-                except:
-                    pass
+        else:
+            file_ext = '.mp3'
+        
+        # 如果文件已存在或正被其他线程使用，添加序号；同一首歌曲有未完成的下载时沿用它的路径
+        filepath = os.path.join(self.download_path, safe_name + file_ext)
+        counter = 1
+        while (os.path.exists(filepath) or filepath in self._reserved_paths
+               or (os.path.exists(filepath + '.part') and not self._is_resumable_path(filepath, download_item))):
+            filepath = os.path.join(self.download_path, f"{safe_name} ({counter}){file_ext}")
+            counter += 1
+        
+        self._reserved_paths.add(filepath)
+        return filepath
+    
+    def _resolve_url(self, download_item: Dict, force_refresh: bool = False) -> str:
+        """获取下载链接"""
+        from api.request_scheduler import RequestPriority
+        
+        url_data = self._get_api().get_play_url(
+            download_item['id'],
+            download_item['source'],
+            download_item['quality'],
+            priority=RequestPriority.DOWNLOAD,
+            force_refresh=force_refresh
+        )
+        if not url_data or not url_data.get('url'):
+            raise Exception(f"无法获取下载链接: {download_item['name']}")
+        
+        # API返回的文件大小单位为KB，用于分段判断和下载后核对
+        try:
+            download_item['expected_size'] = int(float(url_data.get('size') or 0) * 1024)
+        except (TypeError, ValueError):
+            download_item['expected_size'] = 0
+        return url_data['url']
+    
+    def _process_item(self, download_item: Dict, filepath: str):
+        """下载一个已解析的任务"""
+        # 更新状态为下载中
+        download_item['status'] = '下载中'
+        download_item['start_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        download_item['file_path'] = filepath
+        self.journal.update(download_item['job_id'], DownloadJournal.DOWNLOADING, file_path=filepath)
+        
+        # 通知开始下载
+        if self.on_download_start:
+            try:
+                self.on_download_start(download_item)
+            except:
+                pass
+        
+        # 优先使用本地音频缓存，不消耗API请求配额
+        if self._copy_from_cache(download_item, filepath):
+            return
+        
+        download_url = download_item.get('url')
+        if not download_url:
+            # 解析时缓存命中，但文件已被淘汰
+            download_url = self._resolve_url(download_item)
+            download_item['url'] = download_url
+        self.log(f"开始下载: {download_item['name']} - {download_url[:50]}...")
+        
+        if self.bandwidth:
+            self._bandwidth_consumers[download_item['job_id']] = self.bandwidth.register(
+                download_item['name'], BandwidthManager.DOWNLOAD)
+        try:
+            if self._use_segments(download_item, filepath):
+                self._transfer_segmented(download_item, filepath)
+            else:
+                self._transfer(download_item, filepath)
+        finally:
+            consumer = self._bandwidth_consumers.pop(download_item['job_id'], None)
+            if consumer:
+                self.bandwidth.unregister(consumer)
+        self._verify_size(download_item, filepath)
+        
+        # 下载完成
+        self._finish_download(download_item)
+        self.log(f"下载完成: {download_item['name']} -> {filepath}")
+    
+    def _transfer(self, download_item: Dict, filepath: str):
+        """下载到 .part 文件，网络中断后用 Range 请求从已写入的位置继续
+        
+        .part.json 中记录已写入的字节数和校验信息，程序重启后再次下载
+        同一首歌曲时也能继续。服务器不支持 Range 时从头下载。
+        """
+        part_path = filepath + '.part'
+        state = self._load_part_state(download_item, part_path)
+        if state.pop('segments', None):
+            # 分段下载的文件中间有空洞，不能按单连接的位置续传
+            state = self._reset_part_state(state, part_path)
+        offset = state['offset']
+        if offset:
+            self.log(f"继续未完成的下载: {download_item['name']} (已下载 {offset / 1024 / 1024:.1f}MB)")
+        
+        refreshed = False
+        attempts = 0
+        
+        while True:
+            headers = dict(self.DOWNLOAD_HEADERS)
+            if offset > 0:
+                headers['Range'] = f"bytes={offset}-"
+                validator = state.get('etag') or state.get('last_modified')
+                if validator:
+                    # 文件在服务器上变化时返回完整内容，而不是拼接出错误的文件
+                    headers['If-Range'] = validator
             
             try:
-                # 通过API获取下载链接
-                from api.music_api import MusicAPI
-                api = MusicAPI()
-                
-                # 获取播放/下载链接
-                url_data = api.get_play_url(
-                    download_item['id'], 
-                    download_item['source'], 
-                    download_item['quality']
-                )
-                
-                if not url_data or 'url' not in url_data:
-                    raise Exception(f"无法获取下载链接: {download_item['name']}")
-                
-                download_url = url_data['url']
-                self.log(f"开始下载: {download_item['name']} - {download_url[:50]}...")
+                response = self.http_pool.get(download_item['url'], headers=headers, stream=True, timeout=30)
+            except requests.exceptions.RequestException as e:
+                attempts = self._retry_or_raise(download_item, attempts, e)
+                continue
+            
+            with response:
+                status = response.status_code
                 
-                # 下载文件
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                    'Referer': 'https://music.gdstudio.xyz/'
-                }
+                if status in (403, 410) and not refreshed:
+                    # 链接已过期，重新获取一次
+                    refreshed = True
+                    self.log(f"下载链接已失效 (HTTP {status})，重新获取: {download_item['name']}")
+                    download_item['url'] = self._resolve_url(download_item, force_refresh=True)
+                    continue
                 
-                response = requests.get(download_url, headers=headers, stream=True, timeout=30)
+                if status == 416 and offset > 0:
+                    # 请求范围超出文件大小：已经下载完整，或者服务器上的文件变了
+                    total = self._parse_content_range(response.headers.get('content-range', ''))[1]
+                    if total and offset == total:
+                        # 记录的位置之后可能还有上次写入的多余数据
+                        os.truncate(part_path, total)
+                        download_item['file_size'] = total
+                        break
+                    self.log(f"续传位置无效，重新下载: {download_item['name']}")
+                    offset = 0
+                    state = self._reset_part_state(state, part_path)
+                    continue
                 
-                if response.status_code == 200:
-                    # 获取文件大小
+                if status == 206:
+                    start, total = self._parse_content_range(response.headers.get('content-range', ''))
+                    if start != offset:
+                        self.log(f"服务器返回的范围不匹配，重新下载: {download_item['name']}")
+                        offset = 0
+                        state = self._reset_part_state(state, part_path)
+                        continue
+                    total_size = total or offset + int(response.headers.get('content-length', 0))
+                elif status == 200:
+                    if offset > 0:
+                        self.log(f"服务器不支持断点续传，重新下载: {download_item['name']}")
+                        offset = 0
                     total_size = int(response.headers.get('content-length', 0))
-                    download_item['file_size'] = total_size
-                    
-                    # 写入文件
-                    downloaded_size = 0
-                    start_time = time.time()
-                    
-                    with open(filepath, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                                downloaded_size += len(chunk)
-                                
-                                # 计算进度
-                                if total_size > 0:
-                                    progress = (downloaded_size / total_size) * 100
-                                    download_item['progress'] = progress
-                                    
-                                    # 计算下载速度
-                                    elapsed_time = time.time() - start_time
-                                    if elapsed_time > 0:
-                                        speed = downloaded_size / elapsed_time / 1024  # KB/s
-                                        download_item['speed'] = f"{speed:.1f} KB/s"
-                                    
-                                    # 通知进度更新
-                                    if self.on_download_progress:
-                                        try:
-                                            self.on_download_progress(download_item)
-                                        except:
-                                            pass
-                    
-                    # 下载完成
-                    download_item['status'] = '已完成'
-                    download_item['progress'] = 100
-                    download_item['end_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    # 添加到历史记录
-                    self.download_history.append(download_item.copy())
-                    
-                    # 保存下载历史
-                    self._save_download_history()
-                    
-                    # 通知下载完成
-                    if self.on_download_complete:
-                        try:
-                            self.on_download_complete(download_item)
-                        except:
-                            pass
-                    
-                    self.log(f"下载完成: {download_item['name']} -> {filepath}")
-                    
+                    state['etag'] = response.headers.get('etag')
+                    state['last_modified'] = response.headers.get('last-modified')
                 else:
-                    raise Exception(f"HTTP {response.status_code}: {download_item['name']}")
+                    raise Exception(f"HTTP {status}: {download_item['name']}")
                 
-            except Exception as e:
-                # 下载失败
-                download_item['status'] = f'失败: {str(e)}'
-                download_item['end_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                if response.headers.get('content-encoding', 'identity').lower() not in ('', 'identity'):
+                    # 服务器仍然压缩了内容，content-length 是压缩后的大小，不能用来核对文件
+                    total_size = 0
                 
-                # 通知下载错误
-                if self.on_download_error:
-                    try:
-                        self.on_download_error(download_item, str(e))
-                    except:
-                        pass
+                state['total_size'] = total_size
+                state['url'] = download_item['url']
+                download_item['file_size'] = total_size
                 
-                self.log(f"下载失败: {download_item['name']} - {str(e)}", "ERROR")
+                try:
+                    with open(part_path, 'r+b' if offset and os.path.exists(part_path) else 'wb') as f:
+                        f.seek(offset)
+                        f.truncate()
+                        last_persist = time.time()
+                        writer = StreamWriter()
+                        content_length = int(response.headers.get('content-length', 0))
+                        for nbytes in writer.iter_write(response, f, content_length):
+                            offset += nbytes
+                            self._record_throughput(nbytes)
+                            self._throttle(download_item, nbytes)
+                            
+                            if self._should_stop(download_item):
+                                # 写完当前数据块后停下，记录位置以便继续
+                                f.flush()
+                                state['offset'] = offset
+                                self._save_part_state(part_path, state)
+                                raise DownloadCancelled()
+                            
+                            # 定期记录已写入的位置
+                            if time.time() - last_persist >= self.PART_STATE_INTERVAL:
+                                f.flush()
+                                state['offset'] = offset
+                                self._save_part_state(part_path, state)
+                                last_persist = time.time()
+                            
+                            self._report_progress(download_item, offset, total_size)
+                except requests.exceptions.RequestException as e:
+                    state['offset'] = offset
+                    self._save_part_state(part_path, state)
+                    attempts = self._retry_or_raise(download_item, attempts, e)
+                    continue
+            
+            state['offset'] = offset
+            self._save_part_state(part_path, state)
+            if total_size and offset < total_size:
+                # 连接提前结束，没有收到完整内容
+                attempts = self._retry_or_raise(
+                    download_item, attempts, Exception(f"连接中断 ({offset}/{total_size})"))
+                continue
+            actual_size = os.path.getsize(part_path)
+            if total_size and actual_size != total_size:
+                # 收到的内容比 content-length / content-range 声明的多，不能当作完成，从头重新下载
+                offset = 0
+                state = self._reset_part_state(state, part_path)
+                attempts = self._retry_or_raise(
+                    download_item, attempts, Exception(f"文件大小不符 ({actual_size}/{total_size})"))
+                continue
+            break
         
-        # 下载队列已空
-        self.is_downloading = False
+        os.replace(part_path, filepath)
+        self._remove_part_state(part_path)
+    
+    def _use_segments(self, download_item: Dict, filepath: str) -> bool:
+        """是否对该任务使用分段下载（只用于足够大的无损音质文件）"""
+        if not self.segmented or download_item['quality'] not in self.segment_qualities:
+            return False
+        
+        part_path = filepath + '.part'
+        state = self._load_part_state(download_item, part_path)
+        if state.get('segments'):
+            if state.get('total_size') and os.path.getsize(part_path) == state['total_size']:
+                return True  # 继续上次未完成的分段下载
+        elif state['offset'] > 0:
+            return False  # 继续上次未完成的单连接下载
+        
+        expected_size = download_item.get('expected_size') or 0
+        if expected_size and expected_size < self.segment_threshold:
+            return False
+        
+        # 确认服务器支持Range请求并取得准确的文件大小
+        try:
+            supports_range, total_size = SegmentedDownloader.probe(
+                self.http_pool, download_item['url'], self.DOWNLOAD_HEADERS)
+        except requests.exceptions.RequestException:
+            return False
+        if not supports_range or total_size < self.segment_threshold:
+            return False
+        download_item['file_size'] = total_size
+        return True
+    
+    def _transfer_segmented(self, download_item: Dict, filepath: str):
+        """分段并发下载到预分配的 .part 文件
+        
+        各段进度记录在 .part.json 的 segments 中，中断后各段从已写入的位置继续。
+        """
+        part_path = filepath + '.part'
+        state = self._load_part_state(download_item, part_path)
+        downloader = SegmentedDownloader(self.http_pool, self.DOWNLOAD_HEADERS,
+                                         self.segment_count, self.max_retries)
+        
+        segments = state.get('segments')
+        total_size = state.get('total_size') or 0
+        if segments and total_size and os.path.getsize(part_path) == total_size:
+            done = sum(segment['done'] for segment in segments)
+            self.log(f"继续未完成的分段下载: {download_item['name']} (已下载 {done / 1024 / 1024:.1f}MB)")
+        else:
+            total_size = download_item['file_size']
+            segments = downloader.split(total_size)
+        
+        state.update({'offset': 0, 'total_size': total_size, 'url': download_item['url'],
+                      'segments': segments})
+        self._save_part_state(part_path, state)
+        download_item['file_size'] = total_size
+        self.log(f"分段下载: {download_item['name']} ({total_size / 1024 / 1024:.1f}MB, {len(segments)}段)")
+        
+        lock = threading.Lock()
+        progress = {'last_persist': time.time()}
+        
+        def on_progress(nbytes: int):
+            self._record_throughput(nbytes)
+            self._throttle(download_item, nbytes)
+            with lock:
+                done = sum(segment['done'] for segment in segments)
+                if time.time() - progress['last_persist'] >= self.PART_STATE_INTERVAL:
+                    self._save_part_state(part_path, state)
+                    progress['last_persist'] = time.time()
+                self._report_progress(download_item, done, total_size)
+        
+        refreshed = False
+        attempts = 0
+        while True:
+            try:
+                downloader.download(download_item['url'], part_path, total_size, segments, on_progress,
+                                    should_stop=lambda: self._should_stop(download_item))
+                if self._should_stop(download_item):
+                    self._save_part_state(part_path, state)
+                    raise DownloadCancelled()
+                done = sum(segment['done'] for segment in segments)
+                actual_size = os.path.getsize(part_path)
+                if done != total_size or actual_size != total_size:
+                    # 有分段没有收齐，保存进度后让各段从已写入的位置继续
+                    self._save_part_state(part_path, state)
+                    attempts = self._retry_or_raise(
+                        download_item, attempts, Exception(f"文件大小不符 ({done}/{total_size})"))
+                    continue
+                break
+            except SegmentHTTPError as e:
+                self._save_part_state(part_path, state)
+                if e.status_code in (403, 410) and not refreshed:
+                    # 链接已过期，重新获取一次，各段从已写入的位置继续
+                    refreshed = True
+                    self.log(f"下载链接已失效 (HTTP {e.status_code})，重新获取: {download_item['name']}")
+                    download_item['url'] = self._resolve_url(download_item, force_refresh=True)
+                    state['url'] = download_item['url']
+                    continue
+                raise Exception(f"HTTP {e.status_code}: {download_item['name']}")
+            except DownloadCancelled:
+                raise
+            except Exception:
+                self._save_part_state(part_path, state)
+                raise
+        
+        os.replace(part_path, filepath)
+        self._remove_part_state(part_path)
+    
+    def _verify_size(self, download_item: Dict, filepath: str):
+        """与API报告的大小相差过大时给出警告
+        
+        与 content-length / content-range 的核对在传输时进行，不符时重试或续传，
+        API报告的大小只是近似值，不作为下载失败的依据。
+        """
+        actual_size = os.path.getsize(filepath)
+        
+        # API报告的大小以KB为单位，允许一定误差
+        api_size = download_item.get('expected_size') or 0
+        if api_size and abs(actual_size - api_size) > max(api_size * 0.02, 64 * 1024):
+            self.log(f"文件大小与API报告的不一致 ({actual_size}/{api_size}): "
+                     f"{download_item['name']}", "WARNING")
+    
+    def _retry_or_raise(self, download_item: Dict, attempts: int, error: Exception) -> int:
+        """网络错误时等待后重试，超过次数则抛出异常"""
+        attempts += 1
+        if attempts > self.max_retries:
+            raise error
+        delay = min(2 ** attempts, 30)
+        self.log(f"下载中断，{delay}秒后继续 ({attempts}/{self.max_retries}): "
+                 f"{download_item['name']} - {str(error)}", "WARNING")
+        self._stop_event.wait(delay)
+        if self._should_stop(download_item):
+            raise DownloadCancelled()
+        return attempts
+    
+    def _should_stop(self, download_item: Dict) -> bool:
+        """任务被取消或程序正在关闭"""
+        return self._stopping or download_item.get('cancelled', False)
+    
+    def _stop_item(self, download_item: Dict, filepath: str):
+        """下载停在安全位置后的处理：取消的任务删除未完成的文件，关闭时保留以便继续"""
+        if download_item.get('cancelled'):
+            part_path = filepath + '.part'
+            try:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+            except Exception as e:
+                self.log(f"删除未完成的文件失败: {str(e)}", "ERROR")
+            self._remove_part_state(part_path)
+            self.log(f"已取消下载: {download_item['name']}")
+        else:
+            download_item['status'] = '已暂停'
+            self.log(f"下载已暂停，下次启动时继续: {download_item['name']}")
+    
+    def _report_progress(self, download_item: Dict, offset: int, total_size: int):
+        """更新下载进度，每个任务每 progress_interval 秒最多通知一次
+        
+        速度按最近 SPEED_WINDOW 秒内的进度计算，反映当前的下载速度。
+        """
+        if total_size <= 0:
+            return
+        
+        # 计算进度
+        download_item['progress'] = (offset / total_size) * 100
+        
+        now = time.time()
+        with self._stats_lock:
+            tracker = self._progress_trackers.setdefault(
+                download_item['job_id'], {'last_notify': 0.0, 'samples': deque()})
+            if now - tracker['last_notify'] < self.progress_interval:
+                return
+            tracker['last_notify'] = now
+            
+            # 计算下载速度（滑动窗口）
+            samples = tracker['samples']
+            if samples and offset < samples[-1][1]:
+                samples.clear()  # 从头重新下载
+            samples.append((now, offset))
+            while len(samples) > 2 and samples[0][0] < now - self.SPEED_WINDOW:
+                samples.popleft()
+            elapsed_time = now - samples[0][0]
+        
+        if elapsed_time > 0:
+            speed = (offset - samples[0][1]) / elapsed_time / 1024  # KB/s
+            download_item['speed'] = f"{speed:.1f} KB/s"
+        
+        # 通知进度更新
+        if self.on_download_progress:
+            try:
+                self.on_download_progress(download_item)
+            except:
+                pass
+    
+    @staticmethod
+    def _parse_content_range(value: str):
+        """解析 Content-Range，返回 (起始位置, 总大小)，无法解析的部分为None"""
+        # 格式: bytes 100-199/1000 或 bytes */1000
+        try:
+            unit, _, spec = value.strip().partition(' ')
+            if unit.lower() != 'bytes':
+                return None, None
+            range_part, _, total_part = spec.partition('/')
+            start = None if range_part == '*' else int(range_part.split('-')[0])
+            total = None if total_part in ('', '*') else int(total_part)
+            return start, total
+        except ValueError:
+            return None, None
+    
+    def _load_part_state(self, download_item: Dict, part_path: str) -> Dict:
+        """读取未完成下载的记录，与当前任务不符或文件不完整时从头开始"""
+        state = {
+            'source': download_item['source'],
+            'id': download_item['id'],
+            'quality': download_item['quality'],
+            'offset': 0,
+            'total_size': 0,
+            'etag': None,
+            'last_modified': None
+        }
+        if self._is_resumable_path(part_path[:-len('.part')], download_item):
+            # 记录的位置之后的数据可能没有写入磁盘，以较小者为准
+            saved = self._read_part_state(part_path)
+            state.update(saved)
+            state['offset'] = min(int(saved.get('offset', 0)), os.path.getsize(part_path))
+        return state
+    
+    def _reset_part_state(self, state: Dict, part_path: str) -> Dict:
+        """丢弃已下载的部分"""
+        state.update({'offset': 0, 'total_size': 0, 'etag': None, 'last_modified': None})
+        self._save_part_state(part_path, state)
+        return state
+    
+    def _read_part_state(self, part_path: str) -> Optional[Dict]:
+        """读取 .part.json"""
+        try:
+            state_path = part_path + '.json'
+            if os.path.exists(state_path):
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            self.log(f"读取下载进度记录失败: {str(e)}", "ERROR")
+        return None
+    
+    def _save_part_state(self, part_path: str, state: Dict):
+        """保存 .part.json（先写临时文件再替换）"""
+        try:
+            atomic_write_json(part_path + '.json', state)
+        except Exception as e:
+            self.log(f"保存下载进度记录失败: {str(e)}", "ERROR")
+    
+    def _remove_part_state(self, part_path: str):
+        """下载完成后删除 .part.json"""
+        try:
+            state_path = part_path + '.json'
+            if os.path.exists(state_path):
+                os.remove(state_path)
+        except Exception:
+            pass
+    
+    def _is_resumable_path(self, filepath: str, download_item: Dict) -> bool:
+        """该路径下是否有同一首歌曲未完成的下载"""
+        part_path = filepath + '.part'
+        saved = self._read_part_state(part_path)
+        if not saved or not os.path.exists(part_path):
+            return False
+        return ((saved.get('source'), saved.get('id'), saved.get('quality'))
+                == (download_item['source'], download_item['id'], download_item['quality']))
+    
+    def _fail_download(self, download_item: Dict, error: Exception):
+        """标记下载失败并通知"""
+        download_item['status'] = f'失败: {str(error)}'
+        download_item['end_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.journal.update(download_item['job_id'], DownloadJournal.FAILED, error=str(error))
+        
+        # 通知下载错误
+        if self.on_download_error:
+            try:
+                self.on_download_error(download_item, str(error))
+            except:
+                pass
+        
+        self.log(f"下载失败: {download_item['name']} - {str(error)}", "ERROR")
+    
+    def _throttle(self, download_item: Dict, nbytes: int):
+        """登记带宽用量，超出后台流量配额时等待"""
+        consumer = self._bandwidth_consumers.get(download_item['job_id'])
+        if consumer:
+            self.bandwidth.consume(consumer, nbytes, should_stop=lambda: self._should_stop(download_item))
+    
+    def _record_throughput(self, nbytes: int):
+        """按秒累计下载字节数，用于计算吞吐量"""
+        second = int(time.time())
+        with self._stats_lock:
+            self._total_bytes += nbytes
+            if self._throughput_samples and self._throughput_samples[-1][0] == second:
+                self._throughput_samples[-1][1] += nbytes
+            else:
+                self._throughput_samples.append([second, nbytes])
+                while self._throughput_samples and self._throughput_samples[0][0] < second - self.THROUGHPUT_WINDOW:
+                    self._throughput_samples.popleft()
+    
+    def get_stats(self) -> Dict:
+        """获取下载线程池统计：吞吐量和各线程利用率"""
+        now = time.time()
+        with self._stats_lock:
+            recent = sum(nbytes for second, nbytes in self._throughput_samples
+                         if second >= int(now) - self.THROUGHPUT_WINDOW)
+            total_bytes = self._total_bytes
+        
+        with self._cond:
+            workers = []
+            for worker in self._workers:
+                busy = worker['busy_time']
+                if worker['busy_since'] is not None:
+                    busy += now - worker['busy_since']
+                lifetime = max(now - worker['started'], 1e-6)
+                workers.append({
+                    'name': worker['name'],
+                    'busy': worker['item'] is not None,
+                    'current': worker['item']['name'] if worker['item'] else None,
+                    'completed': worker['completed'],
+                    'utilisation': busy / lifetime
+                })
+            return {
+                'max_workers': self.max_workers,
+                'max_per_host': self.max_per_host,
+                'active': len(self._active),
+                'queued': len(self.download_queue),
+                'resolving': 1 if self._resolving else 0,
+                'ready': len(self._ready),
+                'throughput': recent / self.THROUGHPUT_WINDOW,  # 最近几秒的平均字节/秒
+                'total_bytes': total_bytes,
+                'utilisation': (sum(w['utilisation'] for w in workers) / len(workers)) if workers else 0.0,
+                'workers': workers,
+                'hosts': dict(self._host_active)
+            }
+    
+    def _get_api(self):
+        """获取MusicAPI实例"""
+        if self.api is None:
+            from api.music_api import MusicAPI
+            self.api = MusicAPI(http_pool=self.http_pool)
+        return self.api
+    
+    def _copy_from_cache(self, download_item: Dict, filepath: str) -> bool:
+        """从音频缓存复制文件，命中返回True"""
+        if not self.audio_cache:
+            return False
+        
+        cached_path = self.audio_cache.get(download_item['source'], download_item['id'],
+                                           download_item['quality'])
+        if not cached_path:
+            return False
+        
+        try:
+            # 同一文件系统上用硬链接，不复制数据
+            os.link(cached_path, filepath)
+        except OSError:
+            shutil.copyfile(cached_path, filepath)
+        download_item['file_size'] = os.path.getsize(filepath)
+        self._finish_download(download_item)
+        self.log(f"从缓存复制完成: {download_item['name']} -> {filepath}")
+        return True
+    
+    def _finish_download(self, download_item: Dict):
+        """标记下载完成，记录历史并通知"""
+        download_item['status'] = '已完成'
+        download_item['progress'] = 100
+        download_item['end_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.journal.update(download_item['job_id'], DownloadJournal.COMPLETED)
+        if self.track_index and download_item.get('file_path'):
+            self._replace_lower_quality(download_item)
+            self.track_index.add(download_item['source'], download_item['id'], download_item['quality'],
+                                 download_item['file_path'])
+        
+        # 追加到下载历史
+        self.history.append(download_item)
+        
+        # 通知下载完成
+        if self.on_download_complete:
+            try:
+                self.on_download_complete(download_item)
+            except:
+                pass
+    
+    def _replace_lower_quality(self, download_item: Dict):
+        """音质升级后删除同一首歌曲较低音质的文件"""
+        rank = self._quality_rank(download_item['quality'])
+        for quality, path in self.track_index.get_downloads(download_item['source'], download_item['id']).items():
+            if self._quality_rank(quality) >= rank or path == download_item['file_path']:
+                continue
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+                self.track_index.remove_path(path)
+                self.history.remove_path(path)
+                self.log(f"已用更高音质替换: {path} -> {download_item['file_path']}")
+            except Exception as e:
+                self.log(f"删除低音质文件失败: {str(e)}", "ERROR")
     
     def get_download_queue(self) -> List[Dict]:
-        """获取下载队列"""
-        return self.download_queue.copy()
+        """获取下载队列（下载中、已解析和等待中的任务）"""
+        with self._cond:
+            resolving = [self._resolving] if self._resolving else []
+            return self._active + self._ready + resolving + self.download_queue
     
     def get_download_history(self) -> List[Dict]:
         """获取下载历史"""
-        return self.download_history.copy()
+        return self.history.get_all()
+    
+    def query_download_history(self, date: Optional[str] = None, source: Optional[str] = None,
+                               status: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """按日期（'YYYY-MM-DD'）、音乐源和状态查询下载历史"""
+        return self.history.query(date=date, source=source, status=status, limit=limit)
     
     def clear_download_history(self):
         """清空下载历史"""
-        self.download_history.clear()
-        self._save_download_history()
+        self.history.clear()
     
     def remove_from_queue(self, download_id: str):
-        """从队列中移除下载任务"""
-        for i, item in enumerate(self.download_queue):
-            if item['id'] == download_id:
-                self.download_queue.pop(i)
-                self.log(f"已从队列移除: {item['name']}")
+        """取消下载任务，正在下载的任务在写完当前数据块后停止"""
+        with self._cond:
+            for item in self._active:
+                if item['id'] == download_id and not item.get('cancelled'):
+                    self._cancel_item(item)
+                    return True
+            if self._resolving and self._resolving['id'] == download_id:
+                self._cancel_item(self._resolving)
+                self.log(f"已从队列移除: {self._resolving['name']}")
                 return True
+            for queue in (self._ready, self.download_queue):
+                for i, item in enumerate(queue):
+                    if item['id'] == download_id:
+                        queue.pop(i)
+                        self._cancel_item(item)
+                        self.log(f"已从队列移除: {item['name']}")
+                        return True
         return False
     
     def cancel_all_downloads(self):
-        """取消所有下载"""
-        self.download_queue.clear()
-        self.is_downloading = False
+        """取消所有下载，包括正在下载的任务"""
+        with self._cond:
+            cancelled = self._active + self._ready + self.download_queue
+            if self._resolving:
+                cancelled.append(self._resolving)
+            for item in cancelled:
+                if not item.get('cancelled'):
+                    self._cancel_item(item)
+            self.download_queue.clear()
+            self._ready.clear()
         self.log("已取消所有下载任务")
     
+    def _cancel_item(self, download_item: Dict):
+        """标记任务已取消（调用方需持有锁）"""
+        download_item['cancelled'] = True
+        download_item['status'] = '已取消'
+        self.journal.update(download_item['job_id'], DownloadJournal.CANCELLED)
+    
+    def shutdown(self, timeout: float = 10.0) -> bool:
+        """停止下载，等待正在下载的任务写完当前数据块并记录断点
+        
+        未完成的任务保留在队列日志中，下次启动时继续。
+        超过timeout（秒）仍未停止返回False。
+        """
+        with self._cond:
+            self._stopping = True
+            self.is_downloading = False
+            self._stop_event.set()
+            self._cond.notify_all()
+            
+            deadline = time.time() + timeout
+            while self._active:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.log(f"等待下载停止超时，仍有 {len(self._active)} 个任务", "WARNING")
+                    return False
+                self._cond.wait(remaining)
+        
+        self.log("下载已停止")
+        return True
+    
     def _get_safe_filename(self, name: str) -> str:
         """获取安全的文件名"""
         # 移除非法字符
@@ -260,58 +1078,6 @@ class DownloadManager:
         
         return name.strip()
     
-    def _format_artist(self, artist_data) -> str:
-        """格式化艺术家信息"""
-        if isinstance(artist_data, list):
-            artist_names = []
-            for artist in artist_data:
-                if isinstance(artist, dict):
-                    artist_names.append(artist.get('name', ''))
-                elif isinstance(artist, str):
-                    artist_names.append(artist)
-            return ' '.join([a for a in artist_names if a])
-        elif isinstance(artist_data, str):
-            return artist_data
-        else:
-            return ''
-    
-    def _save_download_history(self):
-        """保存下载历史"""
-        try:
-            history_file = os.path.join(self.download_path, "download_history.json")
-            
-            # 只保存必要信息，避免文件过大
-            simplified_history = []
-            for item in self.download_history[-100:]:  # 只保留最近100条
-                simplified_item = {
-                    'name': item.get('name', ''),
-                    'artist': item.get('artist', ''),
-                    'album': item.get('album', ''),
-                    'status': item.get('status', ''),
-                    'file_path': item.get('file_path', ''),
-                    'end_time': item.get('end_time', ''),
-                    'file_size': item.get('file_size', 0)
-                }
-                simplified_history.append(simplified_item)
-            
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(simplified_history, f, ensure_ascii=False, indent=2)
-            
-        except Exception as e:
-            self.log(f"保存下载历史失败: {str(e)}", "ERROR")
-    
-    def _load_download_history(self):
-        """加载下载历史"""
-        try:
-            history_file = os.path.join(self.download_path, "download_history.json")
-            if os.path.exists(history_file):
-                with open(history_file, 'r', encoding='utf-8') as f:
-                    self.download_history = json.load(f)
-                self.log(f"加载下载历史，共 {len(self.download_history)} 条记录")
-        except Exception as e:
-            self.log(f"加载下载历史失败: {str(e)}", "ERROR")
-            self.download_history = []
-    
     def log(self, message: str, level: str = "INFO"):
         """记录日志"""
         print(f"[DownloadManager] [{level}] {message}")
\ No newline at end of file
@@ -3,6 +3,8 @@ import json
 import sys
 from typing import List, Dict
 
+from .persistence import atomic_write_json
+
 class FileHandler:
     """文件处理工具类"""
     
@@ -78,8 +80,7 @@ class FileHandler:
                 }
                 cleaned_favorites.append(clean_song)
             
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(cleaned_favorites, f, ensure_ascii=False, indent=2)
+            atomic_write_json(filename, cleaned_favorites, indent=2)
             print(f"[FileHandler] 收藏保存到: {filename}，共 {len(cleaned_favorites)} 首歌曲")
             return True
         except Exception as e:
@@ -155,8 +156,7 @@ class FileHandler:
         try:
             os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
             
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(playlist, f, ensure_ascii=False, indent=2)
+            atomic_write_json(filename, playlist, indent=2)
             print(f"[FileHandler] 播放列表保存到: {filename}")
             return True
         except Exception as e:
@@ -197,8 +197,7 @@ class FileHandler:
         try:
             os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
             
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
+            atomic_write_json(filename, history, indent=2)
             print(f"[FileHandler] 下载历史保存到: {filename}")
             return True
         except Exception as e:
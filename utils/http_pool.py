@@ -0,0 +1,128 @@
+# utils/http_pool.py
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from typing import Optional, Dict, List
+
+class HttpPool:
+    """共享HTTP连接池
+
+    API请求、播放缓冲和下载共用一个 requests.Session，连接保持 keep-alive，
+    同一主机的后续请求复用已建立的 TCP/TLS 连接。可以按主机单独设置连接池大小。
+    """
+
+    DEFAULT_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Referer': 'https://music.gdstudio.xyz/'
+    }
+
+    _shared: Optional["HttpPool"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10,
+                 host_pool_sizes: Optional[Dict[str, int]] = None):
+        self.pool_connections = pool_connections  # 缓存多少个主机的连接池
+        self.pool_maxsize = pool_maxsize          # 每个主机最多保留多少个空闲连接
+
+        self.session = requests.Session()
+        self.session.headers.update(self.DEFAULT_HEADERS)
+        self.session.headers['Connection'] = 'keep-alive'
+
+        default_adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', default_adapter)
+        self.session.mount('https://', default_adapter)
+
+        self._lock = threading.Lock()
+        self._request_count = 0
+        self._adapters: List[HTTPAdapter] = [default_adapter]
+
+        for host, size in (host_pool_sizes or {}).items():
+            self.mount_host(host, size)
+
+    @classmethod
+    def shared(cls) -> "HttpPool":
+        """获取进程内共享的连接池（未显式注入连接池时使用）"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def mount_host(self, host: str, pool_size: int):
+        """为指定主机设置独立的连接池大小"""
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount(f"https://{host}", adapter)
+        self.session.mount(f"http://{host}", adapter)
+        with self._lock:
+            self._adapters.append(adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """发送GET请求"""
+        with self._lock:
+            self._request_count += 1
+        return self.session.get(url, **kwargs)
+
+    def preconnect(self, urls: List[str], background: bool = True):
+        """预先建立到指定主机的连接，之后的第一个请求无需再握手"""
+        def connect_all():
+            for url in urls:
+                parsed = urlparse(url)
+                if not parsed.scheme or not parsed.netloc:
+                    continue
+                origin = f"{parsed.scheme}://{parsed.netloc}/"
+                try:
+                    response = self.session.head(origin, timeout=5, allow_redirects=False)
+                    response.close()
+                    self.log(f"预连接完成: {parsed.netloc}")
+                except requests.exceptions.RequestException as e:
+                    self.log(f"预连接失败: {parsed.netloc} - {str(e)}")
+
+        if background:
+            threading.Thread(target=connect_all, daemon=True, name="HttpPreconnect").start()
+        else:
+            connect_all()
+
+    def get_stats(self) -> Dict:
+        """获取连接复用统计
+
+        connections 为实际新建的连接数，requests 为经由连接池发出的请求数，
+        两者之差即为复用已有连接的次数。
+        """
+        per_host = {}
+        total_connections = 0
+        total_requests = 0
+
+        with self._lock:
+            adapters = list(self._adapters)
+            request_count = self._request_count
+
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                connections = getattr(pool, 'num_connections', 0)
+                requests_sent = getattr(pool, 'num_requests', 0)
+                host_stats = per_host.setdefault(pool.host, {'connections': 0, 'requests': 0})
+                host_stats['connections'] += connections
+                host_stats['requests'] += requests_sent
+                total_connections += connections
+                total_requests += requests_sent
+
+        reused = max(0, total_requests - total_connections)
+        return {
+            'requests': request_count,
+            'connections': total_connections,
+            'reused': reused,
+            'reuse_rate': reused / total_requests if total_requests else 0.0,
+            'per_host': per_host
+        }
+
+    def close(self):
+        """关闭所有连接"""
+        self.session.close()
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[HttpPool] {message}")
@@ -0,0 +1,314 @@
+# utils/library_store.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Optional, Callable, Dict, List, Iterable
+
+from api.track import Track
+
+class LibraryStore:
+    """音乐库数据库
+
+    收藏、播放列表、播放历史和下载记录保存在一个SQLite数据库中（WAL模式），
+    增删歌曲只写入对应的行，不再重写整个JSON文件。每张表在 (音乐源, 歌曲ID)
+    上有索引，按歌曲查找不需要遍历全部记录。首次打开时导入旧版的
+    favorites.json 和 playlist.json。
+
+    界面线程中的修改用 submit() 交给后台写入线程按提交顺序执行，
+    不在Tk主线程中等待数据库提交；关闭前调用 flush() 等待写完。
+    """
+
+    DEFAULT_PLAYLIST = 'default'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS favorites (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            song_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            added_at REAL NOT NULL,
+            UNIQUE (source, song_id)
+        );
+        CREATE TABLE IF NOT EXISTS playlist_songs (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            playlist TEXT NOT NULL,
+            source TEXT NOT NULL,
+            song_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            added_at REAL NOT NULL,
+            UNIQUE (playlist, source, song_id)
+        );
+        CREATE TABLE IF NOT EXISTS play_history (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            song_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            played_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_play_history_song ON play_history (source, song_id);
+        CREATE INDEX IF NOT EXISTS idx_play_history_time ON play_history (played_at);
+        CREATE TABLE IF NOT EXISTS downloads (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            song_id TEXT NOT NULL,
+            quality TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_size INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL,
+            finished_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_downloads_song ON downloads (source, song_id);
+        CREATE INDEX IF NOT EXISTS idx_downloads_time ON downloads (finished_at);
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        # 播放和下载线程也会写入，所有访问通过 _lock 串行
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+        # 后台写入线程：按提交顺序执行 submit() 提交的写操作
+        self._write_cond = threading.Condition()
+        self._pending_writes: List = []
+        self._writing = False
+        self._closing = False
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="LibraryWriter")
+        self._writer.start()
+
+    # ========== 收藏 ==========
+
+    def get_favorites(self) -> List[Track]:
+        """按收藏顺序返回所有收藏"""
+        return self._load_songs("SELECT data FROM favorites ORDER BY seq")
+
+    def add_favorite(self, song: Dict) -> bool:
+        """添加收藏，已收藏时返回False"""
+        return bool(self.add_favorites([song]))
+
+    def add_favorites(self, songs: Iterable[Dict]) -> List[Dict]:
+        """在一个事务中添加多首收藏，返回实际添加的歌曲（已收藏的跳过）"""
+        now = time.time()
+        return self._insert_songs(
+            "INSERT OR IGNORE INTO favorites (source, song_id, data, added_at) VALUES (?, ?, ?, ?)",
+            songs, lambda song: (self._source(song), str(song.get('id', '')), self._dump(song), now))
+
+    def remove_favorites(self, songs: Iterable[Dict]) -> int:
+        """移除收藏，返回实际移除的数量"""
+        return self._executemany("DELETE FROM favorites WHERE source = ? AND song_id = ?",
+                                 [self._key(song) for song in songs])
+
+    def is_favorite(self, source: str, song_id) -> bool:
+        """是否已收藏"""
+        return self._exists("SELECT 1 FROM favorites WHERE source = ? AND song_id = ?", (source, str(song_id)))
+
+    def clear_favorites(self):
+        """清空收藏"""
+        self._execute("DELETE FROM favorites")
+
+    # ========== 播放列表 ==========
+
+    def get_playlist(self, playlist: str = DEFAULT_PLAYLIST) -> List[Track]:
+        """按加入顺序返回播放列表中的歌曲"""
+        return self._load_songs("SELECT data FROM playlist_songs WHERE playlist = ? ORDER BY seq", (playlist,))
+
+    def add_playlist_songs(self, songs: Iterable[Dict], playlist: str = DEFAULT_PLAYLIST) -> List[Dict]:
+        """在一个事务中把歌曲加入播放列表末尾，返回实际加入的歌曲（已在列表中的跳过）"""
+        now = time.time()
+        return self._insert_songs(
+            "INSERT OR IGNORE INTO playlist_songs (playlist, source, song_id, data, added_at) VALUES (?, ?, ?, ?, ?)",
+            songs, lambda song: (playlist, self._source(song), str(song.get('id', '')), self._dump(song), now))
+
+    def remove_playlist_songs(self, songs: Iterable[Dict], playlist: str = DEFAULT_PLAYLIST) -> int:
+        """从播放列表移除歌曲，返回实际移除的数量"""
+        return self._executemany("DELETE FROM playlist_songs WHERE playlist = ? AND source = ? AND song_id = ?",
+                                 [(playlist,) + self._key(song) for song in songs])
+
+    def replace_playlist(self, songs: Iterable[Dict], playlist: str = DEFAULT_PLAYLIST):
+        """用新的歌曲替换整个播放列表"""
+        now = time.time()
+        rows = [(playlist, self._source(song), str(song.get('id', '')), self._dump(song), now) for song in songs]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM playlist_songs WHERE playlist = ?", (playlist,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO playlist_songs (playlist, source, song_id, data, added_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def clear_playlist(self, playlist: str = DEFAULT_PLAYLIST):
+        """清空播放列表"""
+        self._execute("DELETE FROM playlist_songs WHERE playlist = ?", (playlist,))
+
+    # ========== 播放历史 ==========
+
+    def add_play_history(self, song: Dict):
+        """记录一次播放"""
+        source, song_id = self._key(song)
+        self._execute("INSERT INTO play_history (source, song_id, data, played_at) VALUES (?, ?, ?, ?)",
+                      (source, song_id, self._dump(song), time.time()))
+
+    def get_play_history(self, limit: int = 100) -> List[Dict]:
+        """最近播放的歌曲，最近的在前，每条附加播放时间 'played_at'"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data, played_at FROM play_history ORDER BY seq DESC LIMIT ?", (limit,)).fetchall()
+        return [{**json.loads(data), 'played_at': played_at} for data, played_at in rows]
+
+    def get_play_count(self, source: str, song_id) -> int:
+        """歌曲的播放次数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM play_history WHERE source = ? AND song_id = ?",
+                                      (source, str(song_id))).fetchone()[0]
+
+    # ========== 下载记录 ==========
+
+    def add_download(self, download_item: Dict):
+        """记录一次完成的下载"""
+        self._execute(
+            "INSERT INTO downloads (source, song_id, quality, file_path, file_size, data, finished_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self._source(download_item), str(download_item.get('id', '')), str(download_item.get('quality', '')),
+             download_item.get('file_path', ''), download_item.get('file_size', 0) or 0,
+             self._dump(download_item.get('song_data') or download_item), time.time()))
+
+    def get_downloads(self, source: str, song_id) -> List[Dict]:
+        """某首歌曲的下载记录"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT quality, file_path, file_size, finished_at FROM downloads "
+                "WHERE source = ? AND song_id = ? ORDER BY seq", (source, str(song_id))).fetchall()
+        return [{'quality': quality, 'file_path': file_path, 'file_size': file_size, 'finished_at': finished_at}
+                for quality, file_path, file_size, finished_at in rows]
+
+    # ========== 迁移 ==========
+
+    def migrate_json(self, favorites_file: str, playlist_file: str):
+        """首次打开时导入旧版的 favorites.json 和 playlist.json（JSON文件保留不删除）"""
+        if self._get_meta('json_migrated'):
+            return
+
+        for name, filename, add in (("收藏", favorites_file, self.add_favorites),
+                                    ("播放列表", playlist_file, self.add_playlist_songs)):
+            if not os.path.exists(filename):
+                continue
+            try:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    songs = json.load(f)
+                added = add(songs)
+                self.log(f"已导入{name} {len(added)} 首歌曲: {filename}")
+            except Exception as e:
+                self.log(f"导入{name}失败: {str(e)}")
+
+        self._set_meta('json_migrated', '1')
+
+    # ========== 后台写入 ==========
+
+    def submit(self, func: Callable, *args):
+        """把写操作（如 add_favorites）交给后台写入线程执行，立即返回"""
+        with self._write_cond:
+            if self._closing:
+                self.log("数据库已关闭，忽略写入")
+                return
+            self._pending_writes.append((func, args))
+            self._write_cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的写操作全部完成，超时返回False"""
+        with self._write_cond:
+            return self._write_cond.wait_for(lambda: not self._pending_writes and not self._writing, timeout)
+
+    def close(self):
+        """写完已提交的修改后关闭数据库"""
+        with self._write_cond:
+            self._closing = True
+            self._write_cond.notify_all()
+        self._writer.join(timeout=10.0)
+        with self._lock:
+            self._conn.close()
+
+    def _write_loop(self):
+        """后台写入线程：每次取出所有待执行的写操作，按顺序执行"""
+        while True:
+            with self._write_cond:
+                self._write_cond.wait_for(lambda: self._pending_writes or self._closing)
+                if not self._pending_writes:
+                    return
+                batch, self._pending_writes = self._pending_writes, []
+                self._writing = True
+            for func, args in batch:
+                try:
+                    func(*args)
+                except Exception as e:
+                    self.log(f"写入数据库失败: {str(e)}")
+            with self._write_cond:
+                self._writing = False
+                self._write_cond.notify_all()
+
+    # ========== 内部方法 ==========
+
+    def _source(self, song: Dict) -> str:
+        return song.get('source') or 'netease'
+
+    def _key(self, song: Dict):
+        return self._source(song), str(song.get('id', ''))
+
+    def _dump(self, song: Dict) -> str:
+        if isinstance(song, Track):
+            song = song.to_dict()
+        return json.dumps(song, ensure_ascii=False)
+
+    def _load_songs(self, sql: str, params=()) -> List[Track]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [Track.from_dict(json.loads(data)) for (data,) in rows]
+
+    def _exists(self, sql: str, params) -> bool:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone() is not None
+
+    def _execute(self, sql: str, params=()):
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def _insert_songs(self, sql: str, songs: Iterable[Dict], make_row: Callable) -> List[Dict]:
+        """在一个事务中逐首插入，返回实际插入的歌曲"""
+        added = []
+        with self._lock, self._conn:
+            for song in songs:
+                if self._conn.execute(sql, make_row(song)).rowcount:
+                    added.append(song)
+        return added
+
+    def _executemany(self, sql: str, rows: List) -> int:
+        """在一个事务中执行，返回受影响的行数"""
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(sql, rows)
+            return self._conn.total_changes - before
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self._execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[LibraryStore] {message}")
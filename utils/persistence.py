@@ -0,0 +1,138 @@
+# utils/persistence.py
+import os
+import json
+import time
+import threading
+from typing import Optional, Callable, Dict, Any, Iterable
+
+def atomic_write_json(filename: str, data: Any, indent: Optional[int] = None):
+    """先写临时文件并刷到磁盘，再替换目标文件，中途崩溃不会留下写了一半的文件"""
+    _atomic_write(filename, lambda f: json.dump(data, f, ensure_ascii=False, indent=indent))
+
+def atomic_write_lines(filename: str, lines: Iterable[str]):
+    """按行整体重写文件（如压缩JSONL日志），每行末尾添加换行，写入方式同 atomic_write_json"""
+    _atomic_write(filename, lambda f: f.writelines(line + '\n' for line in lines))
+
+def _atomic_write(filename: str, write: Callable):
+    """调用 write(f) 写入临时文件，刷到磁盘后替换目标文件；失败时删除临时文件"""
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    tmp_path = filename + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class PersistenceScheduler:
+    """延迟合并的后台保存
+
+    各存储用 register() 登记保存函数，数据变化时调用 mark_dirty()，
+    不在调用线程（如Tk主线程）中写文件。后台线程在最后一次变化后安静
+    quiet_period 秒，或距第一次未保存的变化已过 max_delay 秒时调用保存函数，
+    连续的多次修改只写一次。关闭时调用 shutdown() 立即保存所有未保存的数据。
+    """
+
+    def __init__(self, quiet_period: float = 1.0, max_delay: float = 5.0):
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+
+        self._cond = threading.Condition()
+        self._savers: Dict[str, Callable] = {}
+        self._dirty: Dict[str, Dict[str, float]] = {}  # 名称 -> {'first': 第一次变化, 'last': 最后一次变化}
+        self._saving = threading.Lock()  # 保证同一时间只有一个线程在写
+        self._stopping = False
+
+        self.stats = {
+            'marks': 0,
+            'saves': 0,
+            'errors': 0
+        }
+
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Persistence")
+        self._thread.start()
+
+    def register(self, name: str, save_func: Callable):
+        """登记一个存储的保存函数"""
+        with self._cond:
+            self._savers[name] = save_func
+
+    def mark_dirty(self, name: str):
+        """标记存储有未保存的变化"""
+        now = time.time()
+        with self._cond:
+            self.stats['marks'] += 1
+            state = self._dirty.get(name)
+            if state is None:
+                self._dirty[name] = {'first': now, 'last': now}
+            else:
+                state['last'] = now
+            self._cond.notify_all()
+
+    def flush(self, name: Optional[str] = None):
+        """立即保存指定存储（未指定时保存全部）的未保存变化"""
+        with self._cond:
+            names = [name] if name else list(self._dirty)
+            due = [n for n in names if self._dirty.pop(n, None) is not None]
+        self._save(due)
+
+    def shutdown(self):
+        """停止后台线程并保存所有未保存的变化"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5.0)
+        self.flush()
+
+    def get_stats(self) -> Dict:
+        """获取保存统计"""
+        with self._cond:
+            return {**self.stats, 'dirty': len(self._dirty)}
+
+    def _run(self):
+        """后台线程：等待到期的存储并保存"""
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = time.time()
+                    due = [name for name, state in self._dirty.items() if now >= self._due_time(state)]
+                    if due:
+                        for name in due:
+                            del self._dirty[name]
+                        break
+                    if self._dirty:
+                        wait = min(self._due_time(state) for state in self._dirty.values()) - now
+                        self._cond.wait(max(wait, 0.01))
+                    else:
+                        self._cond.wait()
+                if self._stopping:
+                    return
+            self._save(due)
+
+    def _due_time(self, state: Dict[str, float]) -> float:
+        """安静期结束或达到最长延迟的时间"""
+        return min(state['last'] + self.quiet_period, state['first'] + self.max_delay)
+
+    def _save(self, names):
+        """调用保存函数"""
+        with self._saving:
+            for name in names:
+                save_func = self._savers.get(name)
+                if not save_func:
+                    continue
+                try:
+                    save_func()
+                    self.stats['saves'] += 1
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    self.log(f"保存 {name} 失败: {str(e)}")
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[PersistenceScheduler] {message}")
@@ -2,6 +2,8 @@ import json
 import os
 from typing import List, Dict, Any
 
+from .persistence import atomic_write_json
+
 class PlaylistHandler:
     """播放列表文件处理工具类"""
     
@@ -41,8 +43,7 @@ class PlaylistHandler:
                 }
                 cleaned_playlist.append(clean_song)
             
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(cleaned_playlist, f, ensure_ascii=False, indent=2)
+            atomic_write_json(filename, cleaned_playlist, indent=2)
             print(f"[PlaylistHandler] 播放列表保存到: {filename}，共 {len(cleaned_playlist)} 首歌曲")
             return True
         except Exception as e:
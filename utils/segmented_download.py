@@ -0,0 +1,217 @@
+# utils/segmented_download.py
+import os
+import time
+import threading
+import requests
+from typing import Optional, Callable, Dict, List, Tuple
+
+from .stream_writer import StreamWriter
+
+class SegmentHTTPError(Exception):
+    """分段请求返回了非206的状态码"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class SegmentedDownloader:
+    """分段并发下载
+
+    把文件按字节范围分成若干段，每段用一个连接并发下载，写入预先分配好
+    大小的文件中。CDN对单个连接限速时可以明显加快无损大文件的下载。
+    各段的进度保存在 segments 列表中，中断后可以继续。
+    """
+
+    def __init__(self, http_pool, headers: Optional[Dict] = None, segment_count: int = 4,
+                 max_retries: int = 3, chunk_size: int = 64 * 1024):
+        self.http_pool = http_pool
+        self.headers = headers or {}
+        self.segment_count = segment_count
+        self.max_retries = max_retries
+        self.chunk_size = chunk_size
+
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def probe(http_pool, url: str, headers: Optional[Dict] = None) -> Tuple[bool, int]:
+        """探测服务器是否支持Range请求，返回 (是否支持, 文件总大小)"""
+        probe_headers = dict(headers or {})
+        probe_headers['Range'] = 'bytes=0-0'
+        response = http_pool.get(url, headers=probe_headers, stream=True, timeout=15)
+        with response:
+            if response.status_code != 206:
+                return False, int(response.headers.get('content-length', 0) or 0)
+            content_range = response.headers.get('content-range', '')
+            total = content_range.rpartition('/')[2]
+            return True, int(total) if total.isdigit() else 0
+
+    def split(self, total_size: int) -> List[Dict]:
+        """把文件分成 segment_count 段（end为闭区间）"""
+        count = max(1, min(self.segment_count, total_size))
+        size = total_size // count
+        segments = []
+        for index in range(count):
+            start = index * size
+            end = total_size - 1 if index == count - 1 else start + size - 1
+            segments.append({'start': start, 'end': end, 'done': 0})
+        return segments
+
+    def download(self, url: str, part_path: str, total_size: int,
+                 segments: Optional[List[Dict]] = None,
+                 on_progress: Optional[Callable] = None,
+                 should_stop: Optional[Callable] = None) -> List[Dict]:
+        """并发下载所有分段到part_path
+
+        on_progress(nbytes) 在每写入一块数据后调用；should_stop() 返回True时
+        各段尽快停止。任一分段失败时抛出异常，已完成的进度保留在segments中。
+        """
+        if segments is None:
+            segments = self.split(total_size)
+
+        # 预分配文件，各段直接写到各自的位置
+        with open(part_path, 'r+b' if os.path.exists(part_path) else 'wb') as f:
+            f.truncate(total_size)
+
+        errors = []
+        threads = []
+        for segment in segments:
+            if segment['done'] >= segment['end'] - segment['start'] + 1:
+                continue
+            thread = threading.Thread(
+                target=self._run_segment,
+                args=(url, part_path, segment, on_progress, should_stop, errors),
+                daemon=True,
+                name="DownloadSegment"
+            )
+            threads.append(thread)
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        return segments
+
+    def _run_segment(self, url: str, part_path: str, segment: Dict,
+                     on_progress: Optional[Callable], should_stop: Optional[Callable], errors: List):
+        """下载线程入口，记录异常"""
+        try:
+            self._fetch_segment(url, part_path, segment, on_progress, should_stop, errors)
+        except Exception as e:
+            with self._lock:
+                errors.append(e)
+
+    def _fetch_segment(self, url: str, part_path: str, segment: Dict,
+                       on_progress: Optional[Callable], should_stop: Optional[Callable], errors: List):
+        """下载一个分段，网络中断后从该段已写入的位置继续"""
+        length = segment['end'] - segment['start'] + 1
+        attempts = 0
+
+        while segment['done'] < length:
+            if errors or (should_stop and should_stop()):
+                return
+
+            start = segment['start'] + segment['done']
+            headers = dict(self.headers)
+            headers['Range'] = f"bytes={start}-{segment['end']}"
+
+            try:
+                response = self.http_pool.get(url, headers=headers, stream=True, timeout=30)
+                with response:
+                    if response.status_code != 206:
+                        raise SegmentHTTPError(response.status_code)
+                    content_range = response.headers.get('content-range', '')
+                    if not content_range.startswith(f"bytes {start}-"):
+                        raise Exception(f"分段范围不匹配: {content_range}")
+
+                    # 不使用缓冲，记录的进度不会超过实际写入文件的数据
+                    with open(part_path, 'r+b', buffering=0) as f:
+                        f.seek(start)
+                        writer = StreamWriter(min_chunk=self.chunk_size)
+                        for nbytes in writer.iter_write(response, f, length - segment['done'],
+                                                        preallocate=False):
+                            segment['done'] += nbytes
+                            if on_progress:
+                                on_progress(nbytes)
+                            if errors or (should_stop and should_stop()):
+                                break
+            except requests.exceptions.RequestException as e:
+                attempts += 1
+                if attempts > self.max_retries:
+                    raise
+                time.sleep(min(2 ** attempts, 30))
+
+
+def benchmark(total_mb: int = 8, per_connection_kbps: int = 2048, segment_count: int = 4):
+    """对比单连接和分段下载的耗时
+
+    在本机启动一个对每个连接限速的HTTP服务器（模拟CDN单连接限速），
+    分别用单连接和分段方式下载同一个文件。
+    """
+    import http.server
+    import tempfile
+    from .http_pool import HttpPool
+
+    data = os.urandom(total_mb * 1024 * 1024)
+    rate = per_connection_kbps * 1024
+
+    class ThrottledHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            start, end = 0, len(data) - 1
+            range_header = self.headers.get('Range')
+            if range_header:
+                first, _, last = range_header[len('bytes='):].partition('-')
+                start, end = int(first), int(last) if last else len(data) - 1
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+
+            step = rate // 20
+            for offset in range(start, end + 1, step):
+                self.wfile.write(data[offset:min(offset + step, end + 1)])
+                time.sleep(0.05)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ThrottledHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/track.flac"
+    pool = HttpPool()
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            single_path = os.path.join(temp_dir, "single.part")
+            started = time.time()
+            response = pool.get(url, stream=True, timeout=30)
+            with response, open(single_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+            single_time = time.time() - started
+
+            segmented_path = os.path.join(temp_dir, "segmented.part")
+            started = time.time()
+            SegmentedDownloader(pool, segment_count=segment_count).download(url, segmented_path, len(data))
+            segmented_time = time.time() - started
+
+            for path in (single_path, segmented_path):
+                with open(path, 'rb') as f:
+                    assert f.read() == data, f"文件内容不一致: {path}"
+    finally:
+        server.shutdown()
+        pool.close()
+
+    print(f"文件大小: {total_mb}MB, 单连接限速: {per_connection_kbps}KB/s")
+    print(f"单连接: {single_time:.2f}秒 ({total_mb / single_time:.2f}MB/s)")
+    print(f"分段({segment_count}): {segmented_time:.2f}秒 ({total_mb / segmented_time:.2f}MB/s), "
+          f"加速 {single_time / segmented_time:.1f}倍")
+
+
+if __name__ == "__main__":
+    benchmark()
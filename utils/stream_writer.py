@@ -0,0 +1,231 @@
+# utils/stream_writer.py
+import time
+import http.client
+import requests
+import urllib3
+from typing import Iterator, BinaryIO
+
+class StreamWriter:
+    """把HTTP响应流写入文件
+
+    未压缩的内容用一块预先分配、反复使用的缓冲区通过 readinto 读取，再用
+    memoryview 切片写入文件，不为每块数据创建新的 bytes 对象（压缩的内容
+    仍需由urllib3解压后复制到缓冲区）。每次读取的大小按读取耗时
+    自适应调整：读得快就加大，读得慢就减小，让每块数据的间隔大致保持在
+    target_interval 左右，兼顾吞吐和进度更新的及时性。
+    """
+
+    def __init__(self, min_chunk: int = 16 * 1024, max_chunk: int = 1024 * 1024,
+                 target_interval: float = 0.1, hasher=None):
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.target_interval = target_interval  # 期望的单次读取耗时（秒）
+        # 可选的哈希对象（如 hashlib.sha256()），写入的数据同时计算哈希
+        self.hasher = hasher
+
+        self._buffer = memoryview(bytearray(max_chunk))
+
+    def iter_write(self, response: requests.Response, f: BinaryIO, size: int = 0,
+                   preallocate: bool = True) -> Iterator[int]:
+        """把响应内容写入f的当前位置，每写入一块数据产出写入的字节数
+
+        size为本次响应的内容长度（未知时为0），已知时最多写入size字节，
+        提前结束时抛出 requests.exceptions.ConnectionError。
+        preallocate为True且size已知时预先把文件扩展到最终大小；
+        没有写完（出错或调用方提前停止）时文件截断到已写入的位置。
+        """
+        start = f.tell()
+        written = 0
+        chunk_size = self.min_chunk
+        read = self._get_reader(response)
+        if response.headers.get('content-encoding', 'identity').lower() != 'identity':
+            size = 0  # content-length 是压缩后的长度
+
+        preallocated = preallocate and size > 0
+        if preallocated:
+            f.truncate(start + size)
+
+        try:
+            while not size or written < size:
+                want = chunk_size if not size else min(chunk_size, size - written)
+                started = time.perf_counter()
+                n = read(self._buffer[:want])
+                if not n:
+                    break
+
+                data = self._buffer[:n]
+                if self.hasher is not None:
+                    self.hasher.update(data)
+                while data:
+                    # 无缓冲的文件可能只写入一部分
+                    data = data[f.write(data):]
+                written += n
+
+                # 根据读取耗时调整下一次读取的大小
+                elapsed = time.perf_counter() - started
+                if elapsed < self.target_interval / 2 and n == want:
+                    chunk_size = min(chunk_size * 2, self.max_chunk)
+                elif elapsed > self.target_interval:
+                    chunk_size = max(chunk_size // 2, self.min_chunk)
+
+                yield n
+
+            if size and written < size:
+                raise requests.exceptions.ConnectionError(f"连接提前关闭 ({written}/{size})")
+        finally:
+            if preallocated and written < size and not f.closed:
+                f.truncate(start + written)
+
+    def _get_reader(self, response: requests.Response):
+        """返回把响应内容读入缓冲区的函数 read(buffer) -> 读取的字节数
+
+        未压缩时直接用底层 http.client 响应的 readinto 读入缓冲区：urllib3 的
+        readinto 内部先 read() 出一个新的 bytes 再复制，达不到零拷贝。
+        绕过urllib3后连接不会自动归还，所以读完响应后手动 release_conn()，
+        保持keep-alive复用；没有读完时由 response.close() 关闭连接。
+        """
+        raw = response.raw
+        encoding = response.headers.get('content-encoding', 'identity').lower()
+        fp = getattr(raw, '_fp', None)
+
+        if encoding == 'identity' and hasattr(fp, 'readinto'):
+            def read(buffer: memoryview) -> int:
+                if fp.isclosed():
+                    return 0
+                try:
+                    n = fp.readinto(buffer)
+                except (http.client.HTTPException, OSError) as e:
+                    raise requests.exceptions.ConnectionError(e)
+                if fp.isclosed():
+                    # http.client 读到响应末尾时关闭fp，此时连接可以复用
+                    raw.release_conn()
+                return n
+            return read
+
+        if encoding == 'identity':
+            def read_raw(buffer: memoryview) -> int:
+                try:
+                    return raw.readinto(buffer)
+                except (urllib3.exceptions.HTTPError, OSError) as e:
+                    raise requests.exceptions.ConnectionError(e)
+            return read_raw
+
+        # 压缩的内容由urllib3解压后复制到缓冲区
+        def read_decoded(buffer: memoryview) -> int:
+            try:
+                data = raw.read(len(buffer), decode_content=True)
+            except (urllib3.exceptions.HTTPError, OSError) as e:
+                raise requests.exceptions.ConnectionError(e)
+            buffer[:len(data)] = data
+            return len(data)
+        return read_decoded
+
+
+def benchmark(total_mb: int = 128, rounds: int = 3):
+    """对比 iter_content(8192) 和 StreamWriter 每MB消耗的CPU时间
+
+    在子进程中启动本地HTTP服务器（避免服务器线程的CPU时间计入），
+    分别用两种方式下载同一个文件，统计本进程的CPU时间。
+    每种方式使用单独的连接池，并检查多次下载只建立了一个TCP连接（keep-alive复用）。
+    """
+    import os
+    import sys
+    import socket
+    import subprocess
+    import tempfile
+    from .http_pool import HttpPool
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with open(os.path.join(temp_dir, "track.flac"), 'wb') as f:
+            for _ in range(total_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        # http.server 默认使用HTTP/1.0，每个请求后关闭连接，这里改用HTTP/1.1，
+        # 并把服务器接受的TCP连接数写入文件，用来检查keep-alive复用
+        server_script = (
+            "import sys, functools, threading, http.server as s\n"
+            "count = [0]\n"
+            "lock = threading.Lock()\n"
+            "class Handler(s.SimpleHTTPRequestHandler):\n"
+            "    protocol_version = 'HTTP/1.1'\n"
+            "    def setup(self):\n"
+            "        super().setup()\n"
+            "        with lock:\n"
+            "            count[0] += 1\n"
+            "            with open(sys.argv[3], 'w') as f:\n"
+            "                f.write(str(count[0]))\n"
+            "handler = functools.partial(Handler, directory=sys.argv[2])\n"
+            "s.ThreadingHTTPServer(('127.0.0.1', int(sys.argv[1])), handler).serve_forever()\n"
+        )
+        count_file = os.path.join(temp_dir, "connections")
+        server = subprocess.Popen(
+            [sys.executable, '-c', server_script, str(port), temp_dir, count_file],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        url = f"http://127.0.0.1:{port}/track.flac"
+        pool = HttpPool()
+        output = os.path.join(temp_dir, "output")
+
+        def server_connections() -> int:
+            with open(count_file) as f:
+                return int(f.read() or 0)
+
+        def iter_content_download(download_pool):
+            response = download_pool.get(url, stream=True, timeout=30)
+            with response, open(output, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    f.write(chunk)
+
+        def stream_writer_download(download_pool):
+            response = download_pool.get(url, stream=True, timeout=30)
+            size = int(response.headers.get('content-length', 0))
+            with response, open(output, 'wb') as f:
+                for _ in StreamWriter().iter_write(response, f, size):
+                    pass
+
+        try:
+            for _ in range(50):
+                try:
+                    pool.get(url, timeout=1, stream=True).close()
+                    break
+                except requests.exceptions.RequestException:
+                    time.sleep(0.1)
+
+            results = {}
+            for name, download in (("iter_content(8192)", iter_content_download),
+                                   ("StreamWriter", stream_writer_download)):
+                cpu_times = []
+                wall_times = []
+                download_pool = HttpPool()
+                connections_before = server_connections()
+                try:
+                    for _ in range(rounds):
+                        cpu_started = time.process_time()
+                        wall_started = time.perf_counter()
+                        download(download_pool)
+                        cpu_times.append(time.process_time() - cpu_started)
+                        wall_times.append(time.perf_counter() - wall_started)
+                        assert os.path.getsize(output) == total_mb * 1024 * 1024
+                    connections = server_connections() - connections_before
+                    assert connections == 1, f"{name} 的 {rounds} 次下载建立了 {connections} 个连接，连接没有复用"
+                finally:
+                    download_pool.close()
+                results[name] = (min(cpu_times), min(wall_times))
+        finally:
+            server.terminate()
+            server.wait()
+            pool.close()
+
+    print(f"文件大小: {total_mb}MB, 取 {rounds} 次中的最小值")
+    for name, (cpu_time, wall_time) in results.items():
+        print(f"{name:>20}: CPU {cpu_time * 1000 / total_mb:.2f} ms/MB, "
+              f"耗时 {wall_time:.2f}秒 ({total_mb / wall_time:.0f}MB/s)")
+    baseline = results["iter_content(8192)"][0]
+    print(f"CPU时间减少 {(1 - results['StreamWriter'][0] / baseline) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,113 @@
+# utils/track_index.py
+import os
+import threading
+from typing import Optional, Dict, List, Tuple
+
+class LocalTrackIndex:
+    """本地歌曲索引
+
+    按 (音乐源, 歌曲ID, 音质) 记录已下载的文件，并结合音频缓存查找本地文件。
+    查找时接受相同或更高音质的文件，命中时播放不需要访问网络、不消耗API配额。
+    """
+
+    QUALITIES = ('128', '192', '320', '740', '999')  # 从低到高
+
+    def __init__(self, audio_cache=None):
+        self.audio_cache = audio_cache  # 可选的AudioCache
+        self._downloads: Dict[Tuple[str, str], Dict[str, str]] = {}  # (音乐源, 歌曲ID) -> {音质: 文件路径}
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'download_hits': 0,
+            'cache_hits': 0,
+            'misses': 0
+        }
+
+    def add(self, source: str, song_id, quality, filepath: str):
+        """记录已下载的文件"""
+        with self._lock:
+            self._downloads.setdefault((source, str(song_id)), {})[str(quality)] = filepath
+
+    def remove_path(self, filepath: str):
+        """文件被删除时移除记录"""
+        with self._lock:
+            for key, files in list(self._downloads.items()):
+                for quality, path in list(files.items()):
+                    if path == filepath:
+                        del files[quality]
+                if not files:
+                    del self._downloads[key]
+
+    def load_history(self, history: List[Dict]):
+        """从下载历史中导入已完成的下载"""
+        count = 0
+        for item in history:
+            if item.get('status') == '已完成' and item.get('source') and item.get('id') \
+                    and item.get('file_path'):
+                self.add(item['source'], item['id'], item.get('quality', '320'), item['file_path'])
+                count += 1
+        if count:
+            self.log(f"导入已下载歌曲 {count} 首")
+
+    def find_download(self, source: str, song_id, quality) -> Optional[Tuple[str, str]]:
+        """查找相同或更高音质的已下载文件，返回 (音质, 文件路径)"""
+        with self._lock:
+            files = self._downloads.get((source, str(song_id)), {})
+            for candidate in self.qualities_at_least(quality):
+                path = files.get(candidate)
+                if not path:
+                    continue
+                if os.path.exists(path):
+                    return candidate, path
+                # 文件已被删除
+                del files[candidate]
+        return None
+
+    def get_downloads(self, source: str, song_id) -> Dict[str, str]:
+        """某首歌曲所有已下载的文件 {音质: 文件路径}"""
+        with self._lock:
+            return dict(self._downloads.get((source, str(song_id)), {}))
+
+    def lookup(self, source: str, song_id, quality) -> Optional[str]:
+        """查找相同或更高音质的本地文件，优先使用下载目录中的文件"""
+        song_id = str(song_id)
+        candidates = self.qualities_at_least(quality)
+
+        found = self.find_download(source, song_id, quality)
+        if found:
+            with self._lock:
+                self.stats['download_hits'] += 1
+            return found[1]
+
+        if self.audio_cache:
+            for candidate in candidates:
+                if self.audio_cache.contains(source, song_id, candidate):
+                    path = self.audio_cache.get(source, song_id, candidate)
+                    if path:
+                        with self._lock:
+                            self.stats['cache_hits'] += 1
+                        return path
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def qualities_at_least(self, quality) -> List[str]:
+        """不低于指定音质的所有音质，请求的音质排在最前"""
+        quality = str(quality)
+        if quality not in self.QUALITIES:
+            return [quality]
+        index = self.QUALITIES.index(quality)
+        return list(self.QUALITIES[index:])
+
+    def get_stats(self) -> Dict:
+        """获取命中统计"""
+        with self._lock:
+            return {
+                **self.stats,
+                'downloads': sum(len(files) for files in self._downloads.values())
+            }
+
+    def log(self, message: str):
+        """日志记录"""
+        print(f"[LocalTrackIndex] {message}")